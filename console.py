@@ -13,23 +13,23 @@ Command examples:
     (hbnb) create BaseModel
     (hbnb) show User 1234-1234-1234
     (hbnb) all
+    (hbnb) all Place limit=50 after=Place.1234
     (hbnb) update Place 9876 name "New Place"
+    (hbnb) Place.near(48.8566, 2.3522, 10)
+    (hbnb) Place.with_amenities("wifi-id", "pool-id")
+    (hbnb) Place.where("price_by_night < 100", order_by="price_by_night")
+    (hbnb) Place.group_by(city_id, price_by_night)
+    (hbnb) explain Place.where("city_id == '1234'")
 For more information on available commands, type 'help'.
 Authors: Ukpono Umoren & Alexander Udeogaranya
 """
 
+import ast
 import cmd
 import re
 import json
-import datetime
-from models.base_model import BaseModel
-from models.user import User
-from models.state import State
-from models.city import City
-from models.place import Place
-from models.amenity import Amenity
-from models.review import Review
 from models import storage
+from models.engine import registry
 
 
 class HBNBCommand(cmd.Cmd):
@@ -42,19 +42,12 @@ class HBNBCommand(cmd.Cmd):
     creating command-line interpreters.
     Attributes:
         prompt (str): The command prompt.
-        classes (dict): A dictionary of available model classes.
+        classes (mappingproxy): The model classes, by name, as registered
+        in models.engine.registry.
     """
 
     prompt = "(hbnb) "
-    classes = {
-        "BaseModel": BaseModel,
-        "User": User,
-        "State": State,
-        "City": City,
-        "Place": Place,
-        "Amenity": Amenity,
-        "Review": Review
-    }
+    classes = registry.classes()
 
     def emptyline(self):
         """
@@ -90,7 +83,7 @@ class HBNBCommand(cmd.Cmd):
             return
 
         if method == "all":
-            self.handle_all(class_name)
+            self.handle_all(class_name, method_args)
         elif method == "count":
             self.handle_count(class_name)
         elif method == "show":
@@ -104,20 +97,71 @@ class HBNBCommand(cmd.Cmd):
                 self.handle_update_with_dict(class_name, method_args)
             else:
                 self.handle_update(class_name, method_args)
+        elif method == "near" and class_name == "Place":
+            self.handle_near(method_args)
+        elif method == "with_amenities" and class_name == "Place":
+            self.handle_with_amenities(method_args)
+        elif method == "where":
+            self.handle_where(class_name, method_args)
+        elif method == "group_by":
+            self.handle_group_by(class_name, method_args)
         else:
             print("** unknown method **")
 
-    def handle_all(self, class_name):
+    def handle_all(self, class_name, method_args=""):
         """
         Handle the "all" method to retrieve instances.
         Args:
             class_name (str): The name of the class.
+            method_args (str): The optional limit, offset and after
+            keyword arguments, such as limit=50, after="Place.1234"
         """
-        obj_list = []
-        objects = storage.all(self.classes[class_name])
-        for obj in objects.values():
-            obj_list.append(str(obj))
-        print(obj_list)
+        try:
+            call = ast.parse("all({})".format(method_args),
+                             mode="eval").body
+            options = {keyword.arg: ast.literal_eval(keyword.value)
+                       for keyword in call.keywords}
+            if call.args:
+                raise ValueError("unexpected positional arguments")
+            self.print_all(self.classes[class_name], **options)
+        except (SyntaxError, TypeError, ValueError):
+            print("** invalid syntax **")
+
+    def print_all(self, cls=None, limit=None, offset=0, after=None):
+        """
+        Print instances as a list of strings, one instance at a time, so
+        that the whole list is never built in memory. When limit is given
+        and more instances remain, the cursor of the next page is printed
+        on its own line, to be passed back as after.
+        Args:
+            cls (class, optional): The class of the instances to print.
+                If None, prints every instance.
+            limit (int, optional): The maximum number of instances, at
+                least 1.
+            offset (int): The number of instances to skip first.
+            after (str, optional): The cursor of the previous page.
+        Raises:
+            ValueError: If an option has the wrong type or is out of
+            range.
+        """
+        for value, least in ((offset, 0), (1 if limit is None else limit, 1)):
+            if not isinstance(value, int) or isinstance(value, bool) or \
+                    value < least:
+                raise ValueError("invalid paging options")
+        if after is not None and not isinstance(after, str):
+            raise ValueError("invalid paging options")
+        objects = storage.iter_all(cls, offset=offset, after=after,
+                                   limit=None if limit is None else limit + 1)
+        cursor = None
+        print("[", end="")
+        for count, obj in enumerate(objects):
+            if count == limit:
+                print("]")
+                print("** next page: after={} **".format(cursor))
+                return
+            print("{}{!r}".format(", " if count else "", str(obj)), end="")
+            cursor = "{}.{}".format(type(obj).__name__, obj.id)
+        print("]")
 
     def handle_count(self, class_name):
         """
@@ -128,6 +172,109 @@ class HBNBCommand(cmd.Cmd):
         count = storage.count(self.classes[class_name])
         print(count)
 
+    def handle_near(self, method_args):
+        """
+        Handle the "near" method to list the places within a distance
+        of a point, nearest first.
+        Args:
+            method_args (str): The latitude, longitude and radius in km.
+        """
+        args = method_args.split(",")
+        if len(args) < 3:
+            print("** missing arguments **")
+            return
+        try:
+            lat, lon, km = (float(arg.strip(' \"\'')) for arg in args[:3])
+        except ValueError:
+            print("** invalid syntax **")
+            return
+        print([str(place) for place in storage.places_within(lat, lon, km)])
+
+    def handle_with_amenities(self, method_args):
+        """
+        Handle the "with_amenities" method to list the places offering
+        every one of the given amenities.
+        Args:
+            method_args (str): The IDs of the amenities.
+        """
+        amenity_ids = [arg.strip(' \"\'') for arg in method_args.split(",")]
+        amenity_ids = [amenity_id for amenity_id in amenity_ids if amenity_id]
+        if not amenity_ids:
+            print("** missing arguments **")
+            return
+        print([str(place)
+               for place in storage.places_with_amenities(amenity_ids)])
+
+    def handle_group_by(self, class_name, method_args):
+        """
+        Handle the "group_by" method to count the instances per value of
+        an attribute, with the sum, min, max and average of a numeric
+        attribute if one is given. Groups are printed largest first.
+        Args:
+            class_name (str): The name of the class.
+            method_args (str): The attribute to group by, then optionally
+            the numeric attribute, such as city_id, price_by_night
+        """
+        attrs = [arg.strip(' \"\'') for arg in method_args.split(",")]
+        if not attrs[0]:
+            print("** missing arguments **")
+            return
+        if len(attrs) > 2 or not all(attr.isidentifier() for attr in attrs):
+            print("** invalid syntax **")
+            return
+        groups = storage.group_by(self.classes[class_name], *attrs)
+        print(dict(sorted(groups.items(),
+                          key=lambda item: (-item[1]["count"],
+                                            repr(item[0])))))
+
+    @staticmethod
+    def parse_where_args(method_args):
+        """
+        Parse the arguments of the "where" method: an expression string,
+        then optional order_by and limit keyword arguments.
+        Args:
+            method_args (str): The arguments, such as
+            "price_by_night < 100", order_by="price_by_night", limit=5
+        Returns:
+            tuple: The expression, order_by and limit.
+        Raises:
+            ValueError: If the arguments are not in that form, or if
+            limit is not a whole number of zero or more.
+        """
+        try:
+            call = ast.parse("where({})".format(method_args),
+                             mode="eval").body
+            args = [ast.literal_eval(arg) for arg in call.args]
+            kwargs = {keyword.arg: ast.literal_eval(keyword.value)
+                      for keyword in call.keywords}
+        except (SyntaxError, ValueError):
+            raise ValueError("invalid arguments: {}".format(method_args))
+        if len(args) > 1 or set(kwargs) - {"order_by", "limit"} or \
+                not all(isinstance(arg, str) for arg in args) or \
+                not isinstance(kwargs.get("order_by", ""), str) or \
+                type(kwargs.get("limit", 0)) is not int or \
+                kwargs.get("limit", 0) < 0:
+            raise ValueError("invalid arguments: {}".format(method_args))
+        return (args[0] if args else None, kwargs.get("order_by"),
+                kwargs.get("limit"))
+
+    def handle_where(self, class_name, method_args):
+        """
+        Handle the "where" method to list the instances matching a query
+        expression.
+        Args:
+            class_name (str): The name of the class.
+            method_args (str): The expression and options.
+        """
+        try:
+            expression, order_by, limit = self.parse_where_args(method_args)
+            objects = storage.where(self.classes[class_name], expression,
+                                    order_by=order_by, limit=limit)
+        except ValueError:
+            print("** invalid syntax **")
+            return
+        print([str(obj) for obj in objects])
+
     def handle_show(self, class_name, instance_id):
         """
         Handle the "show" method to retrieve an instance based on its ID.
@@ -167,18 +314,17 @@ class HBNBCommand(cmd.Cmd):
             print("** missing arguments **")
             return
 
-        instance_id = args[0].strip('\"\'')
-        attribute_name = args[1].strip('\"\'')
-        attribute_value = args[2].strip('\"\'')
+        # Strip the spaces after the commas, then the quotes
+        instance_id, attribute_name, attribute_value = (
+            arg.strip().strip('\"\'') for arg in args[:3])
 
         instance = storage.get(self.classes[class_name], instance_id)
         if instance is None:
             print("** no instance found **")
             return
 
-        setattr(instance, attribute_name, attribute_value)
-        setattr(instance, "updated_at", datetime.now())
-        storage.save()
+        if self.set_attributes(instance, {attribute_name: attribute_value}):
+            instance.save()
 
     def handle_update_with_dict(self, class_name, update_args):
         """
@@ -193,7 +339,7 @@ class HBNBCommand(cmd.Cmd):
             print("** missing arguments **")
             return
 
-        instance_id = args[0].strip('\"\'')
+        instance_id = args[0].strip().strip('\"\'')
         attribute_data = args[1].strip()
 
         try:
@@ -207,11 +353,8 @@ class HBNBCommand(cmd.Cmd):
             print("** no instance found **")
             return
 
-        for attr, value in attribute_dict.items():
-            parsed_value = self.parse_attribute_value(value)
-            setattr(instance, attr, parsed_value)
-        setattr(instance, "updated_at", datetime.now())
-        storage.save()
+        if self.set_attributes(instance, attribute_dict):
+            instance.save()
 
     def do_quit(self, arg):
         """
@@ -339,51 +482,50 @@ class HBNBCommand(cmd.Cmd):
 
     def do_all(self, arg):
         """
-        Retrieve all instances or instances of a specific class.
-        Usage: all [class_name] or <class_name>.all()
+        Retrieve all instances or instances of a specific class, in key
+        order, optionally one page at a time.
+        Usage: all [class_name] [limit=N] [offset=N] [after=<key>]
+        or <class_name>.all([limit=N], [offset=N], [after="<key>"])
         Example:
             (hbnb) all
             (hbnb) all User
+            (hbnb) all User limit=50
+            (hbnb) all User limit=50 after=User.1234-1234-1234
             (hbnb) User.all()
         """
-        args = arg.split(".")
-        if len(args) > 1:
-            class_name = args[0]
-            method = args[1]
-            if method != "all()":
+        match = re.search(r"^(\w+)\.(\w+)\((.*)\)$", arg.strip())
+        if match:
+            class_name, method = match.group(1), match.group(2)
+            if method != "all":
                 print("** unknown method **")
                 return
-
             if class_name not in self.classes:
                 print("** class doesn't exist **")
                 return
+            self.handle_all(class_name, match.group(3))
+            return
 
-            obj_list = []
-            objects = storage.all(self.classes[class_name])
-            for obj in objects.values():
-                obj_list.append(str(obj))
-            print(obj_list)
-        else:
-            args = arg.split()
-            if len(args) == 0:
-                obj_list = []
-                objects = storage.all()
-                for obj in objects.values():
-                    obj_list.append(str(obj))
-                print(obj_list)
-            elif len(args) == 1:
-                class_name = args[0]
-                if class_name not in self.classes:
-                    print("** class doesn't exist **")
-                    return
-
-                obj_list = []
-                objects = storage.all(self.classes[class_name])
-                for obj in objects.values():
-                    obj_list.append(str(obj))
-                print(obj_list)
+        args = arg.split()
+        cls = None
+        if args and "=" not in args[0]:
+            if args[0] not in self.classes:
+                print("** class doesn't exist **")
+                return
+            cls = self.classes[args.pop(0)]
+        options = {}
+        for option in args:
+            name, _, value = option.partition("=")
+            if name in ("limit", "offset") and value.isdigit():
+                options[name] = int(value)
+            elif name == "after" and value:
+                options[name] = value
             else:
                 print("** invalid syntax **")
+                return
+        try:
+            self.print_all(cls, **options)
+        except ValueError:
+            print("** invalid syntax **")
 
     def do_count(self, arg):
         """
@@ -412,6 +554,70 @@ class HBNBCommand(cmd.Cmd):
                 count = storage.count(self.classes[args[0]])
                 print(count)
 
+    def do_begin(self, arg):
+        """
+        Start a batch: changes are saved together at commit.
+        Usage: begin
+        Example:
+            (hbnb) begin
+            (hbnb) create Place
+            (hbnb) commit
+        """
+        storage.begin()
+
+    def do_commit(self, arg):
+        """
+        Save the changes made since begin.
+        Usage: commit
+        """
+        if not storage.in_batch():
+            print("** no batch in progress **")
+            return
+        storage.commit()
+
+    def do_rollback(self, arg):
+        """
+        Discard the changes made since begin.
+        Usage: rollback
+        """
+        if not storage.in_batch():
+            print("** no batch in progress **")
+            return
+        storage.rollback()
+
+    def do_explain(self, arg):
+        """
+        Print the plan chosen for a query and its estimated row counts.
+        Usage: explain <class_name>.where(<expression>[, order_by=<attr>]
+            [, limit=<n>])
+        Example:
+            (hbnb) explain Place.where("price_by_night < 100")
+        """
+        match = re.search(r"^(\w+)\.where\((.*)\)$", arg.strip())
+        if not match:
+            print("** invalid syntax **")
+            return
+        class_name = match.group(1)
+        if class_name not in self.classes:
+            print("** class doesn't exist **")
+            return
+        try:
+            expression, order_by, limit = self.parse_where_args(
+                match.group(2))
+            print(storage.explain(self.classes[class_name], expression,
+                                  order_by=order_by, limit=limit))
+        except ValueError:
+            print("** invalid syntax **")
+
+    def do_stats(self, arg):
+        """
+        Print the storage dirty-set size and write counters.
+        Usage: stats
+        Example:
+            (hbnb) stats
+        """
+        print(storage.stats())
+
     def do_update(self, arg):
         """
         Update an instance with new attribute values.
@@ -419,6 +625,8 @@ class HBNBCommand(cmd.Cmd):
             <attribute_value> or
             update <class_name> <instance_id> <dictionary representation> or
             <class_name>.update(<instance_id>, <dictionary representation>)
+        Values are cast to the type of the attribute in the schema of the
+        class, and rejected if they cannot be.
         Example:
             (hbnb) update User 1234-1234-1234 first_name "John"
             (hbnb) update User 1234-1234-1234
@@ -454,14 +662,13 @@ class HBNBCommand(cmd.Cmd):
                 except json.JSONDecodeError:
                     print("** invalid dictionary syntax **")
                     return
-                for attr, value in attributes.items():
-                    setattr(instance, attr, value)
             elif len(update_args) == 4:  # Check for attribute update
-                setattr(instance, update_args[1], update_args[2].strip("\""))
+                attributes = {update_args[1]: update_args[2].strip("\"")}
             else:
                 print("** invalid syntax **")
                 return
-            storage.save()
+            if self.set_attributes(instance, attributes):
+                instance.save()
         else:
             ags = arg.split(maxsplit=3)
             if len(ags) == 0:
@@ -486,35 +693,51 @@ class HBNBCommand(cmd.Cmd):
                 except json.JSONDecodeError:
                     print("** invalid dictionary syntax **")
                     return
-                for attr, value in attributes.items():
-                    setattr(instance, attr, value)
             elif len(ags) == 2:
                 print("** attribute name missing **")
                 return
             elif len(ags) == 4:
-                setattr(instance, ags[2], ags[3].strip("\""))
+                attributes = {ags[2]: ags[3].strip("\"")}
             else:
                 print("** value missing **")
                 return
-            storage.save()
+            if self.set_attributes(instance, attributes):
+                instance.save()
 
-    # Helper function to parse attribute values
+    # Helper function to set typed attribute values
 
     @staticmethod
-    def parse_attribute_value(value):
+    def set_attributes(instance, attributes):
         """
-        Parse the attribute value and convert it to the appropriate data type.
+        Cast the attribute values to the types of the schema of the class
+        (see models.engine.registry) and set them, all or none: a value
+        that cannot be cast, or that a unique index already holds for
+        another instance, prints an error and leaves the instance
+        unchanged. Attributes outside the schema are set as given.
         Args:
-            value (str): The attribute value as a string.
+            instance (BaseModel): The instance to update.
+            attributes (dict): The attribute names and values.
         Returns:
-            The parsed attribute value as the appropriate data type.
-        """
+            bool: Whether the attributes were set.
+        """
+        coercers = registry.coercers(type(instance).__name__)
+        values = {}
+        for attr, value in attributes.items():
+            coercer = coercers.get(attr)
+            try:
+                values[attr] = value if coercer is None else coercer(value)
+            except ValueError as error:
+                print("** invalid value for {}: {} **".format(attr, error))
+                return False
         try:
-            parsed_value = json.loads(value)
-        except json.JSONDecodeError:
-            # If JSON decoding fails, return the original string value
-            return value
-        return parsed_value
+            # Rolled back as a whole if a unique index rejects a value
+            with storage.batch():
+                for attr, value in values.items():
+                    setattr(instance, attr, value)
+        except ValueError as error:
+            print("** {} **".format(error))
+            return False
+        return True
 
 
 # Run the console
@@ -3,10 +3,24 @@
 ALX HolbertonBnB - Initialization Module
 
 This module serves as the entry point for the models package. It initializes
-the FileStorage instance and provides methods to access the storage.
+the storage engine and provides methods to access the storage.
+
+The engine is chosen by the HBNB_TYPE_STORAGE environment variable:
+"db" selects the SQLite-backed DBStorage (whose database file is given by
+HBNB_DB_PATH), anything else the JSON-file-backed FileStorage. For
+FileStorage, HBNB_FILE_SHARDS sets the number of shard files per class
+(0, the default, keeps everything in file.json; a store saved in
+another layout is moved to this one on reload), HBNB_FILE_DURABILITY
+the fsync policy ("none", the default, "batch" or "fsync-every-commit"),
+HBNB_FILE_COMPACT=1 builds the loaded objects from slotted classes, and
+HBNB_FILE_FEED=1 appends the change events of every save to a JSON-lines
+feed file next to file.json.
+With either engine, HBNB_ID_SCHEME=uuid7 gives new objects time-ordered
+IDs instead of random ones ("uuid4", the default).
 
 Attributes:
-    storage (FileStorage): The instance of FileStorage for the application.
+    storage (FileStorage or DBStorage): The storage engine instance for
+    the application.
 
 Usage:
     # Importing the storage instance
@@ -36,10 +50,26 @@ Authors:
     - Alexander Udeogaranya
 """
 
-from models.engine.file_storage import FileStorage
+from os import getenv
+from models.engine import ids
+
+# Select the scheme of the IDs of new objects
+ids.configure(getenv("HBNB_ID_SCHEME", "uuid4"))
+
+# Initialize the storage engine
+if getenv("HBNB_TYPE_STORAGE") == "db":
+    from models.engine.db_storage import DBStorage
+    storage = DBStorage()
+else:
+    from models.engine.file_storage import FileStorage
+    storage = FileStorage()
+    storage.configure(shards=int(getenv("HBNB_FILE_SHARDS", "0")),
+                      durability=getenv("HBNB_FILE_DURABILITY", "none"),
+                      compact=getenv("HBNB_FILE_COMPACT", "0") == "1",
+                      feed=getenv("HBNB_FILE_FEED", "0") == "1")
 
-# Initialize the FileStorage instance
-storage = FileStorage()
+# Import the models, which register themselves in models.engine.registry
+from models import base_model, user, state, city, amenity, place, review
 
 # Load objects from the storage
 storage.reload()
@@ -11,10 +11,20 @@ Attributes:
     created_at (datetime): The date and time the instance was created.
     updated_at (datetime): The date and time the instance was last updated.
 
+Classes:
+    Timestamp: The descriptor behind created_at and updated_at, which
+    parses ISO 8601 strings when first read.
+
 Methods:
     __init__(self, *args, **kwargs): Initializes a new instance of BaseModel.
+    __init_subclass__(cls, register=True): Registers each model class.
+    from_record(cls, record): Builds an instance from its dictionary form,
+    deferring the parsing of its dates.
+    __setattr__(self, name, value): Sets an attribute and marks the
+    instance as modified in storage.
     __str__(self): Returns a string representation of the instance.
-    save(self): Updates the `updated_at` attribute with the current datetime.
+    save(self): Updates the `updated_at` attribute with the current datetime
+    and persists the change.
     to_dict(self): Returns a dictionary representation of the instance.
 
 Usage:
@@ -30,6 +40,9 @@ Usage:
     # Converting instance to dictionary
     instance_dict = new_instance.to_dict()
 
+    # Rebuilding it, as storage engines do
+    same_instance = BaseModel.from_record(instance_dict)
+
     # Updating instance and saving changes
     new_instance.name = "John Doe"
     new_instance.save()
@@ -37,9 +50,78 @@ Usage:
 Authors: Ukpono Umoren & Alexander Udeogaranya
 """
 
-import uuid
 from datetime import datetime
 from models import storage
+from models.engine import ids
+from models.engine import registry
+
+
+class Timestamp:
+    """
+    The Timestamp class is the data descriptor behind created_at and
+    updated_at. An instance built by from_record() keeps the ISO 8601
+    strings of its record, and each is parsed with
+    datetime.fromisoformat() the first time it is read, then cached in
+    place; objects that are only indexed, counted or saved again never
+    parse their dates.
+
+    Attributes:
+        name (str): The attribute managed.
+        slot (member_descriptor): The slot holding the value in a compact
+        class (see models.engine.compact), or None to use __dict__.
+    """
+
+    def __init__(self, name, slot=None):
+        """
+        Initializes the descriptor of an attribute.
+        """
+        self.name = name
+        self.slot = slot
+
+    def for_slot(self, slot):
+        """
+        Returns the same descriptor storing its value in a slot instead.
+        """
+        return Timestamp(self.name, slot)
+
+    def __get__(self, obj, owner=None):
+        """
+        Returns the datetime value, parsing it if it is still a string.
+        """
+        if obj is None:
+            return self
+        if self.slot is not None:
+            value = self.slot.__get__(obj, owner)
+        else:
+            try:
+                value = obj.__dict__[self.name]
+            except KeyError:
+                raise AttributeError(self.name) from None
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+            self.__set__(obj, value)
+        return value
+
+    def __set__(self, obj, value):
+        """
+        Stores the value, a datetime or an ISO 8601 string.
+        """
+        if self.slot is not None:
+            self.slot.__set__(obj, value)
+        else:
+            obj.__dict__[self.name] = value
+
+    def __delete__(self, obj):
+        """
+        Unsets the value.
+        """
+        if self.slot is not None:
+            self.slot.__delete__(obj)
+        else:
+            try:
+                del obj.__dict__[self.name]
+            except KeyError:
+                raise AttributeError(self.name) from None
 
 
 class BaseModel:
@@ -53,6 +135,9 @@ class BaseModel:
         updated_at (datetime): The date and time the instance was last updated.
     """
 
+    created_at = Timestamp("created_at")
+    updated_at = Timestamp("updated_at")
+
     def __init__(self, *args, **kwargs):
         """
         Initializes a new instance of BaseModel.
@@ -73,11 +158,58 @@ class BaseModel:
                 else:
                     self.__dict__[key] = kwargs[key]
         else:
-            self.id = str(uuid.uuid4())
+            self.id = ids.new_id()
             self.created_at = datetime.now()
             self.updated_at = datetime.now()
             storage.new(self)
 
+    def __init_subclass__(cls, register=True, **kwargs):
+        """
+        Registers a new model class in models.engine.registry, which
+        compiles its schema from its class level defaults. Classes derived
+        for storage only, such as the compact classes, pass
+        register=False.
+
+        Args:
+            register (bool): Whether to register the class.
+        """
+
+        super().__init_subclass__(**kwargs)
+        if register:
+            registry.register(cls)
+
+    @classmethod
+    def from_record(cls, record):
+        """
+        Builds an instance from its dictionary form, as to_dict() returns
+        it and as storage engines load it, without the per-key work of
+        __init__: the record is copied into the instance in one step, and
+        created_at and updated_at are only parsed when first read (see
+        Timestamp). The instance is not added to storage.
+
+        Args:
+            record (dict): The attributes of the instance.
+
+        Returns:
+            BaseModel: The instance.
+        """
+
+        obj = cls.__new__(cls)
+        obj.__dict__.update(record)
+        return obj
+
+    def __setattr__(self, name, value):
+        """
+        Sets an attribute and marks the instance as modified in storage.
+
+        Args:
+            name (str): The name of the attribute.
+            value: The new value of the attribute.
+        """
+
+        storage.touch(self, name, value)
+        super().__setattr__(name, value)
+
     def __str__(self):
         """
         Returns a string representation of the instance.
@@ -86,12 +218,16 @@ class BaseModel:
             str: The string representation of the instance.
         """
 
+        for name in ("created_at", "updated_at"):
+            # Parse the dates from_record() deferred, so they print as such
+            getattr(self, name, None)
         return "[{}] ({}) {}".format(type(self).__name__,
                                      self.id, self.__dict__)
 
     def save(self):
         """
-        Updates the `updated_at` attribute with the current datetime.
+        Updates the `updated_at` attribute with the current datetime
+        and persists the change.
         """
 
         self.updated_at = datetime.now()
@@ -107,6 +243,12 @@ class BaseModel:
 
         ua_dict = self.__dict__.copy()
         ua_dict["__class__"] = type(self).__name__
-        ua_dict["created_at"] = ua_dict["created_at"].isoformat()
-        ua_dict["updated_at"] = ua_dict["updated_at"].isoformat()
+        for name in ("created_at", "updated_at"):
+            # Dates never read since from_record() are still ISO strings
+            if not isinstance(ua_dict[name], str):
+                ua_dict[name] = ua_dict[name].isoformat()
         return ua_dict
+
+
+registry.register(BaseModel, {"id": str, "created_at": datetime,
+                              "updated_at": datetime})
@@ -8,6 +8,7 @@ the HolbertonBnB application.
 Attributes:
     state_id (str): The ID of the state to which the city belongs.
     name (str): The name of the city.
+    places (list): The places located in the city.
 
 Methods:
     __init__(self, *args, **kwargs): Initializes a new instance of City.
@@ -33,7 +34,9 @@ Usage:
 Authors: Ukpono Umoren & Alexander Udeogaranya
 """
 
+from models import storage
 from models.base_model import BaseModel
+from models.place import Place
 
 
 class City(BaseModel):
@@ -43,7 +46,15 @@ class City(BaseModel):
     Attributes:
         state_id (str): The ID of the state to which the city belongs.
         name (str): The name of the city.
+        places (list): The places located in the city.
     """
 
     state_id = ""
     name = ""
+
+    @property
+    def places(self):
+        """
+        Returns the places whose city_id is the ID of this city.
+        """
+        return storage.related(Place, "city_id", self.id)
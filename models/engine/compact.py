@@ -0,0 +1,288 @@
+#!/usr/bin/python3
+"""
+ALX HolbertonBnB - Compact Model Instances
+
+This module derives, from a model class and its attribute schema (see
+models.engine.registry), a slotted subclass whose instances keep the
+schema attributes in fixed slots instead of a per-instance dictionary.
+Attributes outside the schema go to an overflow dictionary, created the
+first time one is set. FileStorage builds the objects it loads from
+these classes when configured with compact=True.
+
+A compact instance is still an instance of its model class and has the
+same class name, so storage keys, to_dict(), __str__ and isinstance()
+are unchanged. Its __dict__ is a live view (AttributeView) over the set
+slots, in schema order, then the overflow, so the code that reads or
+rewrites obj.__dict__ keeps working. Slots never set fall back to the
+class defaults, as dictionary attributes do. The "__class__" entry that
+BaseModel(**record) leaves in __dict__ is derived from the class rather
+than stored, so that loaded objects need no overflow dictionary. Copies
+and pickles of a compact instance hold only its set slots and overflow,
+and pickles rebuild the compact class from the model registered under
+the class name.
+
+Classes:
+    CompactModel: The mixin routing attribute access to the slots.
+    AttributeView: The mapping returned as the __dict__ of an instance.
+
+Functions:
+    compact_class(cls, attributes): Returns the compact subclass of cls.
+
+Usage:
+    schema = ["id", "created_at", "updated_at", "name", "city_id"]
+    CompactPlace = compact_class(Place, schema)
+    place = CompactPlace(**record)
+    place.to_dict() == Place(**record).to_dict()    # True
+
+Authors: Ukpono Umoren & Alexander Udeogaranya
+"""
+import collections.abc
+import copy
+
+from models.engine import registry
+
+_classes = {}
+
+
+def _overflow(obj, create=False):
+    """
+    Returns the overflow dictionary of a compact instance, or None if it
+    has none and create is False.
+    """
+    try:
+        extra = object.__getattribute__(obj, "_extra")
+    except AttributeError:
+        extra = None
+    if extra is None and create:
+        extra = {}
+        object.__setattr__(obj, "_extra", extra)
+    return extra
+
+
+class AttributeView(collections.abc.MutableMapping):
+    """
+    The AttributeView class presents the slots and overflow of a compact
+    instance as a dictionary. Reads and writes go straight to the
+    instance, so the view never holds stale values.
+
+    Attributes:
+        obj (CompactModel): The instance viewed.
+    """
+
+    __slots__ = ("obj",)
+
+    def __init__(self, obj):
+        """
+        Initializes a view over obj.
+        """
+        self.obj = obj
+
+    def __getitem__(self, name):
+        """
+        Returns the value of an attribute set on the instance.
+        """
+        if name == "__class__":
+            return type(self.obj).__name__
+        if name in type(self.obj)._fields:
+            try:
+                return object.__getattribute__(self.obj, name)
+            except AttributeError:
+                raise KeyError(name) from None
+        extra = _overflow(self.obj)
+        if extra is None or name not in extra:
+            raise KeyError(name)
+        return extra[name]
+
+    def __setitem__(self, name, value):
+        """
+        Stores an attribute in its slot, or in the overflow dictionary.
+        The class name is implied by the class.
+        """
+        if name == "__class__":
+            return
+        if name in type(self.obj)._fields:
+            object.__setattr__(self.obj, name, value)
+            return
+        _overflow(self.obj, create=True)[name] = value
+
+    def __delitem__(self, name):
+        """
+        Unsets an attribute. The class name cannot be unset.
+        """
+        if name == "__class__":
+            raise KeyError(name)
+        if name in type(self.obj)._fields:
+            try:
+                object.__delattr__(self.obj, name)
+            except AttributeError:
+                raise KeyError(name) from None
+            return
+        extra = _overflow(self.obj)
+        if extra is None or name not in extra:
+            raise KeyError(name)
+        del extra[name]
+
+    def __iter__(self):
+        """
+        Yields the names of the set slots, in schema order, then those of
+        the overflow attributes, then "__class__", which records list
+        last.
+        """
+        for name in type(self.obj)._order:
+            try:
+                object.__getattribute__(self.obj, name)
+            except AttributeError:
+                continue
+            yield name
+        extra = _overflow(self.obj)
+        if extra:
+            yield from list(extra)
+        yield "__class__"
+
+    def __len__(self):
+        """
+        Returns the number of attributes set.
+        """
+        return sum(1 for name in self)
+
+    def __repr__(self):
+        """
+        Returns the representation of the equivalent dictionary.
+        """
+        return repr(dict(self))
+
+    def clear(self):
+        """
+        Unsets every slot and drops the overflow dictionary.
+        """
+        for name in type(self.obj)._order:
+            try:
+                object.__delattr__(self.obj, name)
+            except AttributeError:
+                pass
+        object.__setattr__(self.obj, "_extra", None)
+
+    def copy(self):
+        """
+        Returns a dictionary of the attributes, as dict.copy() would.
+        """
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        """
+        Returns a deep copy of the attributes as a dictionary, so that a
+        snapshot does not follow later changes.
+        """
+        return copy.deepcopy(dict(self), memo)
+
+
+def _rebuild(name, order, record):
+    """
+    Rebuilds a pickled compact instance from the name of its model, the
+    attributes of its compact class and its set attributes.
+    """
+    cls = compact_class(registry.classes()[name], order)
+    return cls.from_record(record)
+
+
+class CompactModel:
+    """
+    The CompactModel class is mixed into every compact class, after the
+    model class, so that BaseModel.__setattr__ still runs first and then
+    stores the value through the view.
+    """
+
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        """
+        Stores an attribute in its slot, or in the overflow dictionary.
+        """
+        AttributeView(self)[name] = value
+
+    def __delattr__(self, name):
+        """
+        Unsets an attribute.
+        """
+        try:
+            del AttributeView(self)[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __getattr__(self, name):
+        """
+        Returns an overflow attribute, or the class default of a slot that
+        was never set.
+        """
+        extra = _overflow(self)
+        if extra is not None and name in extra:
+            return extra[name]
+        model = type(self)._model
+        if name in type(self)._fields and hasattr(model, name):
+            return getattr(model, name)
+        raise AttributeError("'{}' object has no attribute '{}'".format(
+            type(self).__name__, name))
+
+    def __copy__(self):
+        """
+        Returns a shallow copy holding the same set attributes, without
+        filling the unset slots with the class defaults.
+        """
+        return type(self).from_record(AttributeView(self))
+
+    def __deepcopy__(self, memo):
+        """
+        Returns a deep copy holding copies of the set attributes.
+        """
+        clone = type(self).__new__(type(self))
+        memo[id(self)] = clone
+        view = AttributeView(clone)
+        for name, value in AttributeView(self).items():
+            view[name] = copy.deepcopy(value, memo)
+        return clone
+
+    def __reduce_ex__(self, protocol):
+        """
+        Pickles the set attributes with the name of the model, since the
+        compact class cannot be found under its own name.
+        """
+        return (_rebuild, (type(self)._model.__name__, type(self)._order,
+                           dict(AttributeView(self))))
+
+
+def compact_class(cls, attributes):
+    """
+    Returns the compact subclass of a model class, with one slot per
+    attribute of its schema, creating it on first use.
+
+    Args:
+        cls (class): The model class, such as Place.
+        attributes (iterable): The names of the schema attributes,
+        including id, created_at and updated_at.
+
+    Returns:
+        class: The subclass, named like cls.
+    """
+    order = tuple(dict.fromkeys(attributes))
+    compact = _classes.get((cls, order))
+    if compact is None:
+        # Not registered: the model class keeps its name in the registry
+        compact = type(cls.__name__, (cls, CompactModel), {
+            "__slots__": order + ("_extra",),
+            "__module__": cls.__module__,
+            "__qualname__": cls.__qualname__,
+            "__doc__": cls.__doc__,
+            "__dict__": property(AttributeView),
+            "_model": cls,
+            "_order": order,
+            "_fields": frozenset(order),
+        }, register=False)
+        for name in order:
+            # Descriptors of the model, such as the Timestamp of
+            # created_at, keep working on top of the slot
+            descriptor = getattr(cls, name, None)
+            if hasattr(descriptor, "for_slot"):
+                slot = vars(compact)[name]
+                setattr(compact, name, descriptor.for_slot(slot))
+        _classes[(cls, order)] = compact
+    return compact
@@ -0,0 +1,989 @@
+#!/usr/bin/python3
+"""
+ALX HolbertonBnB - Database Storage
+
+This module defines the DBStorage class, a storage engine backed by a
+SQLite database. It offers the same interface as FileStorage, so the
+console and BaseModel work with either engine; models/__init__.py picks
+DBStorage when the HBNB_TYPE_STORAGE environment variable is "db".
+
+Each model class gets its own table, with one column per attribute of
+its schema in models.engine.registry and an "_extra" column holding any
+other attribute as a JSON object; foreign key columns and the numeric
+columns of Place are indexed, and so is updated_at in every table.
+Nothing is loaded at startup: objects are read from the database when
+get() or all() asks for them, and kept in an identity map so that later
+lookups return the same instance.
+
+Attributes:
+    __db_path (str): The path to the SQLite database file, taken from
+    the HBNB_DB_PATH environment variable (default "hbnb.db").
+    __connection (sqlite3.Connection): The open database connection.
+    __objects (dict): The objects read or created so far, with their
+    class name and ID as keys.
+    __dirty (dict): The keys changed since the last save, mapped to
+    "created", "modified" or "deleted".
+    __batches (list): One (undo, dirty) pair per open batch.
+
+Methods:
+    all(self, cls=None): Retrieves all objects or objects of a specific class.
+    iter_all(self, cls=None, offset=0, after=None, limit=None),
+    page(self, cls=None, after=None, limit=100): Stream or page through
+    the objects in key order, as in FileStorage.
+    new(self, obj): Adds a new object to the storage.
+    touch(self, obj, name=None, value=None): Marks an object as modified.
+    save(self): Writes the dirty objects to the database.
+    reload(self): Opens the database and creates the missing tables.
+    get(self, cls, id): Retrieves an object by class and ID.
+    delete(self, obj): Deletes an object.
+    count(self, cls=None): Returns the number of objects.
+    create_index(self, cls, attr, unique=False): Indexes a column.
+    find(self, cls, **equals): Returns the objects whose attributes equal
+    the given values.
+    related(self, cls, attr, value): Returns the objects of a class whose
+    foreign key attr equals value.
+    range(self, cls, attr, low=None, high=None), min(self, cls, attr),
+    max(self, cls, attr), ordered(self, cls, attr, reverse=False): Ordered
+    queries on a numeric attribute, as in FileStorage.
+    places_within(self, lat, lon, radius_km),
+    places_in_bbox(self, south, west, north, east): Geographic searches on
+    Place, as in FileStorage.
+    search(self, query, cls=None, limit=None): Full-text search of places
+    and reviews, as in FileStorage.
+    places_with_amenities(self, amenity_ids, match="all"): Amenity filter,
+    as in FileStorage.
+    group_by(self, cls, attr, value_attr=None): Counts and numeric
+    figures per value of an attribute, as in FileStorage.
+    where(self, cls, expression, order_by=None, limit=None),
+    explain(self, cls, expression, order_by=None, limit=None): Query
+    expressions, translated to SQL where possible.
+    begin(self), commit(self), rollback(self), batch(self): Batches, as
+    in FileStorage.
+
+Usage:
+    $ HBNB_TYPE_STORAGE=db HBNB_DB_PATH=hbnb.db ./console.py
+
+Authors: Ukpono Umoren & Alexander Udeogaranya
+"""
+import contextlib
+import copy
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+
+from models.engine import indexes
+from models.engine import query
+from models.engine import registry
+
+
+class DBStorage:
+    """
+    The DBStorage class stores objects in a SQLite database,
+    one table per model class.
+
+    Attributes:
+        __db_path (str): The path to the SQLite database file.
+        __connection (sqlite3.Connection): The open database connection.
+        __objects (dict): The objects read or created so far.
+        __dirty (dict): The keys changed since the last save.
+        __batches (list): One (undo, dirty) pair per open batch.
+        __unique (set): The (class name, attribute) pairs that must be
+        unique.
+    """
+
+    __db_path = os.getenv("HBNB_DB_PATH", "hbnb.db")
+    __connection = None
+    __objects = {}
+    __dirty = {}
+    __batches = []
+    __unique = set()
+    __counters = {"flushes": 0, "flushed": 0}
+    __sql_types = {str: "TEXT", int: "INTEGER", float: "REAL"}
+    __foreign_keys = {"City": ("state_id",),
+                      "Place": ("city_id", "user_id"),
+                      "Review": ("place_id", "user_id")}
+
+    def all(self, cls=None):
+        """
+        Retrieves all objects or objects of a specific class.
+
+        Args:
+            cls (class): The class of objects to retrieve.
+            If None, retrieves all objects.
+
+        Returns:
+            dict: A dictionary containing the retrieved objects.
+        """
+        objects = {}
+        for name, model in self.classes().items():
+            if cls is not None and not issubclass(model, cls):
+                continue
+            rows = self.__connection.execute(
+                'SELECT * FROM "{}"'.format(name))
+            columns = [c[0] for c in rows.description]
+            for row in rows:
+                key = "{}.{}".format(name, row[0])
+                if self.__dirty.get(key) == "deleted":
+                    continue
+                objects[key] = self.__objects.get(key) or \
+                    self.__hydrate(name, columns, row)
+            for key, state in self.__dirty.items():
+                if state == "created" and key.partition(".")[0] == name:
+                    objects[key] = self.__objects[key]
+        return objects
+
+    def iter_all(self, cls=None, offset=0, after=None, limit=None):
+        """
+        Yields the objects one at a time, in key order, reading the rows
+        of each table through its primary key as the iteration advances.
+        See FileStorage.iter_all().
+        """
+        for key, columns, row in self.__iter_rows(cls, offset, after, limit):
+            yield self.__objects.get(key) or \
+                self.__hydrate(key.partition(".")[0], columns, row)
+
+    def page(self, cls=None, after=None, limit=100):
+        """
+        Returns one page of objects in key order, and the cursor of the
+        next page. See FileStorage.page().
+
+        Raises:
+            ValueError: If limit is less than 1.
+        """
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        rows = list(self.__iter_rows(cls, 0, after, limit + 1))
+        cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return [self.__objects.get(key) or
+                self.__hydrate(key.partition(".")[0], columns, row)
+                for key, columns, row in rows[:limit]], cursor
+
+    def new(self, obj):
+        """
+        Sets new obj in the identity map and marks it for saving.
+        """
+        key = "{}.{}".format(type(obj).__name__, obj.id)
+        if self.__objects.get(key) is not obj:
+            for name, attr in self.__unique:
+                if name == type(obj).__name__ and attr in obj.__dict__:
+                    self.__check(obj, attr, obj.__dict__[attr])
+        self.__remember(key)
+        state = self.__dirty.get(key)
+        if key not in self.__objects:
+            self.__dirty[key] = "modified" if state == "deleted" \
+                else "created"
+        elif state is None:
+            self.__dirty[key] = "modified"
+        self.__objects[key] = obj
+
+    def touch(self, obj, name=None, value=None):
+        """
+        Marks obj as modified so that the next save() writes it.
+
+        Args:
+            obj: The object being modified.
+            name (str): The name of the attribute being set.
+            value: The new value of the attribute.
+
+        Raises:
+            ValueError: If the attribute is unique and another object
+            already holds the new value.
+        """
+        key = "{}.{}".format(type(obj).__name__, getattr(obj, "id", None))
+        if self.__objects.get(key) is obj:
+            if (type(obj).__name__, name) in self.__unique:
+                self.__check(obj, name, value)
+            self.__remember(key)
+            if key not in self.__dirty:
+                self.__dirty[key] = "modified"
+
+    def save(self):
+        """
+        Writes the dirty objects to the database in one transaction.
+        """
+        if not self.__dirty or self.__batches:
+            return
+        with self.__connection:
+            for key, state in self.__dirty.items():
+                name, _, obj_id = key.partition(".")
+                if state == "deleted":
+                    self.__connection.execute(
+                        'DELETE FROM "{}" WHERE id = ?'.format(name),
+                        (obj_id,))
+                else:
+                    columns, values = self.__to_row(self.__objects[key])
+                    self.__connection.execute(
+                        'INSERT OR REPLACE INTO "{}" ({}) VALUES ({})'.format(
+                            name, ", ".join(columns),
+                            ", ".join("?" * len(values))), values)
+        self.__counters["flushes"] += 1
+        self.__counters["flushed"] += len(self.__dirty)
+        self.__dirty.clear()
+
+    def reload(self):
+        """
+        Opens the database, creating missing tables and columns.
+        No object is read until it is asked for.
+        """
+        if self.__connection is not None:
+            self.__connection.close()
+        DBStorage.__connection = sqlite3.connect(self.__db_path)
+        self.__objects.clear()
+        self.__dirty.clear()
+        del self.__batches[:]
+        with self.__connection:
+            for name in self.classes():
+                self.__create_table(name)
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        if self.__connection is not None:
+            self.__connection.close()
+            DBStorage.__connection = None
+
+    def classes(self):
+        """
+        Returns a read-only dictionary of valid classes and their
+        references, as registered in models.engine.registry.
+        """
+        return registry.classes()
+
+    def attributes(self, cls_name):
+        """
+        Returns the valid attributes and their types for a given class name.
+        """
+        return registry.attributes(cls_name)
+
+    def get(self, cls, id):
+        """
+        Retrieves an object by class and ID, using the primary key index.
+
+        Args:
+            cls (class): The class of the object.
+            id (str): The ID of the object.
+
+        Returns:
+            object: The retrieved object, or None.
+        """
+        key = "{}.{}".format(cls.__name__, id)
+        if key in self.__objects:
+            return self.__objects[key]
+        if self.__dirty.get(key) == "deleted" or \
+                cls.__name__ not in self.classes():
+            return None
+        rows = self.__connection.execute(
+            'SELECT * FROM "{}" WHERE id = ?'.format(cls.__name__), (id,))
+        row = rows.fetchone()
+        if row is None:
+            return None
+        return self.__hydrate(cls.__name__,
+                              [c[0] for c in rows.description], row)
+
+    def delete(self, obj):
+        """
+        Deletes the given object.
+
+        Args:
+            obj: The object to delete.
+        """
+        key = "{}.{}".format(type(obj).__name__, obj.id)
+        if self.get(type(obj), obj.id) is None:
+            return
+        self.__remember(key)
+        del self.__objects[key]
+        if self.__dirty.get(key) == "created":
+            del self.__dirty[key]
+        else:
+            self.__dirty[key] = "deleted"
+
+    def count(self, cls=None):
+        """
+        Returns the number of objects in storage, counting unsaved
+        creations and deletions.
+
+        Args:
+            cls (class, optional): The class of objects to count.
+                If None, counts all objects.
+
+        Returns:
+            int: The number of objects.
+        """
+        count = 0
+        for name, model in self.classes().items():
+            if cls is not None and not issubclass(model, cls):
+                continue
+            count += self.__connection.execute(
+                'SELECT COUNT(*) FROM "{}"'.format(name)).fetchone()[0]
+            for key, state in self.__dirty.items():
+                if key.partition(".")[0] == name:
+                    if state == "created":
+                        count += 1
+                    elif state == "deleted":
+                        count -= 1
+        return count
+
+    def create_index(self, cls, attr, unique=False):
+        """
+        Creates an SQL index on the column of attr, and makes new() and
+        touch() reject duplicate values when unique is True. The class
+        default, such as "", is exempt.
+
+        Raises:
+            ValueError: If unique is True and two stored objects already
+            share a value.
+        """
+        name = cls.__name__
+        if attr in self.__columns(name):
+            with self.__connection:
+                self.__connection.execute(
+                    'CREATE INDEX IF NOT EXISTS "{0}_{1}" ON "{0}" ("{1}")'
+                    .format(name, attr))
+        if not unique:
+            self.__unique.discard((name, attr))
+            return
+        default = getattr(cls, attr, None)
+        seen = {}
+        for key, obj in self.all(cls).items():
+            value = getattr(obj, attr, default)
+            if value != default:
+                if value in seen:
+                    raise ValueError("{}.{} is not unique: {} share {!r}"
+                                     .format(name, attr, ", ".join(
+                                         sorted((seen[value], key))), value))
+                seen[value] = key
+        self.__unique.add((name, attr))
+
+    def find(self, cls, **equals):
+        """
+        Returns the objects of a class, or of its subclasses, whose
+        attributes equal the given values. Scalar columns are matched in
+        SQL; list columns and extra attributes are compared afterwards.
+
+        Args:
+            cls (class): The class of the objects, such as User.
+            **equals: The attribute values to match.
+
+        Returns:
+            list: The matching objects.
+        """
+        objects = {}
+        for name, model in self.classes().items():
+            if not issubclass(model, cls):
+                continue
+            columns = self.__columns(name)
+            where = [attr for attr in equals
+                     if columns.get(attr) in self.__sql_types]
+            query = 'SELECT * FROM "{}"'.format(name)
+            if where:
+                query += " WHERE " + " AND ".join(
+                    '"{}" = ?'.format(attr) for attr in where)
+            rows = self.__connection.execute(
+                query, [equals[attr] for attr in where])
+            names = [c[0] for c in rows.description]
+            for row in rows:
+                key = "{}.{}".format(name, row[0])
+                if self.__dirty.get(key) is None:
+                    objects[key] = self.__objects.get(key) or \
+                        self.__hydrate(name, names, row)
+            for key, state in self.__dirty.items():
+                if state != "deleted" and key.partition(".")[0] == name:
+                    objects[key] = self.__objects[key]
+        return [obj for obj in objects.values()
+                if all(getattr(obj, attr, None) == value
+                       for attr, value in equals.items())]
+
+    def related(self, cls, attr, value):
+        """
+        Returns the objects of a class whose foreign key attr equals
+        value, through the SQL index on that column.
+
+        Args:
+            cls (class): The class of the objects, such as City.
+            attr (str): The foreign key attribute, such as "state_id".
+            value (str): The ID it must equal.
+
+        Returns:
+            list: The matching objects.
+        """
+        return self.find(cls, **{attr: value})
+
+    def range(self, cls, attr, low=None, high=None):
+        """
+        Returns the objects of a class whose numeric attr lies between
+        low and high, both included, in ascending order of attr.
+        """
+        return self.__ordered(cls, attr, low, high)
+
+    def min(self, cls, attr):
+        """
+        Returns the object of a class with the smallest numeric attr, or
+        None.
+        """
+        found = self.__ordered(cls, attr, limit=1)
+        return found[0] if found else None
+
+    def max(self, cls, attr):
+        """
+        Returns the object of a class with the largest numeric attr, or
+        None.
+        """
+        found = self.__ordered(cls, attr, reverse=True, limit=1)
+        return found[0] if found else None
+
+    def ordered(self, cls, attr, reverse=False):
+        """
+        Yields the objects of a class ordered by a numeric attr.
+        """
+        for obj in self.__ordered(cls, attr, reverse=reverse):
+            yield obj
+
+    def changed_since(self, since, cls=None, limit=None):
+        """
+        Returns the objects changed after a point in time or a (time, key)
+        cursor, by ascending updated_at then key, through the index on
+        the updated_at column of each table, merged with unsaved changes.
+        See FileStorage.changed_since().
+        """
+        key = None
+        if isinstance(since, tuple) and len(since) == 2 and \
+                isinstance(since[1], str):
+            since, key = since
+        stamp = None if since is None else indexes.stamp(since)
+        if since is not None and stamp is None:
+            raise ValueError("since must be a datetime, an ISO 8601 string "
+                             "or a (datetime, key) cursor")
+        found = []
+        for name, model in self.classes().items():
+            if cls is not None and not issubclass(model, cls):
+                continue
+            prefix = name + "."
+            query, params = 'SELECT * FROM "{}"'.format(name), ()
+            # Stored dates may lack microseconds: compare the seconds in
+            # SQL, then the full stamps below
+            if key is not None and key.startswith(prefix):
+                query += " WHERE (updated_at, id) > (?, ?)"
+                params = (stamp[:19], key[len(prefix):])
+            elif stamp is not None:
+                query += " WHERE updated_at >= ?"
+                params = (stamp[:19],)
+            rows = self.__connection.execute(
+                query + " ORDER BY updated_at, id", params)
+            saved = (self.__objects.get(key) or
+                     self.__hydrate(name, columns, row)
+                     for key, columns, row in self.__keyed(prefix, rows)
+                     if self.__dirty.get(key) is None)
+            unsaved = (self.__objects[key] for key, state
+                       in self.__dirty.items() if state != "deleted" and
+                       key.startswith(prefix))
+            # The rows come in order, so at most limit of them are read
+            found.extend(itertools.islice(self.__later(saved, stamp, key),
+                                          limit))
+            found.extend(self.__later(unsaved, stamp, key))
+        found.sort(key=lambda item: item[:2])
+        return [obj for value, key, obj in found[:limit]]
+
+    def places_within(self, lat, lon, radius_km):
+        """
+        Returns the places within radius_km kilometres of a point,
+        nearest first, filtering the box around the circle.
+        """
+        found = []
+        for place in self.places_in_bbox(
+                *indexes.radius_bbox(lat, lon, radius_km)):
+            distance = indexes.distance_km(lat, lon, indexes.number(
+                place.latitude), indexes.number(place.longitude))
+            if distance <= radius_km:
+                found.append((distance, place))
+        found.sort(key=lambda pair: pair[0])
+        return [place for distance, place in found]
+
+    def places_in_bbox(self, south, west, north, east):
+        """
+        Returns the places whose coordinates lie inside a box, bounds
+        included, through the index on the latitude column. The box
+        crosses the antimeridian when west is greater than east.
+        """
+        def inside(place):
+            # Coordinates never set are not located at the default 0.0,
+            # as NULL columns are not
+            lat = indexes.number(place.__dict__.get("latitude"))
+            lon = indexes.number(place.__dict__.get("longitude"))
+            if lat is None or lon is None or not south <= lat <= north:
+                return False
+            if west > east:
+                return lon >= west or lon <= east
+            return west <= lon <= east
+
+        return [place for place in self.__ordered(
+            self.classes()["Place"], "latitude", south, north)
+            if inside(place)]
+
+    def places_with_amenities(self, amenity_ids, match="all"):
+        """
+        Returns the places whose amenity_ids hold all of the given
+        amenity IDs, or any of them. The JSON column is narrowed with
+        LIKE, and the lists of the candidates are checked in memory.
+
+        Raises:
+            ValueError: If match is neither "all" nor "any".
+        """
+        if match not in ("all", "any"):
+            raise ValueError("Unknown match: {}".format(match))
+        ids = [getattr(amenity, "id", amenity) for amenity in amenity_ids]
+        if not ids:
+            return []
+        test = all if match == "all" else any
+        clause = (" AND " if match == "all" else " OR ").join(
+            '"amenity_ids" LIKE ?' for amenity_id in ids)
+        rows = self.__connection.execute(
+            'SELECT id FROM "Place" WHERE {}'.format(clause),
+            ["%{}%".format(json.dumps(amenity_id)) for amenity_id in ids])
+        place_ids = {row[0] for row in rows}
+        place_ids.update(key.partition(".")[2] for key, state
+                         in self.__dirty.items() if state != "deleted" and
+                         key.partition(".")[0] == "Place")
+        found = []
+        for place_id in sorted(place_ids):
+            place = self.get(self.classes()["Place"], place_id)
+            if place is not None and test(amenity_id in place.amenity_ids
+                                          for amenity_id in ids):
+                found.append(place)
+        return found
+
+    def where(self, cls, expression, order_by=None, limit=None):
+        """
+        Returns the objects of a class matching a query expression (see
+        FileStorage.where()). The comparisons on columns are run by
+        SQLite, through its indexes; the whole expression is then checked
+        on the rows found and on the unsaved objects.
+
+        Raises:
+            ValueError: If the expression or order_by cannot be parsed.
+        """
+        node, statement, params = self.__statement(cls, expression, order_by)
+        name = cls.__name__
+        rows = self.__connection.execute(statement, params)
+        columns = [c[0] for c in rows.description]
+        objects = {}
+        for row in rows:
+            key = "{}.{}".format(name, row[0])
+            if self.__dirty.get(key) is None:
+                objects[key] = self.__objects.get(key) or \
+                    self.__hydrate(name, columns, row)
+        for key, state in self.__dirty.items():
+            if state != "deleted" and key.partition(".")[0] == name:
+                objects[key] = self.__objects[key]
+        found = [obj for obj in objects.values() if node is None or
+                 node.matches(lambda attr, obj=obj: getattr(obj, attr, None))]
+        if order_by is not None:
+            attr, reverse = query.parse_order(order_by)
+            found = query.sort(found, lambda obj: getattr(obj, attr, None),
+                               reverse)
+        return found[:limit]
+
+    def explain(self, cls, expression, order_by=None, limit=None):
+        """
+        Returns the SQL where() would run and the plan SQLite chooses
+        for it, without running it.
+
+        Raises:
+            ValueError: If the expression or order_by cannot be parsed.
+        """
+        node, statement, params = self.__statement(cls, expression, order_by)
+        lines = ["{}: {}".format(cls.__name__, statement)]
+        for row in self.__connection.execute(
+                "EXPLAIN QUERY PLAN " + statement, params):
+            lines.append("sqlite: {}".format(row[-1]))
+        if node is not None:
+            lines.append("filter: {}".format(node))
+        if order_by is not None:
+            lines.append("order by: {}".format(order_by))
+        if limit is not None:
+            lines.append("limit: {}".format(limit))
+        return "\n".join(lines)
+
+    def group_by(self, cls, attr, value_attr=None):
+        """
+        Returns the count, and the figures of a numeric attribute, per
+        value of attr (see FileStorage.group_by()). Columns are grouped
+        by SQLite; the saved rows of unsaved changes are then replaced by
+        the objects in memory. Attributes without a column are grouped
+        from the objects themselves.
+        """
+        name = cls.__name__
+        attrs = (attr,) if value_attr is None else (attr, value_attr)
+        index = indexes.AggregateIndex(*attrs)
+        if not set(attrs) <= set(self.__columns(name)):
+            for obj in self.iter_all(cls):
+                if type(obj) is cls:
+                    index.add(None, tuple(getattr(obj, a, None)
+                                          for a in attrs))
+            return index.items()
+        # A NULL column stands for the class default, as in __sql(), so
+        # that unset attributes are grouped as FileStorage groups them
+        selected = ", ".join('COALESCE("{}", ?)'.format(a) for a in attrs)
+        defaults = tuple(getattr(cls, a, None) for a in attrs)
+        defaults = tuple(d if isinstance(d, (str, int, float)) else None
+                         for d in defaults)
+        grouping = ", ".join(str(i + 1) for i in range(len(attrs)))
+        for row in self.__connection.execute(
+                'SELECT {}, COUNT(*) FROM "{}" GROUP BY {}'.format(
+                    selected, name, grouping), defaults):
+            index.increment(row[:-1], row[-1])
+        for key, state in self.__dirty.items():
+            if key.partition(".")[0] != name:
+                continue
+            if state != "created":
+                saved = self.__connection.execute(
+                    'SELECT {} FROM "{}" WHERE id = ?'.format(selected, name),
+                    defaults + (key.partition(".")[2],)).fetchone()
+                if saved is not None:
+                    index.increment(saved, -1)
+            if state != "deleted":
+                obj = self.__objects[key]
+                index.add(key, tuple(getattr(obj, a, None) for a in attrs))
+        return index.items()
+
+    def search(self, query, cls=None, limit=None):
+        """
+        Returns the places and reviews whose text holds words of query,
+        best first. The candidates are read with a LIKE filter on each
+        word, then ranked among themselves by BM25 as in FileStorage.
+        """
+        words = sorted(set(indexes.tokenize(query)))
+        ranked = []
+        for name, attrs in (("Place", ("name", "description")),
+                            ("Review", ("text",))):
+            model = self.classes()[name]
+            if not words or cls is not None and not issubclass(model, cls):
+                continue
+            where = " OR ".join('"{}" LIKE ?'.format(attr)
+                                for attr in attrs for word in words)
+            params = ["%{}%".format(word) for attr in attrs
+                      for word in words]
+            rows = self.__connection.execute(
+                'SELECT id FROM "{}" WHERE {}'.format(name, where), params)
+            ids = {row[0] for row in rows}
+            ids.update(key.partition(".")[2] for key, state
+                       in self.__dirty.items() if state != "deleted" and
+                       key.partition(".")[0] == name)
+            index = indexes.TextIndex(*attrs)
+            objects = {}
+            for obj_id in ids:
+                obj = self.get(model, obj_id)
+                if obj is not None:
+                    objects[obj_id] = obj
+                    index.add(obj_id, tuple(getattr(obj, attr, None)
+                                            for attr in attrs))
+            ranked.extend((score, objects[obj_id])
+                          for score, obj_id in index.search(query))
+        ranked.sort(key=lambda pair: -pair[0])
+        return [obj for score, obj in ranked[:limit]]
+
+    def stats(self):
+        """
+        Returns the size of the dirty set and the cumulative write counters.
+        """
+        stats = {"objects": self.count(), "dirty": len(self.__dirty),
+                 "created": 0, "modified": 0, "deleted": 0}
+        for state in self.__dirty.values():
+            stats[state] += 1
+        stats.update(self.__counters)
+        return stats
+
+    def begin(self):
+        """
+        Opens a batch. Saves are deferred until the outermost commit().
+        """
+        self.__batches.append(({}, dict(self.__dirty)))
+
+    def commit(self):
+        """
+        Closes the innermost batch, saving once the outermost one closes.
+        """
+        if not self.__batches:
+            return
+        undo = self.__batches.pop()[0]
+        if self.__batches:
+            for key, original in undo.items():
+                self.__batches[-1][0].setdefault(key, original)
+        else:
+            self.save()
+
+    def rollback(self):
+        """
+        Closes the innermost batch and restores the objects it changed.
+        """
+        if not self.__batches:
+            return
+        undo, dirty = self.__batches.pop()
+        for key, (obj, attrs) in undo.items():
+            self.__objects.pop(key, None)
+            if obj is not None:
+                obj.__dict__.clear()
+                obj.__dict__.update(attrs)
+                self.__objects[key] = obj
+        self.__dirty.clear()
+        self.__dirty.update(dirty)
+
+    def in_batch(self):
+        """
+        Returns True while a batch is open.
+        """
+        return len(self.__batches) > 0
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Runs the body of a with statement as a batch: its changes are
+        saved once on success and rolled back if it raises.
+        """
+        self.begin()
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+    def __remember(self, key):
+        """
+        Records the current state of key in the innermost batch, the first
+        time the batch changes it.
+        """
+        if not self.__batches or key in self.__batches[-1][0]:
+            return
+        obj = self.__objects.get(key)
+        attrs = copy.deepcopy(obj.__dict__) if obj is not None else None
+        self.__batches[-1][0][key] = (obj, attrs)
+
+    def __check(self, obj, attr, value):
+        """
+        Raises ValueError if another object holds value in a unique attr.
+        """
+        if value == getattr(type(obj), attr, None):
+            return
+        for other in self.find(type(obj), **{attr: value}):
+            if other is not obj:
+                raise ValueError("{}.{} must be unique: {!r} is used by {}.{}"
+                                 .format(type(obj).__name__, attr, value,
+                                         type(other).__name__, other.id))
+
+    def __ordered(self, cls, attr, low=None, high=None, reverse=False,
+                  limit=None):
+        """
+        Returns the objects of a class with a numeric attr between low
+        and high, sorted by attr in SQL and merged with unsaved changes.
+        """
+        name = cls.__name__
+        objects = {}
+        if self.__columns(name).get(attr) in (int, float):
+            where, params = ['"{}" IS NOT NULL'.format(attr)], []
+            if low is not None:
+                where.append('"{}" >= ?'.format(attr))
+                params.append(low)
+            if high is not None:
+                where.append('"{}" <= ?'.format(attr))
+                params.append(high)
+            query = 'SELECT * FROM "{}" WHERE {} ORDER BY "{}"{}'.format(
+                name, " AND ".join(where), attr, " DESC" if reverse else "")
+            if limit is not None:
+                query += " LIMIT {:d}".format(limit + len(self.__dirty))
+            rows = self.__connection.execute(query, params)
+            names = [c[0] for c in rows.description]
+            for row in rows:
+                key = "{}.{}".format(name, row[0])
+                if self.__dirty.get(key) is None:
+                    objects[key] = self.__objects.get(key) or \
+                        self.__hydrate(name, names, row)
+            candidates = [self.__objects[key] for key, state
+                          in self.__dirty.items() if state != "deleted" and
+                          key.partition(".")[0] == name]
+        else:
+            candidates = self.all(cls).values()
+        for obj in candidates:
+            objects["{}.{}".format(type(obj).__name__, obj.id)] = obj
+        found = []
+        for obj in objects.values():
+            value = indexes.number(getattr(obj, attr, None))
+            if value is not None and (low is None or value >= low) and \
+                    (high is None or value <= high):
+                found.append((value, obj))
+        found.sort(key=lambda pair: pair[0], reverse=reverse)
+        return [obj for value, obj in found[:limit]]
+
+    def __columns(self, name):
+        """
+        Returns the typed columns of the table of a class, id first.
+        """
+        return registry.fields(name)
+
+    def __create_table(self, name):
+        """
+        Creates the table of a class, or adds the columns it lacks.
+        """
+        columns = self.__columns(name)
+        self.__connection.execute(
+            'CREATE TABLE IF NOT EXISTS "{}" (id TEXT PRIMARY KEY, '
+            '_extra TEXT)'.format(name))
+        existing = {row[1] for row in self.__connection.execute(
+            'PRAGMA table_info("{}")'.format(name))}
+        for column, kind in columns.items():
+            if column not in existing:
+                self.__connection.execute(
+                    'ALTER TABLE "{}" ADD COLUMN "{}" {}'.format(
+                        name, column, self.__sql_types.get(kind, "TEXT")))
+        indexed = list(self.__foreign_keys.get(name, ())) + ["updated_at"]
+        if name == "Place":
+            indexed += [column for column, kind in columns.items()
+                        if kind in (int, float)]
+        for column in indexed:
+            self.__connection.execute(
+                'CREATE INDEX IF NOT EXISTS "{0}_{1}" ON "{0}" ("{1}")'.format(
+                    name, column))
+
+    def __to_row(self, obj):
+        """
+        Returns the column names and values of the row storing obj.
+        """
+        data = obj.to_dict()
+        del data["__class__"]
+        columns = self.__columns(type(obj).__name__)
+        names, values = [], []
+        for column, kind in columns.items():
+            if column in data:
+                value = data.pop(column)
+                if kind is list:
+                    value = json.dumps(value)
+                names.append(column)
+                values.append(value)
+        names.append("_extra")
+        values.append(json.dumps(data))
+        return names, values
+
+    def __statement(self, cls, expression, order_by):
+        """
+        Parses a query expression and returns the tree (or None), and the
+        SELECT statement and parameters fetching its candidate rows.
+        """
+        node = query.parse(expression) if expression else None
+        if order_by is not None:
+            query.parse_order(order_by)
+        statement = 'SELECT * FROM "{}"'.format(cls.__name__)
+        condition = None if node is None else self.__sql(cls, node)
+        if condition is None:
+            return node, statement, []
+        return node, statement + " WHERE " + condition[0], condition[1]
+
+    def __sql(self, cls, node):
+        """
+        Returns an SQL condition and its parameters selecting at least
+        the rows matching node, or None if node cannot be translated.
+        Comparisons are only translated when the literal has the type of
+        the column; a NULL column stands for the class default.
+        """
+        if isinstance(node, query.Comparison):
+            kind = self.__columns(cls.__name__).get(node.attr)
+            numeric = isinstance(node.value, (int, float))
+            if kind not in ((int, float) if numeric else (str,)):
+                return None
+            clause = '"{}" {} ?'.format(node.attr, node.op)
+            if node.matches(lambda attr: getattr(cls, attr, None)):
+                clause = '({} OR "{}" IS NULL)'.format(clause, node.attr)
+            return clause, [node.value]
+        if isinstance(node, query.Or):
+            parts = [self.__sql(cls, term) for term in node.terms]
+            if any(part is None for part in parts):
+                return None
+            return "(" + " OR ".join(part[0] for part in parts) + ")", \
+                [param for part in parts for param in part[1]]
+        if isinstance(node, query.And):
+            parts = [part for part in (self.__sql(cls, term)
+                                       for term in node.terms)
+                     if part is not None]
+            if not parts:
+                return None
+            return "(" + " AND ".join(part[0] for part in parts) + ")", \
+                [param for part in parts for param in part[1]]
+        return None
+
+    def __iter_rows(self, cls, offset, after, limit):
+        """
+        Yields (key, columns, row) for the objects of cls, or of every
+        object, in key order, with row None for unsaved objects. Rows
+        deleted since the last save are skipped.
+        """
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError("offset and limit must not be negative")
+        streams = []
+        for name, model in self.classes().items():
+            if cls is not None and not issubclass(model, cls):
+                continue
+            prefix = name + "."
+            statement, params = 'SELECT * FROM "{}"'.format(name), ()
+            if after is not None and after.startswith(prefix):
+                statement += " WHERE id > ?"
+                params = (after[len(prefix):],)
+            elif after is not None and after > prefix:
+                continue
+            rows = self.__connection.execute(statement + " ORDER BY id",
+                                             params)
+            saved = self.__keyed(prefix, rows)
+            created = sorted((key, None, None)
+                             for key, state in self.__dirty.items()
+                             if state == "created" and
+                             key.startswith(prefix) and
+                             (after is None or key > after))
+            streams.append(heapq.merge(saved, created,
+                                       key=lambda item: item[0]))
+        merged = (item for item in heapq.merge(*streams,
+                                               key=lambda item: item[0])
+                  if self.__dirty.get(item[0]) != "deleted")
+        stop = None if limit is None else offset + limit
+        yield from itertools.islice(merged, offset, stop)
+
+    @staticmethod
+    def __later(objects, stamp, key=None):
+        """
+        Yields (updated_at stamp, key, object) for the objects updated
+        after stamp, or at stamp with a key after key if one is given,
+        or for every object with a date if stamp is None.
+        """
+        for obj in objects:
+            value = indexes.stamp(obj.__dict__.get("updated_at"))
+            obj_key = "{}.{}".format(type(obj).__name__, obj.id)
+            if value is None or stamp is not None and (
+                    value < stamp or value == stamp and
+                    (key is None or obj_key <= key)):
+                continue
+            yield value, obj_key, obj
+
+    @staticmethod
+    def __keyed(prefix, rows):
+        """
+        Yields (key, columns, row) for each row of a table cursor.
+        """
+        columns = [c[0] for c in rows.description]
+        for row in rows:
+            yield "{}{}".format(prefix, row[0]), columns, row
+
+    def __hydrate(self, name, columns, row):
+        """
+        Builds the instance stored in a row and adds it to the identity map.
+        """
+        types = self.__columns(name)
+        data = {"__class__": name}
+        for column, value in zip(columns, row):
+            if column == "_extra":
+                data.update(json.loads(value or "{}"))
+            elif value is not None:
+                if types.get(column) is list:
+                    value = json.loads(value)
+                data[column] = value
+        obj = self.classes()[name].from_record(data)
+        self.__objects["{}.{}".format(name, obj.id)] = obj
+        return obj
@@ -7,16 +7,180 @@ the serialization and deserialization
 of objects to and from JSON format. It manages the storage of objects
 in a file-based database.
 
+Changes are not written to the JSON file one by one. Every save()
+appends the objects created, updated or deleted since the previous save
+to a journal file (file.json.log) as one JSON record per line, so the
+cost of a save depends on the size of the change rather than on the
+size of the store. reload() reads the snapshot and replays the journal
+on top of it. Once the journal grows larger than the store, it is
+folded back into the snapshot by compact().
+
+The JSON file is read and written one record at a time (see
+json_stream), and a file path ending in ".jsonl" stores one record per
+line instead of a single JSON object. The JSON text of an object is
+cached until one of its attributes is set, so rewriting a snapshot or
+shard after a few changes re-encodes only the objects that changed;
+stats() reports the hit rate of the cache.
+
+configure(shards=n) switches to a sharded layout: each class is stored
+in its own files (file.User.json, or file.User.0.json to
+file.User.<n-1>.json when hash-partitioned), a save rewrites only the
+shards holding dirty keys, and reload() decodes the shards in a process
+pool, recording how long each one took.
+
+Snapshot and shard files are never written in place: the new content
+goes to a temporary file that is renamed over the old one, which is kept
+as a ".bak" file. compact() likewise keeps the journal it folded in as
+file.json.log.bak, so that the ".bak" snapshot and that journal together
+hold the store as compacted. If reload() finds a torn file it loads the
+".bak" version instead, replaying file.json.log.bak over it, and it
+cuts a torn record off the end of the journal.
+configure(durability=...) chooses when writes are fsynced: "none",
+"batch" or "fsync-every-commit"; stats() counts the fsyncs and the time
+they took.
+
+reload() does not build model instances. It keeps the decoded records
+and turns one into an instance the first time get() or all() returns
+it; that instance is then cached in __objects. all() without a class,
+or materialize(), hydrates the whole store. configure(compact=True)
+builds those instances from slotted subclasses of the models (see
+compact), which store the schema attributes without a dictionary.
+
+The foreign keys City.state_id, Place.city_id, Place.user_id,
+Review.place_id and Review.user_id are indexed (see indexes), so that
+related() and the relationship properties of the models, such as
+state.cities or place.reviews, cost the size of their result.
+create_index(cls, attr) adds a hash index on any other attribute, which
+find(cls, **equals) then uses instead of scanning the class; a unique
+index makes new() and attribute assignment raise ValueError when another
+object already holds the value.
+
+The int and float attributes of Place, such as price_by_night, have a
+sorted index, so that range(), min(), max() and ordered() cost
+O(log n + k) for k results instead of a scan; any other numeric
+attribute is sorted for each query, and no index is kept for it.
+Place.latitude and Place.longitude are also bucketed in a grid index,
+so that places_within() and places_in_bbox() only visit the cells
+overlapping the area searched. Place.amenity_ids feeds a bitmap index, so that
+places_with_amenities() filters on several amenities with bitwise AND
+or OR instead of scanning every list. Lists are indexed when assigned:
+changing one in place is only seen at the next assignment.
+
+Place.name, Place.description and Review.text feed a full-text inverted
+index; search() ranks the matches by BM25. compact() saves the text
+indexes next to the snapshot (file.json.fts), with the size and mtime of
+the snapshot files, and reload() restores them instead of re-tokenizing
+every record when the snapshot is unchanged.
+
+group_by(cls, attr, value_attr=None) answers "places per city" kinds of
+questions from an aggregate index, which keeps the count and the sum,
+minimum and maximum of a numeric attribute per group as objects come,
+go and change, instead of scanning the class.
+
+where(cls, expression, order_by=None, limit=None) filters a class with
+an expression such as "price_by_night < 100 and city_id == 'x'"
+(see query): the planner answers it from the most selective hash or
+range index, or walks a range index in order when order_by has one and
+no index narrows the search, and falls back to a full scan. explain()
+returns the plan without running it.
+
+Inside a batch (see batch(), or begin()/commit()/rollback()) save() does
+nothing; the changes are written by a single save at the outermost
+commit, and rollback() restores the objects as they were when the batch
+began.
+
 Attributes:
     __file_path (str): The path to the JSON file where objects are stored.
-    __objects (dict): A dictionary containing all loaded objects,
+    __objects (dict): A dictionary containing all hydrated objects,
     with their class name and ID as keys.
+    __records (dict): The decoded records not hydrated yet, with the
+    same keys.
+    __by_class (dict): The keys of __objects and __records grouped by
+    class name, so that all(cls) and count(cls) only visit the
+    requested classes.
+    __key_order (dict): The sorted keys of each class, built the first
+    time iter_all() or page() walks the class and dropped whenever the
+    class gains or loses a key.
+    __encoded (dict): The JSON text of each object or record serialized
+    since it last changed, with copies of its list and dictionary values.
+    __dirty (dict): The keys changed since the last save, mapped to
+    "created", "modified" or "deleted".
+    __journal_size (int): The number of records in the journal.
+    __journal_limit (int): The minimum journal size before compaction.
+    __shards (int): The number of partitions per class, or 0 for the
+    single-file layout.
+    __durability (str): When writes are fsynced: "none", "batch" or
+    "fsync-every-commit".
+    __load_timings (dict): The seconds spent decoding each file during
+    the last reload.
+    __batches (list): One (undo, dirty) pair per open batch, holding the
+    original state of every key the batch changed.
+    __indexes (dict): The secondary indexes of each class name, as
+    (index, class defaults) pairs, kept current by new(), delete(),
+    touch() and reload().
+    __foreign_keys (dict): The attributes that hold the ID of another
+    object, which get a hash index for related().
+    __text_attributes (dict): The attributes of each class covered by
+    the full-text index.
 
 Methods:
     all(self, cls=None): Retrieves all objects or objects of a specific class.
     new(self, obj): Adds a new object to the storage.
-    save(self): Saves all objects to the JSON file.
-    reload(self): Loads objects from the JSON file.
+    touch(self, obj, name=None, value=None): Marks an object as modified
+    and updates the indexes on the attribute being set.
+    save(self): Appends the dirty objects to the journal, or rewrites
+    their shards.
+    configure(self, shards=None, durability=None, compact=None): Changes
+    the on-disk layout, the durability policy and the in-memory form of
+    loaded objects.
+    compact(self): Rewrites the JSON file and truncates the journal.
+    reload(self): Loads records from the JSON file and the journal.
+    iter_all(self, cls=None, offset=0, after=None, limit=None): Yields the
+    objects one at a time, in key order.
+    page(self, cls=None, after=None, limit=100): Returns a page of objects
+    and the cursor of the next one.
+    iter_records(self, cls=None): Scans the stored records without
+    loading them into memory.
+    create_index(self, cls, attr, unique=False): Adds a hash index on an
+    attribute of a class.
+    find(self, cls, **equals): Returns the objects whose attributes equal
+    the given values.
+    related(self, cls, attr, value): Returns the objects of a class whose
+    foreign key attr equals value.
+    range(self, cls, attr, low=None, high=None): Returns the objects whose
+    numeric attr lies between low and high.
+    min(self, cls, attr), max(self, cls, attr): Return the object with the
+    smallest or largest numeric attr.
+    ordered(self, cls, attr, reverse=False): Yields the objects ordered by
+    a numeric attr.
+    changed_since(self, since, cls=None, limit=None): Returns the objects
+    changed after a point in time or a (time, key) cursor, by ascending
+    updated_at.
+    places_within(self, lat, lon, radius_km): Returns the places within a
+    distance of a point, nearest first.
+    places_in_bbox(self, south, west, north, east): Returns the places
+    inside a latitude/longitude box.
+    search(self, query, cls=None, limit=None): Returns the places and
+    reviews matching words, best first.
+    places_with_amenities(self, amenity_ids, match="all"): Returns the
+    places offering all, or any, of the given amenities.
+    group_by(self, cls, attr, value_attr=None): Returns the count, and
+    the sum, min, max and mean of a numeric attribute, per value of attr.
+    where(self, cls, expression, order_by=None, limit=None): Returns the
+    objects matching a query expression.
+    explain(self, cls, expression, order_by=None, limit=None): Describes
+    how where() would run.
+    materialize(self): Hydrates every record still pending.
+    stats(self): Returns the dirty-set size and write counters.
+    subscribe(self, callback, after=None): Sends the change events of
+    every save to a callback, replaying those after a sequence number.
+    unsubscribe(self, callback): Stops sending events to a callback.
+    events(self, after=0): Yields the events of the change feed file.
+    seq(self): Returns the sequence number of the last change event.
+    begin(self): Opens a batch in which saves are deferred.
+    commit(self): Closes the innermost batch.
+    rollback(self): Undoes the changes of the innermost batch.
+    batch(self): Context manager around begin/commit/rollback.
     attributes(self, cls_name): Returns the valid attributes and their
     types for a given class name.
 
@@ -33,6 +197,15 @@ Usage:
     # Retrieving objects of a specific class
     user_objects = storage.all(User)
 
+    # Paging through the objects of a class
+    users, cursor = storage.page(User, limit=50)
+    while cursor is not None:
+        users, cursor = storage.page(User, after=cursor, limit=50)
+
+    # Syncing the changes made since the last run, 100 at a time
+    for obj in storage.changed_since(cursor, limit=100):
+        cursor = (obj.updated_at, "{}.{}".format(type(obj).__name__, obj.id))
+
     # Adding a new object to storage
     new_user = User()
     storage.new(new_user)
@@ -40,14 +213,96 @@ Usage:
     # Saving objects to the JSON file
     storage.save()
 
+    # Folding the journal into the JSON file
+    storage.compact()
+
+    # Inspecting the dirty set and write counters
+    storage.stats()
+
+    # Following the saved changes, from the last event handled
+    storage.subscribe(lambda event: print(event["seq"], event["op"],
+                                           event["key"]), after=last_seq)
+
+    # Saving many changes at once
+    with storage.batch():
+        for i in range(1000):
+            Place().save()
+
     # Retrieving attributes of a class
     attributes = storage.attributes("User")
 
 Authors: Ukpono Umoren & Alexander Udeogaranya
 """
-import datetime
+import bisect
+import concurrent.futures
+import contextlib
+import copy
+import glob
+import heapq
+import itertools
 import json
 import os
+import re
+import shutil
+import time
+import zlib
+
+from models.engine import compact
+from models.engine import indexes
+from models.engine import json_stream
+from models.engine import query
+from models.engine import registry
+
+
+def _iter_file(path):
+    """
+    Yields the (key, record) pairs of a snapshot or shard file one at a
+    time. A path ending in ".jsonl" holds one record per line; any other
+    path holds a single JSON object.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield "{}.{}".format(record["__class__"],
+                                         record["id"]), record
+        else:
+            yield from json_stream.iter_items(f)
+
+
+def _is_torn(path):
+    """
+    Returns True if a snapshot or shard file cannot be trusted: it is
+    empty (a complete file always holds at least "{}" or one line) and a
+    previous version of it exists.
+    """
+    return os.path.getsize(path) == 0 and os.path.isfile(path + ".bak")
+
+
+def _load_file(path):
+    """
+    Decodes a whole snapshot or shard file, falling back to its previous
+    version (path + ".bak") if it is torn. Run in worker processes by
+    reload().
+
+    Returns:
+        tuple: The path, its (key, record) pairs, the seconds spent and
+        whether the previous version had to be used.
+
+    Raises:
+        ValueError: If the file is torn and has no previous version.
+    """
+    start = time.perf_counter()
+    try:
+        if _is_torn(path):
+            raise ValueError("Empty file: {}".format(path))
+        items, recovered = list(_iter_file(path)), False
+    except ValueError:
+        if not os.path.isfile(path + ".bak"):
+            raise
+        items, recovered = list(_iter_file(path + ".bak")), True
+    return path, items, time.perf_counter() - start, recovered
 
 
 class FileStorage:
@@ -59,17 +314,71 @@ class FileStorage:
 
     Attributes:
         __file_path (str): The path to the JSON file where objects are stored.
-        __objects (dict): A dictionary containing all loaded objects,
+        __objects (dict): A dictionary containing all hydrated objects,
         with their class name and ID as keys.
+        __records (dict): The decoded records not hydrated yet.
+        __by_class (dict): The keys of __objects and __records grouped by
+        class name.
+        __key_order (dict): The sorted keys of each class, built when first
+        paged through and dropped whenever the class gains or loses a key.
+        __encoded (dict): The JSON text of each object or record written
+        since it last changed, reused by the next snapshot or shard
+        rewrite.
+        __dirty (dict): The keys changed since the last save, mapped to
+        "created", "modified" or "deleted".
+        __journal_size (int): The number of records in the journal.
+        __journal_limit (int): The minimum journal size before compaction.
+        __counters (dict): Cumulative write counters reported by stats().
+        __batches (list): One (undo, dirty) pair per open batch.
+        __feed (bool): Whether saved changes are appended to the change
+        feed file.
+        __seq (int): The sequence number of the last change event.
+        __subscribers (list): The callbacks receiving change events.
     """
 
     __file_path = "file.json"
     __objects = {}
+    __records = {}
+    __by_class = {}
+    __key_order = {}
+    __encoded = {}
+    __dirty = {}
+    __journal_size = 0
+    __journal_limit = 1000
+    __counters = {"flushes": 0, "flushed": 0, "compactions": 0,
+                  "bytes_written": 0, "shards_written": 0,
+                  "fsyncs": 0, "fsync_seconds": 0.0, "recoveries": 0,
+                  "indexes_restored": 0, "encode_hits": 0,
+                  "encode_misses": 0, "events": 0, "subscriber_errors": 0,
+                  "feed_recoveries": 0}
+    __indexes = {}
+    __foreign_keys = {"City": ("state_id",),
+                      "Place": ("city_id", "user_id"),
+                      "Review": ("place_id", "user_id")}
+    __text_attributes = {"Place": ("name", "description"),
+                         "Review": ("text",)}
+    __aggregates = {"City": (("state_id", None),),
+                    "Place": (("city_id", "price_by_night"),
+                              ("user_id", "price_by_night")),
+                    "Review": (("place_id", None), ("user_id", None))}
+    __restored = ()
+    __durability = "none"
+    __compact = False
+    __feed = False
+    __seq = 0
+    __subscribers = []
+    __durability_modes = ("none", "batch", "fsync-every-commit")
+    __shards = 0
+    __parallel_threshold = 1 << 20
+    __load_timings = {}
+    __batches = []
 
     def all(self, cls=None):
         """
         Retrieves all objects or objects of a specific class.
 
+        Only the records of the requested classes are hydrated.
+
         Args:
             cls (class): The class of objects to retrieve.
             If None, retrieves all objects.
@@ -78,118 +387,1572 @@ class FileStorage:
             dict: A dictionary containing the retrieved objects.
         """
         if cls is None:
+            self.materialize()
             return self.__objects
         else:
             filtered_objects = {}
-            for key, value in self.__objects.items():
-                if isinstance(value, cls):
-                    filtered_objects[key] = value
+            for name in self.__class_names(cls):
+                for key in self.__by_class[name]:
+                    filtered_objects[key] = self.__lookup(key)
             return filtered_objects
 
+    def iter_all(self, cls=None, offset=0, after=None, limit=None):
+        """
+        Yields the objects of storage one at a time, in key order.
+
+        Unlike all(), nothing is collected up front: each record is only
+        hydrated when the iteration reaches it.
+
+        Args:
+            cls (class, optional): The class of objects to yield.
+                If None, yields all objects.
+            offset (int): The number of objects to skip first.
+            after (str, optional): A key returned by page(); only the
+                objects whose key sorts after it are yielded.
+            limit (int, optional): The maximum number of objects to yield.
+
+        Yields:
+            BaseModel: The objects, in "<class name>.<id>" order.
+        """
+        for key in self.__iter_keys(cls, offset, after, limit):
+            obj = self.__lookup(key)
+            if obj is not None:
+                yield obj
+
+    def page(self, cls=None, after=None, limit=100):
+        """
+        Returns one page of objects in key order, and the cursor of the
+        next page.
+
+        Args:
+            cls (class, optional): The class of objects to return.
+            after (str, optional): The cursor returned for the previous
+                page, or None for the first page.
+            limit (int): The number of objects per page, at least 1.
+
+        Returns:
+            tuple: The list of objects and the cursor to pass as after to
+            get the next page, or None if this is the last page.
+
+        Raises:
+            ValueError: If limit is less than 1.
+        """
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        keys = list(self.__iter_keys(cls, 0, after, limit + 1))
+        cursor = keys[limit - 1] if len(keys) > limit else None
+        return [self.__lookup(key) for key in keys[:limit]], cursor
+
     def new(self, obj):
         """
         Sets new obj in __objects dictionary.
         """
         key = "{}.{}".format(type(obj).__name__, obj.id)
-        self.__objects[key] = obj
+        current = self.__lookup(key)
+        if current is not obj:
+            self.__check(key, obj)
+        self.__remember(key)
+        self.__encoded.pop(key, None)
+        state = self.__dirty.get(key)
+        if current is None:
+            self.__dirty[key] = "modified" if state == "deleted" \
+                else "created"
+        elif state is None:
+            self.__dirty[key] = "modified"
+        if current is not obj:
+            if current is not None:
+                self.__remove(key)
+            self.__add(key, obj)
+
+    def touch(self, obj, name=None, value=None):
+        """
+        Marks obj as modified so that the next save() journals it, and
+        moves it within the indexes on the attribute being set.
+
+        BaseModel calls this whenever one of its attributes is set,
+        before the new value is stored.
+
+        Args:
+            obj: The object being modified.
+            name (str): The name of the attribute being set.
+            value: The new value of the attribute.
+
+        Raises:
+            ValueError: If a unique index already holds the new value.
+        """
+        key = "{}.{}".format(type(obj).__name__, getattr(obj, "id", None))
+        if self.__objects.get(key) is not obj:
+            return
+        moves = []
+        for index, defaults in self.__indexes.get(type(obj).__name__, ()):
+            if name in index.attrs:
+                old = self.__values(key, index.attrs, defaults)
+                new = tuple(value if attr == name else v
+                            for attr, v in zip(index.attrs, old))
+                if new != old:
+                    self.__check_values(index, defaults, key, new)
+                    moves.append((index, old, new))
+        self.__remember(key)
+        self.__encoded.pop(key, None)
+        for index, old, new in moves:
+            index.remove(key, old)
+            index.add(key, new)
+        if key not in self.__dirty:
+            self.__dirty[key] = "modified"
 
     def save(self):
         """
-        Serializes __objects to JSON file.
+        Appends the dirty objects to the journal, one record per line,
+        or rewrites the shards that hold them in the sharded layout.
+
+        Only the objects created, modified or deleted since the last save
+        are serialized. Inside a batch, nothing is written until commit.
+        The write is fsynced in the "fsync-every-commit" durability mode.
+        """
+        if self.__batches:
+            return
+        self.__flush(self.__durability == "fsync-every-commit")
+
+    def __flush(self, sync):
+        """
+        Writes the dirty objects out, fsyncing the files if sync is True.
+        """
+        if not self.__dirty:
+            return
+        if self.__shards:
+            self.__write_shards({self.__shard_of(key)
+                                 for key in self.__dirty}, sync)
+        else:
+            written = 0
+            with open(self.__journal_path(), "a", encoding="utf-8") as f:
+                for key, state in self.__dirty.items():
+                    if state == "deleted":
+                        line = json.dumps({"op": "delete", "key": key})
+                    else:
+                        line = '{{"op": "set", "key": {}, "value": {}}}' \
+                            .format(json.dumps(key), self.__encode(key))
+                    line += "\n"
+                    f.write(line)
+                    written += len(line)
+                if sync:
+                    self.__fsync(f)
+            self.__counters["bytes_written"] += written
+            FileStorage.__journal_size += len(self.__dirty)
+        self.__publish(sync)
+        self.__counters["flushes"] += 1
+        self.__counters["flushed"] += len(self.__dirty)
+        self.__dirty.clear()
+        if self.__journal_size > max(self.__journal_limit,
+                                     self.count()):
+            self.compact()
+
+    def compact(self):
+        """
+        Serializes the whole store to JSON file, or to every shard file,
+        and truncates the journal. Records that were never hydrated are
+        written back as they are. This is also how a store moves to a
+        new layout after configure(): the snapshot files of the other
+        layouts are removed once the new ones are written.
+
+        Replaying a journal over a snapshot that already contains its
+        records is harmless, so a crash between the two steps loses
+        nothing. The journal is not deleted but kept as the journal of
+        the previous snapshot (path + ".log.bak"), which reload() replays
+        if it has to fall back on that snapshot. The change feed is
+        rotated to path + ".feed.1", replacing the events rotated out by
+        the previous compaction.
         """
-        with open(self.__file_path, "w", encoding="utf-8") as f:
-            d = {k: v.to_dict() for k, v in self.__objects.items()}
-            json.dump(d, f)
+        sync = self.__durability != "none"
+        if self.__shards:
+            self.__write_shards({(name, part)
+                                 for name in self.__by_class
+                                 for part in range(self.__shards)}, sync)
+        else:
+            self.__write_file(self.__file_path, self.__iter_store(), sync)
+        for path in self.__stray_paths():
+            for stale in (path, path + ".bak"):
+                if os.path.isfile(stale):
+                    os.remove(stale)
+        journal = self.__journal_path()
+        if os.path.isfile(journal):
+            os.replace(journal, journal + ".bak")
+        elif os.path.isfile(journal + ".bak"):
+            os.remove(journal + ".bak")
+        self.__write_text_indexes(sync)
+        self.__publish(sync)
+        if os.path.isfile(self.__feed_path()):
+            os.replace(self.__feed_path(), self.__feed_path() + ".1")
+        self.__counters["compactions"] += 1
+        FileStorage.__journal_size = 0
+        self.__dirty.clear()
 
     def reload(self):
         """
-        Deserializes JSON file into __objects.
+        Deserializes JSON file into __records and replays the journal.
+        Instances are only built when first accessed. The indexes of the
+        classes removed from the registry are dropped.
+
+        Snapshot files left by another layout than the configured one,
+        such as file.json and its journal after switching to shards, are
+        loaded first, then those of the configured layout, whose records
+        win, and the store is compacted into the configured layout.
+        """
+        self.__objects.clear()
+        self.__records.clear()
+        self.__by_class.clear()
+        self.__key_order.clear()
+        self.__encoded.clear()
+        classes = self.classes()
+        for name in list(self.__indexes):
+            if name not in classes:
+                del self.__indexes[name]
+                continue
+            for index, defaults in self.__indexes[name]:
+                index.clear()
+        self.__default_indexes()
+        self.__dirty.clear()
+        del self.__batches[:]
+        FileStorage.__journal_size = 0
+        self.__load_timings.clear()
+        strays = self.__stray_paths()
+        # Sharded saves never append to the journal: one found then was
+        # left with the JSON file, and is older than the shards
+        stale = bool(self.__shards) and \
+            os.path.isfile(self.__journal_path())
+        paths = [path for path in self.__snapshot_paths()
+                 if os.path.isfile(path)]
+        recoveries = self.__counters["recoveries"]
+        if not strays and not stale:
+            FileStorage.__restored = self.__read_text_indexes(paths)
+        try:
+            self.__load_files(strays)
+            if stale:
+                self.__replay(self.__journal_paths(False))
+            self.__load_files(paths)
+        finally:
+            restored, FileStorage.__restored = self.__restored, ()
+        recovered = self.__counters["recoveries"] != recoveries
+        if recovered:
+            for name, index, defaults in restored:
+                self.__rebuild(name, index, defaults)
+        if not stale:
+            self.__replay(self.__journal_paths(recovered))
+        FileStorage.__seq = max(self.__seq, self.__feed_tail())
+        if strays or stale:
+            self.compact()
+
+    def __load_files(self, paths):
+        """
+        Loads snapshot or shard files into __records, in a process pool
+        if there are several and they are large.
+        """
+        if len(paths) > 1 and sum(os.path.getsize(path) for path in paths) \
+                >= self.__parallel_threshold:
+            self.__load_parallel(paths)
+        else:
+            for path in paths:
+                self.__load_file(path)
+
+    def __replay(self, journals):
+        """
+        Applies the records of the journals, in order, to __records.
+        """
+        for path in journals:
+            for offset, entry in self.__read_journal(
+                    path, repair=path == self.__journal_path()):
+                self.__remove(entry["key"])
+                if entry["op"] == "set":
+                    self.__add_record(entry["key"], entry["value"])
+                FileStorage.__journal_size += 1
+
+    def iter_records(self, cls=None):
+        """
+        Yields the (key, record) pairs of the store, or of one class,
+        without loading it into memory.
+
+        The JSON file is read one record at a time. The journal is
+        scanned once to find the last record of every key it changes,
+        and unsaved changes are taken from memory. Nothing is hydrated
+        or cached, so the scan works on stores larger than memory.
+
+        Args:
+            cls (class, optional): The class of records to yield.
+                If None, yields every record.
+
+        Yields:
+            tuple: The key and the dictionary form of each object.
+        """
+        names = None
+        if cls is not None:
+            names = {name for name, model in self.classes().items()
+                     if issubclass(model, cls)}
+            names.add(cls.__name__)
+
+        journals = self.__journal_paths(os.path.isfile(self.__file_path)
+                                        and _is_torn(self.__file_path))
+        journaled = {}
+        for path in journals:
+            for offset, entry in self.__read_journal(path):
+                journaled[entry["key"]] = (path, offset) \
+                    if entry["op"] == "set" else None
+
+        def wanted(key):
+            return names is None or key.partition(".")[0] in names
+
+        for key, record in self.__read_snapshot():
+            if key not in journaled and key not in self.__dirty and \
+                    wanted(key):
+                yield key, record
+        read = {place[0] for place in journaled.values() if place}
+        for path in (path for path in journals if path in read):
+            with open(path, "r", encoding="utf-8") as f:
+                for key, place in journaled.items():
+                    if place is None or place[0] != path or \
+                            key in self.__dirty or not wanted(key):
+                        continue
+                    f.seek(place[1])
+                    yield key, json.loads(f.readline())["value"]
+        for key, state in list(self.__dirty.items()):
+            if state != "deleted" and wanted(key):
+                yield key, self.__objects[key].to_dict()
+
+    def configure(self, shards=None, durability=None, compact=None,
+                  feed=None):
+        """
+        Changes the on-disk layout and durability policy of the store.
+
+        With shards set to 0 (the default) every object lives in the JSON
+        file, and saves append to its journal. With shards set to n, each
+        class gets its own files, split into n partitions by a hash of
+        the object ID, and a save rewrites only the partitions holding
+        dirty keys. Call compact() to move existing data to a new layout.
+
+        The durability policy decides when writes are fsynced: "none"
+        leaves it to the operating system, "batch" fsyncs when a batch
+        commits and when a snapshot or shard is rewritten, and
+        "fsync-every-commit" also fsyncs every save().
+
+        With compact set to True, the objects loaded from disk are built
+        from slotted subclasses of their models (see compact), which
+        hold the schema attributes without a per-instance dictionary.
+        Objects already loaded are left as they are.
+
+        With feed set to True, the change events of every save are also
+        appended to the change feed file (see subscribe()).
+
+        Args:
+            shards (int): The number of partitions per class, or 0.
+            durability (str): "none", "batch" or "fsync-every-commit".
+            compact (bool): Whether loaded objects use compact classes.
+            feed (bool): Whether to write the change feed file.
+
+        Raises:
+            ValueError: If the durability policy is unknown.
+        """
+        if durability is not None:
+            if durability not in self.__durability_modes:
+                raise ValueError("Unknown durability mode: {}".format(
+                    durability))
+            FileStorage.__durability = durability
+        if shards is not None:
+            FileStorage.__shards = shards
+        if compact is not None:
+            FileStorage.__compact = bool(compact)
+        if feed is not None:
+            FileStorage.__feed = bool(feed)
+
+    def create_index(self, cls, attr, unique=False):
+        """
+        Adds a hash index on an attribute of a class, filled with the
+        objects already stored and kept current from then on. Calling it
+        again for the same attribute returns the existing index, or
+        replaces it when unique differs.
+
+        Args:
+            cls (class): The class of the objects, such as User.
+            attr (str): The attribute to index, such as "email".
+            unique (bool): Whether two objects may not share a value of
+            attr. The class default, such as "", is exempt.
+
+        Returns:
+            HashIndex: The index.
+
+        Raises:
+            ValueError: If unique is True and two stored objects already
+            share a value.
+        """
+        name = cls.__name__
+        current = self.__find_index(name, (attr,), "hash")
+        if current is not None and current.unique == unique:
+            return current
+        index = self.__register(cls, indexes.HashIndex(attr, unique))
+        if unique:
+            default = indexes.freeze(getattr(cls, attr, None))
+            for value, keys in index.entries.items():
+                if len(keys) > 1 and value != default:
+                    self.__unregister(name, index)
+                    raise ValueError("{}.{} is not unique: {} share {!r}"
+                                     .format(name, attr,
+                                             ", ".join(sorted(keys)), value))
+        if current is not None:
+            self.__unregister(name, current)
+        return index
+
+    def find(self, cls, **equals):
+        """
+        Returns the objects of a class, or of its subclasses, whose
+        attributes equal the given values. The smallest matching hash
+        index narrows the candidates; the other attributes are compared
+        on the stored records, so only the matches are hydrated.
+
+        Args:
+            cls (class): The class of the objects, such as User.
+            **equals: The attribute values to match, such as
+            email="betty@example.com".
+
+        Returns:
+            list: The matching objects.
+        """
+        attrs = tuple(equals)
+        wanted = tuple(indexes.freeze(value) for value in equals.values())
+        classes = self.classes()
+        found = []
+        for name in self.__class_names(cls):
+            keys = self.__by_class[name]
+            for attr, value in equals.items():
+                index = self.__find_index(name, (attr,), "hash")
+                if index is not None:
+                    matches = index.get(value)
+                    if len(matches) < len(keys):
+                        keys = matches
+            model = classes.get(name)
+            defaults = tuple(getattr(model, attr, None) for attr in attrs)
+            for key in list(keys):
+                values = self.__values(key, attrs, defaults)
+                if tuple(indexes.freeze(v) for v in values) == wanted:
+                    found.append(self.__lookup(key))
+        return found
+
+    def related(self, cls, attr, value):
+        """
+        Returns the objects of a class whose attr equals value, through
+        the foreign key index on attr.
+
+        Args:
+            cls (class): The class of the objects, such as City.
+            attr (str): The foreign key attribute, such as "state_id".
+            value (str): The ID it must equal.
+
+        Returns:
+            list: The matching objects.
+        """
+        return self.find(cls, **{attr: value})
+
+    def range(self, cls, attr, low=None, high=None):
+        """
+        Returns the objects of a class whose numeric attr lies between
+        low and high, both included, in ascending order of attr.
+
+        Args:
+            cls (class): The class of the objects, such as Place.
+            attr (str): The numeric attribute, such as "price_by_night".
+            low (float): The smallest value, or None for no lower bound.
+            high (float): The largest value, or None for no upper bound.
+
+        Returns:
+            list: The matching objects.
+        """
+        index = self.__sorted_index(cls, attr)
+        return [self.__lookup(key) for key in index.range(low, high)]
+
+    def min(self, cls, attr):
+        """
+        Returns the object of a class with the smallest numeric attr, or
+        None if no object has a numeric attr.
+        """
+        key = self.__sorted_index(cls, attr).min()
+        return None if key is None else self.__lookup(key)
+
+    def max(self, cls, attr):
+        """
+        Returns the object of a class with the largest numeric attr, or
+        None if no object has a numeric attr.
+        """
+        key = self.__sorted_index(cls, attr).max()
+        return None if key is None else self.__lookup(key)
+
+    def ordered(self, cls, attr, reverse=False):
+        """
+        Yields the objects of a class in ascending order of a numeric
+        attr, or descending if reverse is True, hydrating each one only
+        when it is reached.
+        """
+        for key in list(self.__sorted_index(cls, attr).ordered(reverse)):
+            yield self.__lookup(key)
+
+    def changed_since(self, since, cls=None, limit=None):
+        """
+        Returns the objects created or modified after a point in time, in
+        ascending order of updated_at, then of key, through the updated_at
+        index of each class. Objects sharing a time are only told apart
+        by their key, so an incremental sync job reading a few at a time
+        passes the cursor (updated_at, key) of the last object it
+        received to get the changes that followed.
+
+        Args:
+            since (datetime, str or tuple): The point in time, as a
+            datetime or its ISO 8601 form, a (time, key) cursor to start
+            after the object stored under key, or None for every object.
+            cls (class, optional): The class of the objects.
+                If None, returns the objects of every class.
+            limit (int, optional): The maximum number of objects.
+
+        Returns:
+            list: The matching objects.
+
+        Raises:
+            ValueError: If since is not a date or a (date, key) cursor.
+        """
+        key = None
+        if isinstance(since, tuple) and len(since) == 2 and \
+                isinstance(since[1], str):
+            since, key = since
+        stamp = None if since is None else indexes.stamp(since)
+        if since is not None and stamp is None:
+            raise ValueError("since must be a datetime, an ISO 8601 string "
+                             "or a (datetime, key) cursor")
+        classes = self.classes()
+        names = self.__by_class if cls is None else self.__class_names(cls)
+        streams = [self.__time_index(classes[name]).after(stamp, key)
+                   for name in names if name in classes]
+        return [self.__lookup(key) for value, key
+                in itertools.islice(heapq.merge(*streams), limit)]
+
+    def places_within(self, lat, lon, radius_km):
         """
-        if not os.path.isfile(self.__file_path):
+        Returns the places within radius_km kilometres of a point,
+        nearest first, through the grid index on their coordinates.
+
+        Args:
+            lat (float): The latitude of the point, in degrees.
+            lon (float): The longitude of the point, in degrees.
+            radius_km (float): The search radius, in kilometres.
+
+        Returns:
+            list: The matching Place objects.
+        """
+        grid = self.__find_index("Place", ("latitude", "longitude"), "grid")
+        return [self.__lookup(key)
+                for distance, key in grid.within(lat, lon, radius_km)]
+
+    def places_in_bbox(self, south, west, north, east):
+        """
+        Returns the places whose coordinates lie inside a box, bounds
+        included, through the grid index on their coordinates. The box
+        crosses the antimeridian when west is greater than east.
+
+        Args:
+            south (float): The smallest latitude.
+            west (float): The western longitude.
+            north (float): The largest latitude.
+            east (float): The eastern longitude.
+
+        Returns:
+            list: The matching Place objects.
+        """
+        grid = self.__find_index("Place", ("latitude", "longitude"), "grid")
+        return [self.__lookup(key)
+                for key in grid.bbox(south, west, north, east)]
+
+    def places_with_amenities(self, amenity_ids, match="all"):
+        """
+        Returns the places whose amenity_ids hold all of the given
+        amenity IDs, or any of them, through the amenity bitmap index.
+
+        Args:
+            amenity_ids (list): The IDs of the amenities, or the Amenity
+            objects themselves.
+            match (str): "all" to AND the amenities, "any" to OR them.
+
+        Returns:
+            list: The matching Place objects.
+
+        Raises:
+            ValueError: If match is neither "all" nor "any".
+        """
+        if match not in ("all", "any"):
+            raise ValueError("Unknown match: {}".format(match))
+        ids = [getattr(amenity, "id", amenity) for amenity in amenity_ids]
+        bitmap = self.__find_index("Place", ("amenity_ids",), "bitmap")
+        keys = bitmap.all_of(ids) if match == "all" else bitmap.any_of(ids)
+        return [self.__lookup(key) for key in keys]
+
+    def group_by(self, cls, attr, value_attr=None):
+        """
+        Returns the number of objects of a class per value of attr and,
+        if value_attr is given, the sum, minimum, maximum and mean of
+        that numeric attribute per value. The figures come from an
+        aggregate index kept current by new(), delete() and touch(), so
+        asking costs nothing but the size of the answer. Places per city
+        and per user, cities per state and reviews per place and per user
+        are indexed from the start; any other grouping is counted by a
+        scan of the class, and no index is kept for it.
+
+        Args:
+            cls (class): The class of the objects, such as Place.
+            attr (str): The attribute to group by, such as "city_id".
+            value_attr (str, optional): The numeric attribute to
+            aggregate, such as "price_by_night".
+
+        Returns:
+            dict: The {"count": ...} of each value of attr, with "sum",
+            "min", "max" and "avg" too when value_attr is given. Values
+            that are not numbers are counted but left out of the rest.
+        """
+        attrs = (attr,) if value_attr is None else (attr, value_attr)
+        index = self.__find_index(cls.__name__, attrs, "aggregate")
+        if index is None:
+            index = indexes.AggregateIndex(attr, value_attr)
+            self.__fill(cls, index)
+        return index.items()
+
+    def where(self, cls, expression, order_by=None, limit=None):
+        """
+        Returns the objects of a class matching a query expression, in
+        the requested order. Only the candidates chosen by the plan are
+        read, and only the results are hydrated.
+
+        Args:
+            cls (class): The class of the objects, such as Place.
+            expression (str): The filter, such as
+            "price_by_night < 100 and city_id == 'x'", or None or "" to
+            match every object.
+            order_by (str, optional): The attribute to sort by, followed
+            by "desc" for a descending order.
+            limit (int, optional): The maximum number of results.
+
+        Returns:
+            list: The matching objects.
+
+        Raises:
+            ValueError: If the expression or order_by cannot be parsed.
+        """
+        node, chosen = self.__plan(cls, expression, order_by, limit)
+        value = self.__value_getter(cls)
+        found = []
+        for key in chosen.keys(self.__by_class.get(cls.__name__, ()),
+                               value):
+            if node is None or node.matches(
+                    lambda attr, key=key: value(key, attr)):
+                found.append(key)
+                if chosen.ordered and len(found) == limit:
+                    break
+        if order_by is not None and not chosen.ordered:
+            attr, reverse = query.parse_order(order_by)
+            found = query.sort(found, lambda key: value(key, attr), reverse)
+        return [self.__lookup(key) for key in found[:limit]]
+
+    def explain(self, cls, expression, order_by=None, limit=None):
+        """
+        Returns the plan where() would follow, with the estimated number
+        of rows it reads, without running it.
+
+        Returns:
+            str: One line per step of the plan.
+
+        Raises:
+            ValueError: If the expression or order_by cannot be parsed.
+        """
+        node, chosen = self.__plan(cls, expression, order_by, limit)
+        lines = ["{}: {}".format(cls.__name__, chosen.describe())]
+        if node is not None:
+            lines.append("filter: {}".format(node))
+        if order_by is not None:
+            lines.append("order by: {}{}".format(
+                order_by, " (from the index)" if chosen.ordered else ""))
+        if limit is not None:
+            lines.append("limit: {}".format(limit))
+        return "\n".join(lines)
+
+    def __plan(self, cls, expression, order_by, limit):
+        """
+        Parses a query expression and plans it against the indexes of a
+        class, returning the tree (or None) and the plan.
+        """
+        node = query.parse(expression) if expression else None
+        if order_by is not None:
+            query.parse_order(order_by)
+        registered = [index for index, defaults
+                      in self.__indexes.get(cls.__name__, ())]
+        total = len(self.__by_class.get(cls.__name__, ()))
+        return node, query.plan(node, registered, total, order_by, limit)
+
+    def __value_getter(self, cls):
+        """
+        Returns a function giving the value of an attribute of a stored
+        key of cls, falling back to the class default, without hydrating.
+        """
+        def value(key, attr):
+            return self.__values(key, (attr,), (getattr(cls, attr, None),))[0]
+        return value
+
+    def search(self, query, cls=None, limit=None):
+        """
+        Returns the objects whose text attributes hold words of query,
+        best first, ranked by BM25 on the full-text indexes: the name and
+        description of places and the text of reviews.
+
+        Args:
+            query (str): The words to look for.
+            cls (class, optional): Place or Review, to search only one of
+            them. If None, both are searched.
+            limit (int, optional): The maximum number of results.
+
+        Returns:
+            list: The matching objects.
+        """
+        ranked = []
+        for name, registered in self.__indexes.items():
+            if cls is not None and name not in self.__class_names(cls):
+                continue
+            for index, defaults in registered:
+                if index.kind == "text":
+                    ranked.extend(index.search(query, limit))
+        ranked.sort(key=lambda pair: (-pair[0], pair[1]))
+        return [self.__lookup(key) for score, key in ranked[:limit]]
+
+    def __sorted_index(self, cls, attr):
+        """
+        Returns the sorted index on attr of a class or, when none is
+        registered, one built for this query only, so that ad-hoc queries
+        do not add an index that every later write must keep current.
+        """
+        index = self.__find_index(cls.__name__, (attr,), "sorted")
+        if index is None:
+            index = indexes.SortedIndex(attr)
+            self.__fill(cls, index)
+        return index
+
+    def __time_index(self, cls):
+        """
+        Returns the index on updated_at of a class, registering one the
+        first time it is needed.
+        """
+        index = self.__find_index(cls.__name__, ("updated_at",), "time")
+        if index is None:
+            index = self.__register(cls, indexes.TimeIndex("updated_at"))
+        return index
+
+    def __default_indexes(self):
+        """
+        Registers the indexes that every store has and that are missing:
+        a hash index on every foreign key listed in __foreign_keys, a
+        sorted index on every int or float attribute of Place, a grid
+        index on the coordinates of Place, a bitmap index on its amenities,
+        the full-text indexes, the aggregates listed in __aggregates and
+        a time index on the updated_at of every class.
+        """
+        classes = self.classes()
+        for name, attrs in self.__foreign_keys.items():
+            for attr in attrs:
+                if self.__find_index(name, (attr,), "hash") is None:
+                    self.__register(classes[name], indexes.HashIndex(attr))
+        for attr, kind in self.attributes("Place").items():
+            if kind in (int, float) and \
+                    self.__find_index("Place", (attr,), "sorted") is None:
+                self.__register(classes["Place"], indexes.SortedIndex(attr))
+        if self.__find_index("Place", ("latitude", "longitude"),
+                             "grid") is None:
+            self.__register(classes["Place"],
+                            indexes.GridIndex("latitude", "longitude"))
+        if self.__find_index("Place", ("amenity_ids",), "bitmap") is None:
+            self.__register(classes["Place"],
+                            indexes.BitmapIndex("amenity_ids"))
+        for name, attrs in self.__text_attributes.items():
+            if self.__find_index(name, attrs, "text") is None:
+                self.__register(classes[name], indexes.TextIndex(*attrs))
+        for name, groupings in self.__aggregates.items():
+            for attr, value_attr in groupings:
+                attrs = (attr,) if value_attr is None else (attr, value_attr)
+                if self.__find_index(name, attrs, "aggregate") is None:
+                    self.__register(classes[name],
+                                    indexes.AggregateIndex(attr, value_attr))
+        for cls in classes.values():
+            self.__time_index(cls)
+
+    def materialize(self):
+        """
+        Hydrates every record that has not been accessed yet.
+        """
+        for key in list(self.__records):
+            self.__lookup(key)
+
+    def stats(self):
+        """
+        Returns the size of the dirty set and the cumulative write counters.
+
+        Returns:
+            dict: The number of stored and hydrated objects, of dirty keys
+            in total and per state, the flush, compaction, shard and byte
+            counters, the hits and misses of the cache of encoded objects
+            with its hit rate, the torn files recovered, the change events
+            published, the subscriber errors and the torn change feeds
+            repaired, and the seconds spent decoding each file during the
+            last reload.
+        """
+        stats = {"objects": len(self.__objects) + len(self.__records),
+                 "hydrated": len(self.__objects),
+                 "dirty": len(self.__dirty),
+                 "created": 0, "modified": 0, "deleted": 0,
+                 "journal": self.__journal_size}
+        for state in self.__dirty.values():
+            stats[state] += 1
+        stats.update(self.__counters)
+        encodes = self.__counters["encode_hits"] + \
+            self.__counters["encode_misses"]
+        stats["encode_hit_rate"] = \
+            self.__counters["encode_hits"] / encodes if encodes else None
+        stats["load_timings"] = dict(self.__load_timings)
+        return stats
+
+    def subscribe(self, callback, after=None):
+        """
+        Registers a callback to receive the change events of every save.
+
+        Each saved change yields one event, a dictionary with a "seq"
+        sequence number, increasing by one per event, an "op" of
+        "create", "update" or "delete", the "key" of the object and, but
+        for deletions, its dictionary form as "value". Events are
+        published in order once the changes are written, so changes
+        rolled back or never saved publish nothing. An exception raised
+        by a callback is counted in stats() and does not stop the others.
+
+        Sequence numbers carry on across processes only with feed=True,
+        which keeps the last one in the feed file; without it, they start
+        again from 0 in every process.
+
+        Args:
+            callback (callable): Called with each event.
+            after (int, optional): Replays the events of the change feed
+                file that follow this sequence number first, so that a
+                subscriber resumes where it stopped.
+
+        Raises:
+            ValueError: If the events following after were rotated out
+            of the feed (see events()). No event is replayed then.
+        """
+        if after is not None:
+            for event in self.events(after):
+                callback(event)
+        self.__subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """
+        Stops sending change events to a callback.
+        """
+        if callback in self.__subscribers:
+            self.__subscribers.remove(callback)
+
+    def events(self, after=0):
+        """
+        Yields the events of the change feed file that follow a sequence
+        number, in order. The feed is a JSON-lines file next to the JSON
+        file, written when configured with feed=True, which other
+        processes can tail. Every compact() rotates it to a ".feed.1"
+        file, dropping the events rotated out before, so the events
+        available start at the one but last compaction. Only the
+        sequence number of the skipped events is decoded, and the store
+        is not read.
+
+        Args:
+            after (int): The sequence number of the last event received.
+
+        Yields:
+            dict: Each later event.
+
+        Raises:
+            ValueError: Before yielding anything, if the event following
+            after is no longer in the feed: the reader missed events and
+            has to resynchronize from the store.
+        """
+        oldest = None
+        for path in (self.__feed_path() + ".1", self.__feed_path()):
+            if not os.path.isfile(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break
+                    # Lines start with '{"seq": <n>, '
+                    seq = int(line[8:line.index(",")])
+                    if oldest is None:
+                        oldest = seq
+                        if seq > after + 1:
+                            raise ValueError(
+                                "Events {} to {} were rotated out of the "
+                                "change feed".format(after + 1, seq - 1))
+                    if seq > after:
+                        yield json.loads(line)
+
+    def seq(self):
+        """
+        Returns the sequence number of the last change event. It is
+        only kept from one process to the next with feed=True.
+        """
+        return self.__seq
+
+    def begin(self):
+        """
+        Opens a batch. Saves are deferred until the outermost commit().
+        """
+        self.__batches.append(({}, dict(self.__dirty)))
+
+    def commit(self):
+        """
+        Closes the innermost batch, saving once the outermost one closes.
+        """
+        if not self.__batches:
+            return
+        undo = self.__batches.pop()[0]
+        if self.__batches:
+            for key, original in undo.items():
+                self.__batches[-1][0].setdefault(key, original)
+        else:
+            self.__flush(self.__durability != "none")
+
+    def rollback(self):
+        """
+        Closes the innermost batch and restores the objects it changed.
+        """
+        if not self.__batches:
+            return
+        undo, dirty = self.__batches.pop()
+        for key, (obj, attrs) in undo.items():
+            self.__remove(key)
+            if obj is not None:
+                obj.__dict__.clear()
+                obj.__dict__.update(attrs)
+                self.__add(key, obj)
+        self.__dirty.clear()
+        self.__dirty.update(dirty)
+
+    def in_batch(self):
+        """
+        Returns True while a batch is open.
+        """
+        return len(self.__batches) > 0
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Runs the body of a with statement as a batch: its changes are
+        saved once on success and rolled back if it raises.
+        """
+        self.begin()
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+    def __remember(self, key):
+        """
+        Records the current state of key in the innermost batch, the first
+        time the batch changes it.
+        """
+        if not self.__batches or key in self.__batches[-1][0]:
+            return
+        obj = self.__objects.get(key)
+        attrs = copy.deepcopy(obj.__dict__) if obj is not None else None
+        self.__batches[-1][0][key] = (obj, attrs)
+
+    def __add(self, key, obj):
+        """
+        Stores obj under key in __objects and in the indexes.
+        """
+        self.__objects[key] = obj
+        self.__index(key)
+
+    def __add_record(self, key, record):
+        """
+        Stores a decoded record under key in __records and in the
+        indexes, without hydrating it, replacing the record of the same
+        key read from another file.
+        """
+        if key in self.__records:
+            self.__remove(key)
+        self.__records[key] = record
+        self.__index(key)
+
+    def __index(self, key):
+        """
+        Adds a newly stored key to the class index and secondary indexes.
+        """
+        name = key.partition(".")[0]
+        self.__by_class.setdefault(name, set()).add(key)
+        self.__key_order.pop(name, None)
+        for index, defaults in self.__indexes.get(name, ()):
+            if (name, index, defaults) not in self.__restored:
+                index.add(key, self.__values(key, index.attrs, defaults))
+
+    def __remove(self, key):
+        """
+        Removes key from __objects or __records and from the indexes.
+        """
+        if key not in self.__objects and key not in self.__records:
             return
-        with open(self.__file_path, "r", encoding="utf-8") as f:
-            obj_dict = json.load(f)
-            obj_dict = {k: self.classes()[v["__class__"]](**v)
-                        for k, v in obj_dict.items()}
-            self.__objects = obj_dict
-
-            # Update missing objects in the storage
-            for obj in self.__objects.values():
-                obj_class = type(obj).__name__
-                obj_id = obj.id
-                obj_key = "{}.{}".format(obj_class, obj_id)
-                if obj_key not in self.__objects:
-                    self.__objects[obj_key] = obj
+        name = key.partition(".")[0]
+        for index, defaults in self.__indexes.get(name, ()):
+            index.remove(key, self.__values(key, index.attrs, defaults))
+        self.__by_class[name].discard(key)
+        self.__key_order.pop(name, None)
+        self.__encoded.pop(key, None)
+        if self.__objects.pop(key, None) is None:
+            del self.__records[key]
+
+    def __values(self, key, attrs, defaults):
+        """
+        Returns the values of attrs for the object or record stored under
+        key, using the class defaults for attributes never set.
+        """
+        obj = self.__objects.get(key)
+        if obj is not None:
+            return tuple(obj.__dict__.get(attr, default)
+                         for attr, default in zip(attrs, defaults))
+        record = self.__records[key]
+        return tuple(record.get(attr, default)
+                     for attr, default in zip(attrs, defaults))
+
+    def __register(self, cls, index):
+        """
+        Adds a secondary index on a model class and fills it with the
+        objects already stored.
+        """
+        defaults = self.__fill(cls, index)
+        self.__indexes.setdefault(cls.__name__, []).append((index, defaults))
+        return index
+
+    def __fill(self, cls, index):
+        """
+        Fills an index with the objects of a class already stored, without
+        keeping it current, and returns the defaults used for the
+        attributes never set. Ad-hoc queries read such an index once and
+        drop it.
+        """
+        # Indexes such as the grid leave out the attributes never set
+        use_defaults = getattr(index, "use_defaults", True)
+        defaults = tuple(getattr(cls, attr, None) if use_defaults else None
+                         for attr in index.attrs)
+        for key in self.__by_class.get(cls.__name__, ()):
+            index.add(key, self.__values(key, index.attrs, defaults))
+        return defaults
+
+    def __unregister(self, name, index):
+        """
+        Drops a secondary index from a class.
+        """
+        self.__indexes[name] = [(other, defaults) for other, defaults
+                                in self.__indexes[name] if other is not index]
+
+    def __check(self, key, obj):
+        """
+        Raises ValueError if storing obj under key would break one of the
+        unique indexes of its class.
+        """
+        for index, defaults in self.__indexes.get(type(obj).__name__, ()):
+            if getattr(index, "unique", False):
+                values = tuple(obj.__dict__.get(attr, default) for attr,
+                               default in zip(index.attrs, defaults))
+                self.__check_values(index, defaults, key, values)
+
+    def __check_values(self, index, defaults, key, values):
+        """
+        Raises ValueError if a unique index holds values under another
+        key. The class defaults never conflict.
+        """
+        if getattr(index, "unique", False) and values != defaults:
+            other = index.conflict(key, values)
+            if other is not None:
+                raise ValueError("{}.{} must be unique: {!r} is used by {}"
+                                 .format(key.partition(".")[0],
+                                         ".".join(index.attrs),
+                                         values[0], other))
+
+    def __find_index(self, name, attrs, kind):
+        """
+        Returns the index of the given kind on attrs of a class, or None.
+        """
+        for index, defaults in self.__indexes.get(name, ()):
+            if index.kind == kind and index.attrs == tuple(attrs):
+                return index
+        return None
+
+    def __rebuild(self, name, index, defaults):
+        """
+        Refills an index of a class from the stored objects and records.
+        """
+        index.clear()
+        for key in self.__by_class.get(name, ()):
+            index.add(key, self.__values(key, index.attrs, defaults))
+
+    def __text_path(self):
+        """
+        Returns the path of the file holding the full-text indexes.
+        """
+        return self.__file_path + ".fts"
+
+    def __signature(self, paths):
+        """
+        Returns the path, size and modification time of each snapshot
+        file, which identify the snapshot the text indexes were built on.
+        """
+        signature = []
+        for path in paths:
+            status = os.stat(path)
+            signature.append([path, status.st_size, status.st_mtime_ns])
+        return signature
+
+    def __write_text_indexes(self, sync):
+        """
+        Saves the full-text indexes with the signature of the snapshot
+        just written, replacing the previous file atomically.
+        """
+        paths = [path for path in self.__snapshot_paths()
+                 if os.path.isfile(path)]
+        data = {"snapshot": self.__signature(paths), "indexes": {}}
+        for name, registered in self.__indexes.items():
+            for index, defaults in registered:
+                if index.kind == "text":
+                    data["indexes"][name] = [list(index.attrs),
+                                             index.dump()]
+        path = self.__text_path()
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f)
+            self.__counters["bytes_written"] += f.tell()
+            if sync:
+                self.__fsync(f)
+        os.replace(path + ".tmp", path)
+
+    def __read_text_indexes(self, paths):
+        """
+        Restores the full-text indexes saved by compact() if they were
+        built on the snapshot about to be loaded.
+
+        Returns:
+            tuple: The (class name, index, defaults) triples restored,
+            which the snapshot load then leaves alone.
+        """
+        try:
+            with open(self.__text_path(), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return ()
+        if data.get("snapshot") != self.__signature(paths):
+            return ()
+        restored = []
+        for name, (attrs, content) in data["indexes"].items():
+            for index, defaults in self.__indexes.get(name, ()):
+                if index.kind == "text" and list(index.attrs) == attrs:
+                    index.load(content)
+                    restored.append((name, index, defaults))
+        self.__counters["indexes_restored"] += len(restored)
+        return tuple(restored)
+
+    def __lookup(self, key):
+        """
+        Returns the object stored under key, hydrating its record on first
+        access, or None if there is none.
+        """
+        obj = self.__objects.get(key)
+        if obj is None and key in self.__records:
+            record = self.__records.pop(key)
+            obj = self.__model(record["__class__"]).from_record(record)
+            self.__objects[key] = obj
+        return obj
+
+    def __model(self, name):
+        """
+        Returns the class to build the records of a class name with: the
+        model class, or its compact subclass in the compact mode.
+        """
+        cls = registry.classes()[name]
+        if not self.__compact:
+            return cls
+        return compact.compact_class(cls, registry.fields(name))
+
+    def __iter_keys(self, cls, offset, after, limit):
+        """
+        Yields the keys of the objects of cls, or of every object, in
+        order, skipping offset keys and the keys up to after.
+        """
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError("offset and limit must not be negative")
+        names = self.__by_class if cls is None else self.__class_names(cls)
+        streams = []
+        for name in names:
+            keys = self.__key_order.get(name)
+            if keys is None:
+                keys = sorted(self.__by_class[name])
+                self.__key_order[name] = keys
+            start = 0 if after is None else bisect.bisect_right(keys, after)
+            # A list that changes during the walk is replaced, not mutated
+            streams.append(map(keys.__getitem__, range(start, len(keys))))
+        stop = None if limit is None else offset + limit
+        for key in itertools.islice(heapq.merge(*streams), offset, stop):
+            yield key
+
+    def __class_names(self, cls):
+        """
+        Returns the indexed class names whose class is cls or a subclass.
+        """
+        classes = self.classes()
+        names = []
+        for name in self.__by_class:
+            if name in classes:
+                if issubclass(classes[name], cls):
+                    names.append(name)
+            elif name == cls.__name__:
+                names.append(name)
+        return names
+
+    def __iter_store(self):
+        """
+        Yields the key and JSON text of every stored object.
+        """
+        for key in self.__records:
+            yield key, self.__encode(key)
+        for key in self.__objects:
+            yield key, self.__encode(key)
+
+    def __read_snapshot(self):
+        """
+        Yields the (key, record) pairs of the JSON file, or of every shard
+        file, one at a time.
+        """
+        for path in self.__snapshot_paths():
+            if os.path.isfile(path):
+                yield from _iter_file(path + ".bak" if _is_torn(path)
+                                      else path)
+
+    def __load_parallel(self, paths):
+        """
+        Decodes shard files in a process pool and adds their records,
+        falling back to reading them in turn if no pool can be started.
+        """
+        try:
+            with concurrent.futures.ProcessPoolExecutor(
+                    min(len(paths), os.cpu_count() or 1)) as pool:
+                results = list(pool.map(_load_file, paths))
+        except (OSError, concurrent.futures.BrokenExecutor):
+            results = None
+        if results is None:
+            for path in paths:
+                self.__load_file(path)
+            return
+        for path, items, seconds, recovered in results:
+            for key, record in items:
+                self.__add_record(key, record)
+            self.__load_timings[path] = seconds
+            self.__counters["recoveries"] += recovered
+
+    def __load_file(self, path):
+        """
+        Streams the records of one file into __records. If the file turns
+        out to be torn, the records read from it are dropped and its
+        previous version is loaded instead.
+        """
+        start = time.perf_counter()
+        added = []
+        try:
+            if _is_torn(path):
+                raise ValueError("Empty file: {}".format(path))
+            for key, record in _iter_file(path):
+                self.__add_record(key, record)
+                added.append(key)
+        except ValueError:
+            if not os.path.isfile(path + ".bak"):
+                raise
+            for key in added:
+                self.__remove(key)
+            for key, record in _iter_file(path + ".bak"):
+                self.__add_record(key, record)
+            self.__counters["recoveries"] += 1
+        self.__load_timings[path] = time.perf_counter() - start
+
+    def __snapshot_paths(self):
+        """
+        Returns the paths of the files holding the snapshot: the JSON file
+        itself, or one file per class and partition when sharded.
+        """
+        if not self.__shards:
+            return [self.__file_path]
+        names = set(self.classes()) | set(self.__by_class)
+        return [self.__shard_path(name, part) for name in sorted(names)
+                for part in range(self.__shards)]
+
+    def __stray_paths(self):
+        """
+        Returns the snapshot files on disk that another layout wrote: the
+        JSON file when sharded, and the shard files of the registered
+        classes that the configured layout does not use.
+        """
+        root, ext = os.path.splitext(self.__file_path)
+        shard = re.compile(r"\.(\w+)(\.\d+)?$")
+        found = [self.__file_path]
+        for path in glob.glob(glob.escape(root) + ".*" + ext):
+            match = shard.match(path[len(root):-len(ext)])
+            if match and match.group(1) in self.classes():
+                found.append(path)
+        expected = set(self.__snapshot_paths())
+        return sorted(path for path in found
+                      if path not in expected and os.path.isfile(path))
+
+    def __shard_path(self, name, part):
+        """
+        Returns the path of a shard: file.User.json for a class held in
+        one shard, or file.User.2.json for its third partition.
+        """
+        root, ext = os.path.splitext(self.__file_path)
+        if self.__shards == 1:
+            return "{}.{}{}".format(root, name, ext)
+        return "{}.{}.{}{}".format(root, name, part, ext)
+
+    def __shard_of(self, key):
+        """
+        Returns the (class name, partition) of the shard holding key.
+        """
+        name, _, obj_id = key.partition(".")
+        return name, zlib.crc32(obj_id.encode("utf-8")) % self.__shards
+
+    def __write_shards(self, shards, sync):
+        """
+        Rewrites the given (class name, partition) shards from memory,
+        removing the files of shards that became empty.
+        """
+        for name, part in shards:
+            path = self.__shard_path(name, part)
+            keys = [key for key in self.__by_class.get(name, ())
+                    if self.__shard_of(key)[1] == part]
+            if keys:
+                self.__write_file(
+                    path, ((key, self.__encode(key)) for key in keys), sync)
+                self.__counters["shards_written"] += 1
+            else:
+                for stale in (path, path + ".bak"):
+                    if os.path.isfile(stale):
+                        os.remove(stale)
+
+    def __write_file(self, path, items, sync):
+        """
+        Atomically replaces a snapshot or shard file with (key, JSON text)
+        pairs, in the layout chosen by its extension.
+
+        The records go to path + ".tmp", which is renamed over path once
+        complete, so path always holds a whole file. The version being
+        replaced is kept as path + ".bak" for reload() to fall back on.
+        """
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                for key, text in items:
+                    f.write(text + "\n")
+            else:
+                json_stream.write_items(f, items, encoded=True)
+            self.__counters["bytes_written"] += f.tell()
+            if sync:
+                self.__fsync(f)
+        if os.path.isfile(path):
+            if os.path.isfile(path + ".bak"):
+                os.remove(path + ".bak")
+            try:
+                os.link(path, path + ".bak")
+            except OSError:
+                shutil.copyfile(path, path + ".bak")
+        os.replace(tmp, path)
+        if sync:
+            self.__fsync_dir(path)
+
+    def __fsync(self, f):
+        """
+        Flushes f to disk, counting the calls and the time they take.
+        """
+        start = time.perf_counter()
+        f.flush()
+        os.fsync(f.fileno())
+        self.__counters["fsyncs"] += 1
+        self.__counters["fsync_seconds"] += time.perf_counter() - start
+
+    def __fsync_dir(self, path):
+        """
+        Flushes the directory entry of a renamed file to disk, where the
+        platform allows opening directories.
+        """
+        try:
+            fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+        except OSError:
+            return
+        start = time.perf_counter()
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+        self.__counters["fsyncs"] += 1
+        self.__counters["fsync_seconds"] += time.perf_counter() - start
+
+    def __encode(self, key):
+        """
+        Returns the JSON text of the object or record stored under key.
+
+        The text is cached in __encoded until the object changes: touch()
+        drops it on every attribute write, and the list and dictionary
+        values it was encoded with are compared to a copy, to catch the
+        changes made in place. Records that were never hydrated are
+        cached the same way, and the text stays valid once they are,
+        since the instance shares their values.
+        """
+        cached = self.__encoded.get(key)
+        if cached is not None and all(value == copied
+                                      for value, copied in cached[1]):
+            self.__counters["encode_hits"] += 1
+            return cached[0]
+        self.__counters["encode_misses"] += 1
+        record = self.__records.get(key)
+        if record is None:
+            record = self.__objects[key].to_dict()
+        text = json.dumps(record)
+        mutable = tuple((value, copy.deepcopy(value))
+                        for value in record.values()
+                        if isinstance(value, (list, dict)))
+        self.__encoded[key] = (text, mutable)
+        return text
+
+    def __publish(self, sync):
+        """
+        Numbers the changes of the dirty set as events, appends them to
+        the change feed file if it is enabled, fsyncing it if sync is
+        True, and sends them to the subscribers.
+        """
+        if not self.__dirty or not (self.__feed or self.__subscribers):
+            return
+        ops = {"created": "create", "modified": "update",
+               "deleted": "delete"}
+        events = []
+        for key, state in self.__dirty.items():
+            FileStorage.__seq += 1
+            text = None if state == "deleted" else self.__encode(key)
+            events.append((self.__seq, ops[state], key, text))
+        self.__counters["events"] += len(events)
+        if self.__feed:
+            with open(self.__feed_path(), "a", encoding="utf-8") as f:
+                for seq, op, key, text in events:
+                    line = '{{"seq": {}, "op": "{}", "key": {}'.format(
+                        seq, op, json.dumps(key))
+                    if text is not None:
+                        line += ', "value": ' + text
+                    f.write(line + "}\n")
+                if sync:
+                    self.__fsync(f)
+        for seq, op, key, text in events:
+            event = {"seq": seq, "op": op, "key": key}
+            if text is not None:
+                event["value"] = json.loads(text)
+            for callback in list(self.__subscribers):
+                try:
+                    callback(event)
+                except Exception:
+                    self.__counters["subscriber_errors"] += 1
+
+    def __feed_path(self):
+        """
+        Returns the path of the change feed that accompanies the JSON file.
+        """
+        return self.__file_path + ".feed"
+
+    def __feed_tail(self):
+        """
+        Returns the sequence number of the last event of the change feed,
+        or of the feed rotated out by compact() if the feed has no event
+        yet, or 0, cutting off a torn final event left by an interrupted
+        append. Only the end of the files is read.
+        """
+        for path in (self.__feed_path(), self.__feed_path() + ".1"):
+            if not os.path.isfile(path):
+                continue
+            with open(path, "rb+") as f:
+                size = start = f.seek(0, os.SEEK_END)
+                tail = b""
+                while start > 0 and tail.count(b"\n") < 2:
+                    step = min(4096, start)
+                    start -= step
+                    f.seek(start)
+                    tail = f.read(step) + tail
+                end = tail.rfind(b"\n") + 1
+                if start + end < size:
+                    f.truncate(start + end)
+                    self.__counters["feed_recoveries"] += 1
+            lines = tail[:end].splitlines()
+            if lines:
+                return json.loads(lines[-1])["seq"]
+        return 0
+
+    def __journal_paths(self, recovered):
+        """
+        Returns the paths of the journals to replay, in order: the
+        journal, preceded by the journal of the previous snapshot if
+        recovered is True and the JSON file fell back on that snapshot.
+        """
+        if recovered and not self.__shards:
+            return [self.__journal_path() + ".bak", self.__journal_path()]
+        return [self.__journal_path()]
+
+    def __read_journal(self, path, repair=False):
+        """
+        Yields the offset and content of each record of the journal at
+        path, stopping at a torn final record left by an interrupted
+        append. With repair, the torn record is cut off so that later
+        appends are readable.
+        """
+        if not os.path.isfile(path):
+            return
+        torn = None
+        with open(path, "r", encoding="utf-8") as f:
+            offset = 0
+            for line in iter(f.readline, ""):
+                try:
+                    if not line.endswith("\n"):
+                        raise ValueError("Unterminated record")
+                    entry = json.loads(line)
+                except ValueError:
+                    torn = offset
+                    break
+                yield offset, entry
+                offset = f.tell()
+        if torn is not None and repair:
+            with open(path, "r+", encoding="utf-8") as f:
+                f.truncate(torn)
+            self.__counters["recoveries"] += 1
+
+    def __journal_path(self):
+        """
+        Returns the path of the journal that accompanies the JSON file.
+        """
+        return self.__file_path + ".log"
 
     def classes(self):
         """
-        Returns a dictionary of valid classes and their references.
-        """
-        from models.base_model import BaseModel
-        from models.user import User
-        from models.state import State
-        from models.city import City
-        from models.amenity import Amenity
-        from models.place import Place
-        from models.review import Review
-
-        classes = {
-            "BaseModel": BaseModel,
-            "User": User,
-            "State": State,
-            "City": City,
-            "Amenity": Amenity,
-            "Place": Place,
-            "Review": Review
-        }
-        return classes
+        Returns a read-only dictionary of valid classes and their
+        references, as registered in models.engine.registry.
+        """
+        return registry.classes()
 
     def attributes(self, cls_name):
         """
         Returns the valid attributes and their types for a given class name.
         """
-        attributes = {
-            "BaseModel": {
-                "id": str,
-                "created_at": datetime.datetime,
-                "updated_at": datetime.datetime
-            },
-            "User": {
-                "email": str,
-                "password": str,
-                "first_name": str,
-                "last_name": str
-            },
-            "State": {
-                "name": str
-            },
-            "City": {
-                "state_id": str,
-                "name": str
-            },
-            "Amenity": {
-                "name": str
-            },
-            "Place": {
-                "city_id": str,
-                "user_id": str,
-                "name": str,
-                "description": str,
-                "number_rooms": int,
-                "number_bathrooms": int,
-                "max_guest": int,
-                "price_by_night": int,
-                "latitude": float,
-                "longitude": float,
-                "amenity_ids": list
-            },
-            "Review": {
-                "place_id": str,
-                "user_id": str,
-                "text": str
-            }
-        }
-        return attributes[cls_name]
+        return registry.attributes(cls_name)
 
     def get(self, cls, id):
         """
@@ -203,7 +1966,7 @@ class FileStorage:
             object: The retrieved object.
         """
         key = "{}.{}".format(cls.__name__, id)
-        return self.__objects.get(key, None)
+        return self.__lookup(key)
 
     def delete(self, obj):
         """
@@ -213,8 +1976,14 @@ class FileStorage:
             obj: The object to delete.
         """
         key = "{}.{}".format(type(obj).__name__, obj.id)
-        if key in self.__objects:
-            del self.__objects[key]
+        if self.__lookup(key) is not None:
+            self.__remember(key)
+            self.__remove(key)
+            if self.__dirty.get(key) == "created":
+                # Never persisted, so there is nothing to journal
+                del self.__dirty[key]
+            else:
+                self.__dirty[key] = "deleted"
 
     def count(self, cls=None):
         """
@@ -228,10 +1997,9 @@ class FileStorage:
             int: The number of objects.
         """
         if cls is None:
-            return len(self.__objects)
+            return len(self.__objects) + len(self.__records)
         else:
             count = 0
-            for value in self.__objects.values():
-                if isinstance(value, cls):
-                    count += 1
+            for name in self.__class_names(cls):
+                count += len(self.__by_class[name])
             return count
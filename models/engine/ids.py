@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+"""
+ALX HolbertonBnB - Object IDs
+
+This module generates the IDs of new objects. The default scheme,
+"uuid4", draws random UUIDs. The "uuid7" scheme draws time-ordered
+UUIDs in the layout of UUID version 7 (RFC 9562): the first 48 bits hold
+the creation time in milliseconds, the next 12 a counter that keeps the
+IDs drawn within one millisecond in order, and the rest random bits. The
+text of these IDs sorts in creation order, so the keys of new objects
+come last in key order: paging with all(after=...) follows creation
+order, and the SQLite primary key index of DBStorage is appended to
+rather than split.
+
+Functions:
+    configure(scheme): Selects the scheme of new IDs.
+    new_id(): Returns a new ID in the selected scheme.
+    uuid7(): Returns a new time-ordered ID.
+    created(obj_id): Returns the creation time held by a uuid7 ID.
+
+Usage:
+    configure("uuid7")
+    first, second = new_id(), new_id()
+    first < second          # True
+    created(first)          # datetime.datetime(2024, 5, 4, 10, 30, ...)
+
+Authors: Ukpono Umoren & Alexander Udeogaranya
+"""
+import datetime
+import os
+import threading
+import time
+import uuid
+
+_lock = threading.Lock()
+_last = (0, 0)
+
+
+def uuid7():
+    """
+    Returns a new time-ordered ID, greater than every ID this process
+    drew before, even within the same millisecond or if the clock steps
+    back.
+    """
+    global _last
+    with _lock:
+        millis = time.time_ns() // 1000000
+        if millis > _last[0]:
+            counter = 0
+        else:
+            millis, counter = _last[0], _last[1] + 1
+            if counter > 0xfff:
+                millis, counter = millis + 1, 0
+        _last = (millis, counter)
+    random = int.from_bytes(os.urandom(8), "big") & (1 << 62) - 1
+    value = millis << 80 | 0x7 << 76 | counter << 64 | 0b10 << 62 | random
+    return str(uuid.UUID(int=value))
+
+
+def _uuid4():
+    """
+    Returns a new random ID.
+    """
+    return str(uuid.uuid4())
+
+
+_schemes = {"uuid4": _uuid4, "uuid7": uuid7}
+_scheme = _uuid4
+
+
+def configure(scheme):
+    """
+    Selects the scheme of the IDs new_id() returns.
+
+    Args:
+        scheme (str): "uuid4" or "uuid7".
+
+    Raises:
+        ValueError: If the scheme is unknown.
+    """
+    global _scheme
+    if scheme not in _schemes:
+        raise ValueError("Unknown id scheme: {!r}".format(scheme))
+    _scheme = _schemes[scheme]
+
+
+def new_id():
+    """
+    Returns a new ID in the selected scheme.
+    """
+    return _scheme()
+
+
+def created(obj_id):
+    """
+    Returns the creation time held by a uuid7 ID, as a naive local
+    datetime like those of created_at, or None for other IDs.
+    """
+    try:
+        value = uuid.UUID(obj_id)
+    except (TypeError, ValueError):
+        return None
+    if value.version != 7:
+        return None
+    return datetime.datetime.fromtimestamp((value.int >> 80) / 1000)
@@ -0,0 +1,875 @@
+#!/usr/bin/python3
+"""
+ALX HolbertonBnB - Storage Indexes
+
+This module defines the secondary indexes that FileStorage keeps up to
+date as objects are created, modified and deleted. An index covers one
+model class and one or more of its attributes; FileStorage calls add()
+with the key of an object and the values of those attributes whenever
+the object enters the index, and remove() with the same values when it
+leaves it. A unique index also answers conflict(), which FileStorage
+asks before a value is stored.
+
+Classes:
+    HashIndex: Maps each value of an attribute to the keys holding it.
+    SortedIndex: Keeps the keys ordered by a numeric attribute.
+    TimeIndex: Keeps the keys ordered by a date attribute.
+    GridIndex: Buckets the keys by latitude and longitude.
+    TextIndex: An inverted index of words ranked by BM25.
+    BitmapIndex: Maps each item of a list attribute to a bitmap of keys.
+    AggregateIndex: Counts the keys per value of an attribute, with the
+    sum, minimum, maximum and mean of a numeric attribute.
+
+Functions:
+    stamp(value): The sortable text of a date.
+    tokenize(text): Splits text into lowercase words.
+    distance_km(lat1, lon1, lat2, lon2): The great-circle distance.
+    radius_bbox(lat, lon, radius_km): The box around a circle.
+
+Usage:
+    index = HashIndex("state_id")
+    index.add("City.1", ("state-1",))
+    index.get("state-1")    # {"City.1"}
+
+    emails = HashIndex("email", unique=True)
+    emails.add("User.1", ("betty@example.com",))
+    emails.conflict("User.2", ("betty@example.com",))    # "User.1"
+
+    prices = SortedIndex("price_by_night")
+    prices.add("Place.1", (80,))
+    prices.add("Place.2", ("150",))
+    prices.range(high=120)    # ["Place.1"]
+
+    grid = GridIndex("latitude", "longitude")
+    grid.add("Place.1", (48.8566, 2.3522))
+    grid.within(48.86, 2.35, 5)    # [(0.41..., "Place.1")]
+
+    text = TextIndex("name", "description")
+    text.add("Place.1", ("Loft", "Quiet loft near the river"))
+    text.search("river loft")    # [(0.68..., "Place.1")]
+
+    amenities = BitmapIndex("amenity_ids")
+    amenities.add("Place.1", (["wifi", "pool"],))
+    amenities.add("Place.2", (["wifi"],))
+    amenities.all_of(["wifi", "pool"])    # ["Place.1"]
+
+    per_city = AggregateIndex("city_id", "price_by_night")
+    per_city.add("Place.1", ("city-1", 80))
+    per_city.add("Place.2", ("city-1", 120))
+    per_city.get("city-1")["avg"]    # 100.0
+
+Authors: Ukpono Umoren & Alexander Udeogaranya
+"""
+import bisect
+import datetime
+import math
+import re
+
+
+def freeze(value):
+    """
+    Returns a hashable version of an attribute value, turning lists into
+    tuples and dictionaries into sorted tuples of pairs.
+    """
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    return value
+
+
+class HashIndex:
+    """
+    The HashIndex class maps each value of an attribute to the set of
+    keys of the objects holding that value.
+
+    Attributes:
+        attrs (tuple): The indexed attribute, as a one-element tuple.
+        unique (bool): Whether two objects may not share a value.
+        entries (dict): The keys of the indexed objects by value.
+    """
+
+    kind = "hash"
+
+    def __init__(self, attr, unique=False):
+        """
+        Initializes an empty index on attr.
+        """
+        self.attrs = (attr,)
+        self.unique = unique
+        self.entries = {}
+
+    def add(self, key, values):
+        """
+        Adds key under the value of the indexed attribute.
+        """
+        self.entries.setdefault(freeze(values[0]), set()).add(key)
+
+    def remove(self, key, values):
+        """
+        Removes key from under the value of the indexed attribute.
+        """
+        value = freeze(values[0])
+        keys = self.entries.get(value)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.entries[value]
+
+    def get(self, value):
+        """
+        Returns the keys of the objects holding value.
+        """
+        return self.entries.get(freeze(value), frozenset())
+
+    def conflict(self, key, values):
+        """
+        Returns the key of another object already holding the value of
+        the indexed attribute, or None. Only unique indexes have
+        conflicts.
+        """
+        if self.unique:
+            for other in self.entries.get(freeze(values[0]), ()):
+                if other != key:
+                    return other
+        return None
+
+    def clear(self):
+        """
+        Empties the index.
+        """
+        self.entries.clear()
+
+
+def number(value):
+    """
+    Returns value as a float, or None if it is not a finite number.
+    Numeric strings, as set from the console, are converted.
+    """
+    if isinstance(value, bool):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+class SortedIndex:
+    """
+    The SortedIndex class keeps the keys of the indexed objects in the
+    order of a numeric attribute, then of the key, as two parallel sorted
+    lists searched by bisection. Values that are not numbers are left
+    out.
+
+    Keys added are queued, and put in place by the next read (see
+    settle()): a few by bisection, or a whole load, such as the one of
+    reload(), by sorting once, so that indexing n records costs
+    O(n log n) rather than one list insertion each.
+
+    Attributes:
+        attrs (tuple): The indexed attribute, as a one-element tuple.
+        values (list): The attribute values, in ascending order.
+        keys (list): The key holding each value in values.
+        pending (list): The (value, key) pairs added since the last read.
+    """
+
+    kind = "sorted"
+    batch = 32
+
+    def __init__(self, attr):
+        """
+        Initializes an empty index on attr.
+        """
+        self.attrs = (attr,)
+        self.values = []
+        self.keys = []
+        self.pending = []
+
+    def __len__(self):
+        """
+        Returns the number of indexed keys.
+        """
+        return len(self.keys) + len(self.pending)
+
+    value = staticmethod(number)
+
+    def add(self, key, values):
+        """
+        Queues key to be put at the position of its value.
+        """
+        value = self.value(values[0])
+        if value is not None:
+            self.pending.append((value, key))
+
+    def settle(self):
+        """
+        Puts the queued keys in place, inserting each by bisection if
+        they are fewer than batch, or else sorting the whole index once.
+        """
+        if len(self.pending) < self.batch:
+            for value, key in self.pending:
+                i = bisect.bisect_left(self.values, value)
+                end = bisect.bisect_right(self.values, value, i)
+                i = bisect.bisect_left(self.keys, key, i, end)
+                self.values.insert(i, value)
+                self.keys.insert(i, key)
+        else:
+            pairs = list(zip(self.values, self.keys))
+            pairs.extend(self.pending)
+            pairs.sort()
+            self.values = [value for value, key in pairs]
+            self.keys = [key for value, key in pairs]
+        del self.pending[:]
+
+    def remove(self, key, values):
+        """
+        Removes key from the position of its value.
+        """
+        value = self.value(values[0])
+        if value is None:
+            return
+        self.settle()
+        i = bisect.bisect_left(self.values, value)
+        end = bisect.bisect_right(self.values, value, i)
+        j = bisect.bisect_left(self.keys, key, i, end)
+        if j < end and self.keys[j] == key:
+            del self.values[j]
+            del self.keys[j]
+
+    def range(self, low=None, high=None):
+        """
+        Returns the keys whose value lies between low and high, both
+        included, in ascending order. A bound of None is open.
+        """
+        self.settle()
+        i = 0 if low is None else bisect.bisect_left(self.values, low)
+        end = len(self.values) if high is None \
+            else bisect.bisect_right(self.values, high)
+        return self.keys[i:end]
+
+    def count(self, low=None, high=None):
+        """
+        Returns the number of keys range() would return, in O(log n).
+        """
+        self.settle()
+        i = 0 if low is None else bisect.bisect_left(self.values, low)
+        end = len(self.values) if high is None \
+            else bisect.bisect_right(self.values, high)
+        return max(0, end - i)
+
+    def min(self):
+        """
+        Returns the key with the smallest value, or None.
+        """
+        self.settle()
+        return self.keys[0] if self.keys else None
+
+    def max(self):
+        """
+        Returns the key with the largest value, or None.
+        """
+        self.settle()
+        return self.keys[-1] if self.keys else None
+
+    def ordered(self, reverse=False):
+        """
+        Iterates over the keys by ascending value, or descending if
+        reverse is True.
+        """
+        self.settle()
+        return reversed(self.keys) if reverse else iter(self.keys)
+
+    def clear(self):
+        """
+        Empties the index.
+        """
+        del self.values[:]
+        del self.keys[:]
+        del self.pending[:]
+
+
+def stamp(value):
+    """
+    Returns a datetime, or its ISO 8601 form, as the ISO 8601 text with
+    microseconds, which sorts in time order, or None for other values.
+    Strings are kept as they are, so that dates never parsed since
+    from_record() stay unparsed.
+    """
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(timespec="microseconds")
+    if isinstance(value, str):
+        # isoformat() leaves the microseconds out when they are zero
+        return value + ".000000" if len(value) == 19 else value
+    return None
+
+
+class TimeIndex(SortedIndex):
+    """
+    The TimeIndex class keeps the keys of the indexed objects in the
+    order of a date attribute, such as updated_at, compared through
+    stamp(). Values that are not dates are left out.
+
+    Attributes:
+        attrs (tuple): The indexed attribute, as a one-element tuple.
+        values (list): The stamps of the values, in ascending order.
+        keys (list): The key holding each value in values.
+    """
+
+    kind = "time"
+    value = staticmethod(stamp)
+
+    def after(self, since, key=None):
+        """
+        Returns the stamps and keys of the values later than since, a
+        stamp, in ascending order. With key, the keys holding since
+        itself that sort after key are returned too, so that a cursor
+        of the last (stamp, key) received skips none of the keys sharing
+        its stamp.
+        """
+        self.settle()
+        if since is None:
+            i = 0
+        elif key is None:
+            i = bisect.bisect_right(self.values, since)
+        else:
+            i = bisect.bisect_left(self.values, since)
+            end = bisect.bisect_right(self.values, since, i)
+            i = bisect.bisect_right(self.keys, key, i, end)
+        return list(zip(self.values[i:], self.keys[i:]))
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """
+    Returns the great-circle distance in kilometres between two points
+    given in degrees, by the haversine formula.
+    """
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * \
+        math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(h)))
+
+
+def radius_bbox(lat, lon, radius_km):
+    """
+    Returns the (south, west, north, east) box holding every point within
+    radius_km of a point. west is greater than east when the box crosses
+    the antimeridian, and the box spans every longitude near a pole.
+    """
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    south, north = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+    if south == -90.0 or north == 90.0:
+        return south, -180.0, north, 180.0
+    dlon = math.degrees(math.asin(min(1.0, math.sin(
+        radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat)))))
+    if dlon >= 180.0:
+        return south, -180.0, north, 180.0
+    west = (lon - dlon + 180.0) % 360.0 - 180.0
+    east = (lon + dlon + 180.0) % 360.0 - 180.0
+    return south, west, north, east
+
+
+class GridIndex:
+    """
+    The GridIndex class buckets the keys of the indexed objects into
+    square cells of latitude and longitude, so that a box or radius
+    search only visits the cells it overlaps. Points whose coordinates
+    are not numbers, or were never set, are left out: an unset
+    coordinate is not taken to be the class default of 0.0.
+
+    Attributes:
+        attrs (tuple): The latitude and longitude attributes.
+        cell (float): The side of a cell, in degrees.
+        cells (dict): The keys in each (row, column) cell.
+        points (dict): The (latitude, longitude) of each key.
+    """
+
+    kind = "grid"
+    use_defaults = False
+
+    def __init__(self, lat_attr, lon_attr, cell=0.1):
+        """
+        Initializes an empty index on a latitude and a longitude
+        attribute, with cells of cell degrees.
+        """
+        self.attrs = (lat_attr, lon_attr)
+        self.cell = cell
+        self.cells = {}
+        self.points = {}
+
+    def __len__(self):
+        """
+        Returns the number of indexed keys.
+        """
+        return len(self.points)
+
+    def __point(self, values):
+        """
+        Returns values as a valid (latitude, longitude) pair, or None.
+        """
+        lat, lon = number(values[0]), number(values[1])
+        if lat is None or lon is None or not -90.0 <= lat <= 90.0:
+            return None
+        return lat, (lon + 180.0) % 360.0 - 180.0
+
+    def __row(self, lat):
+        """
+        Returns the row of the cells holding a latitude.
+        """
+        return int(math.floor((lat + 90.0) / self.cell))
+
+    def __column(self, lon):
+        """
+        Returns the column of the cells holding a longitude.
+        """
+        return int(math.floor((lon + 180.0) / self.cell))
+
+    def add(self, key, values):
+        """
+        Puts key in the cell of its coordinates.
+        """
+        point = self.__point(values)
+        if point is not None:
+            cell = (self.__row(point[0]), self.__column(point[1]))
+            self.cells.setdefault(cell, set()).add(key)
+            self.points[key] = point
+
+    def remove(self, key, values):
+        """
+        Takes key out of the cell of its coordinates.
+        """
+        point = self.points.pop(key, None)
+        if point is not None:
+            cell = (self.__row(point[0]), self.__column(point[1]))
+            self.cells[cell].discard(key)
+            if not self.cells[cell]:
+                del self.cells[cell]
+
+    def bbox(self, south, west, north, east):
+        """
+        Returns the keys of the points inside a box, bounds included. The
+        box crosses the antimeridian when west is greater than east.
+        """
+        if west > east:
+            return self.bbox(south, west, north, 180.0) + \
+                self.bbox(south, -180.0, north, east)
+        rows = range(self.__row(south), self.__row(north) + 1)
+        columns = range(self.__column(west), self.__column(east) + 1)
+        if len(rows) * len(columns) > len(self.cells):
+            cells = [cell for cell in self.cells
+                     if cell[0] in rows and cell[1] in columns]
+        else:
+            cells = [(row, column) for row in rows for column in columns
+                     if (row, column) in self.cells]
+        found = []
+        for cell in cells:
+            for key in self.cells[cell]:
+                lat, lon = self.points[key]
+                if south <= lat <= north and west <= lon <= east:
+                    found.append(key)
+        return found
+
+    def within(self, lat, lon, radius_km):
+        """
+        Returns the (distance in km, key) pairs of the points within
+        radius_km of a point, nearest first.
+        """
+        found = []
+        for key in set(self.bbox(*radius_bbox(lat, lon, radius_km))):
+            distance = distance_km(lat, lon, *self.points[key])
+            if distance <= radius_km:
+                found.append((distance, key))
+        found.sort()
+        return found
+
+    def clear(self):
+        """
+        Empties the index.
+        """
+        self.cells.clear()
+        self.points.clear()
+
+
+def tokenize(text):
+    """
+    Returns the lowercase words of a text, in order.
+    """
+    return re.findall(r"\w+", text.lower())
+
+
+class TextIndex:
+    """
+    The TextIndex class is an inverted index over one or more text
+    attributes: each word maps to a posting list of the keys whose text
+    holds it, with the number of times it appears. search() ranks the
+    keys by Okapi BM25.
+
+    Attributes:
+        attrs (tuple): The indexed text attributes.
+        postings (dict): The {key: term frequency} posting list of each
+        word.
+        lengths (dict): The number of words indexed for each key.
+        total (int): The sum of lengths.
+        k1 (float): The BM25 term frequency saturation.
+        b (float): The BM25 length normalization.
+    """
+
+    kind = "text"
+
+    def __init__(self, *attrs, k1=1.2, b=0.75):
+        """
+        Initializes an empty index on the given text attributes.
+        """
+        self.attrs = attrs
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.lengths = {}
+        self.total = 0
+
+    def __len__(self):
+        """
+        Returns the number of indexed keys.
+        """
+        return len(self.lengths)
+
+    @staticmethod
+    def words(values):
+        """
+        Returns the words of the string values among values.
+        """
+        words = []
+        for value in values:
+            if isinstance(value, str):
+                words.extend(tokenize(value))
+        return words
+
+    def add(self, key, values):
+        """
+        Adds key to the posting list of each word of its text.
+        """
+        words = self.words(values)
+        if not words:
+            return
+        counts = {}
+        for word in words:
+            counts[word] = counts.get(word, 0) + 1
+        for word, count in counts.items():
+            self.postings.setdefault(word, {})[key] = count
+        self.lengths[key] = len(words)
+        self.total += len(words)
+
+    def remove(self, key, values):
+        """
+        Removes key from the posting lists of the words of its text.
+        """
+        length = self.lengths.pop(key, None)
+        if length is None:
+            return
+        self.total -= length
+        for word in set(self.words(values)):
+            postings = self.postings.get(word)
+            if postings is not None:
+                postings.pop(key, None)
+                if not postings:
+                    del self.postings[word]
+
+    def search(self, query, limit=None):
+        """
+        Returns the (score, key) pairs of the keys whose text holds a word
+        of query, best first, scored by BM25.
+        """
+        if not self.lengths:
+            return []
+        count = len(self.lengths)
+        average = self.total / count
+        scores = {}
+        for word in set(tokenize(query)):
+            postings = self.postings.get(word)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) /
+                           (len(postings) + 0.5))
+            for key, frequency in postings.items():
+                norm = self.k1 * (1 - self.b + self.b *
+                                  self.lengths[key] / average)
+                scores[key] = scores.get(key, 0.0) + idf * frequency * \
+                    (self.k1 + 1) / (frequency + norm)
+        ranked = sorted(((score, key) for key, score in scores.items()),
+                        key=lambda pair: (-pair[0], pair[1]))
+        return ranked if limit is None else ranked[:limit]
+
+    def dump(self):
+        """
+        Returns the content of the index as JSON-serializable data.
+        """
+        return {"postings": self.postings, "lengths": self.lengths}
+
+    def load(self, data):
+        """
+        Replaces the content of the index with data from dump().
+        """
+        self.postings = data["postings"]
+        self.lengths = data["lengths"]
+        self.total = sum(self.lengths.values())
+
+    def clear(self):
+        """
+        Empties the index.
+        """
+        self.postings.clear()
+        self.lengths.clear()
+        self.total = 0
+
+
+class BitmapIndex:
+    """
+    The BitmapIndex class gives every indexed key a small integer, its
+    ordinal, and maps each item of a list attribute to the bitmap of the
+    ordinals of the keys whose list holds it. A bitmap is split into
+    chunks of 65536 ordinals, each stored as an integer, and only the
+    chunks with a bit set are kept, so sparse items stay small. Filters
+    on several items are bitwise AND or OR of chunks.
+
+    Attributes:
+        attrs (tuple): The indexed list attribute.
+        bitmaps (dict): The {chunk number: bits} bitmap of each item.
+        members (dict): The ordinal and the items of each key.
+        keys (list): The key holding each ordinal, or None once freed.
+        free (list): The freed ordinals, reused first.
+    """
+
+    kind = "bitmap"
+    chunk_bits = 16
+
+    def __init__(self, attr):
+        """
+        Initializes an empty index on a list attribute.
+        """
+        self.attrs = (attr,)
+        self.bitmaps = {}
+        self.members = {}
+        self.keys = []
+        self.free = []
+
+    def __len__(self):
+        """
+        Returns the number of indexed keys.
+        """
+        return len(self.members)
+
+    def add(self, key, values):
+        """
+        Sets the bit of key in the bitmap of each item of its list.
+        """
+        items = values[0]
+        if not isinstance(items, (list, tuple)):
+            return
+        items = tuple(sorted({freeze(item) for item in items},
+                             key=repr))
+        if self.free:
+            ordinal = self.free.pop()
+            self.keys[ordinal] = key
+        else:
+            ordinal = len(self.keys)
+            self.keys.append(key)
+        self.members[key] = (ordinal, items)
+        chunk, bit = divmod(ordinal, 1 << self.chunk_bits)
+        for item in items:
+            bitmap = self.bitmaps.setdefault(item, {})
+            bitmap[chunk] = bitmap.get(chunk, 0) | (1 << bit)
+
+    def remove(self, key, values):
+        """
+        Clears the bits of key and frees its ordinal. The items are those
+        recorded by add(), so a list changed in place is still removed
+        correctly.
+        """
+        member = self.members.pop(key, None)
+        if member is None:
+            return
+        ordinal, items = member
+        chunk, bit = divmod(ordinal, 1 << self.chunk_bits)
+        for item in items:
+            bitmap = self.bitmaps[item]
+            bitmap[chunk] &= ~(1 << bit)
+            if not bitmap[chunk]:
+                del bitmap[chunk]
+                if not bitmap:
+                    del self.bitmaps[item]
+        self.keys[ordinal] = None
+        self.free.append(ordinal)
+
+    def __keys(self, bitmap):
+        """
+        Returns the keys whose bits are set in a bitmap, by ordinal.
+        """
+        found = []
+        for chunk in sorted(bitmap):
+            bits, base = bitmap[chunk], chunk << self.chunk_bits
+            while bits:
+                low = bits & -bits
+                found.append(self.keys[base + low.bit_length() - 1])
+                bits ^= low
+        return found
+
+    def all_of(self, items):
+        """
+        Returns the keys whose list holds every one of items.
+        """
+        bitmaps = [self.bitmaps.get(freeze(item), {}) for item in items]
+        if not bitmaps:
+            return []
+        bitmaps.sort(key=len)
+        result = {}
+        for chunk, bits in bitmaps[0].items():
+            for bitmap in bitmaps[1:]:
+                bits &= bitmap.get(chunk, 0)
+                if not bits:
+                    break
+            if bits:
+                result[chunk] = bits
+        return self.__keys(result)
+
+    def any_of(self, items):
+        """
+        Returns the keys whose list holds at least one of items.
+        """
+        result = {}
+        for item in items:
+            for chunk, bits in self.bitmaps.get(freeze(item), {}).items():
+                result[chunk] = result.get(chunk, 0) | bits
+        return self.__keys(result)
+
+    def clear(self):
+        """
+        Empties the index.
+        """
+        self.bitmaps.clear()
+        self.members.clear()
+        del self.keys[:]
+        del self.free[:]
+
+
+class AggregateIndex:
+    """
+    The AggregateIndex class is a materialized group-by: for each value
+    of a grouping attribute it keeps the number of keys holding it and,
+    when a second, numeric attribute is given, the sum of its values and
+    how often each value occurs. Adding or removing a key costs O(1);
+    the minimum and maximum are cached and only recomputed, from the
+    distinct values of the group, after the key holding one of them
+    leaves. Values that are not numbers count but are left out of the
+    other figures.
+
+    Attributes:
+        attrs (tuple): The grouping attribute, then the numeric one.
+        groups (dict): The state of each group: its "count", "numbers"
+        (how many of its values are numbers), "sum", the "values" with
+        their multiplicity, and the cached "min" and "max", None when
+        they must be recomputed.
+    """
+
+    kind = "aggregate"
+
+    def __init__(self, group_attr, value_attr=None):
+        """
+        Initializes an empty index grouping by group_attr, which also
+        aggregates value_attr if given.
+        """
+        self.attrs = (group_attr,) if value_attr is None else \
+            (group_attr, value_attr)
+        self.groups = {}
+
+    def __len__(self):
+        """
+        Returns the number of groups.
+        """
+        return len(self.groups)
+
+    def add(self, key, values):
+        """
+        Counts key in the group of its first value.
+        """
+        self.increment(values, 1)
+
+    def remove(self, key, values):
+        """
+        Uncounts key from the group of its first value.
+        """
+        self.increment(values, -1)
+
+    def increment(self, values, count):
+        """
+        Adds count occurrences of values, a (group, value) or (group,)
+        tuple, to the index; a negative count removes them. Storage
+        engines that aggregate elsewhere, such as in SQL, feed their
+        partial counts through this.
+        """
+        group = freeze(values[0])
+        state = self.groups.get(group)
+        if state is None:
+            state = self.groups[group] = {"count": 0, "numbers": 0,
+                                          "sum": 0.0, "values": {},
+                                          "min": None, "max": None}
+        state["count"] += count
+        if state["count"] <= 0:
+            del self.groups[group]
+            return
+        value = number(values[1]) if len(values) > 1 else None
+        if value is None:
+            return
+        occurrences = state["values"].get(value, 0) + count
+        if occurrences > 0:
+            state["values"][value] = occurrences
+        else:
+            state["values"].pop(value, None)
+        state["numbers"] += count
+        if not state["numbers"]:
+            # Start over rather than keep the rounding errors
+            state["sum"] = 0.0
+        else:
+            state["sum"] += value * count
+        for bound, better in (("min", min), ("max", max)):
+            if state[bound] is None:
+                continue
+            if count > 0:
+                state[bound] = better(state[bound], value)
+            elif occurrences <= 0 and value == state[bound]:
+                state[bound] = None
+
+    def get(self, group):
+        """
+        Returns the figures of a group, as a dictionary with its "count"
+        and, when a numeric attribute is aggregated, its "sum", "min",
+        "max" and "avg" (None if none of its values is a number), or
+        None if no key holds the group value.
+        """
+        state = self.groups.get(freeze(group))
+        if state is None:
+            return None
+        if len(self.attrs) == 1:
+            return {"count": state["count"]}
+        for bound, better in (("min", min), ("max", max)):
+            if state[bound] is None and state["values"]:
+                state[bound] = better(state["values"])
+        numbers = state["numbers"]
+        return {"count": state["count"],
+                "sum": state["sum"] if numbers else None,
+                "min": state["min"], "max": state["max"],
+                "avg": state["sum"] / numbers if numbers else None}
+
+    def items(self):
+        """
+        Returns a dictionary of the figures of every group.
+        """
+        return {group: self.get(group) for group in self.groups}
+
+    def clear(self):
+        """
+        Empties the index.
+        """
+        self.groups.clear()
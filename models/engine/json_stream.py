@@ -0,0 +1,147 @@
+#!/usr/bin/python3
+"""
+ALX HolbertonBnB - JSON Stream
+
+This module reads and writes the top-level JSON object of file.json one
+member at a time, so that the storage never holds the whole file as a
+string or as a single decoded dictionary. Only one chunk of the file and
+the member being decoded are buffered.
+
+Functions:
+    iter_items(f, chunk_size=65536): Yields the (key, value) pairs of the
+    JSON object read from a text file.
+    write_items(f, items, encoded=False): Writes (key, value) pairs as a
+    JSON object.
+
+Usage:
+    with open("file.json", "r", encoding="utf-8") as f:
+        for key, record in iter_items(f):
+            print(key, record["__class__"])
+
+Authors: Ukpono Umoren & Alexander Udeogaranya
+"""
+import json
+
+_WHITESPACE = " \t\n\r"
+
+
+class _Reader:
+    """
+    A growing window over a text file, used by iter_items().
+
+    Attributes:
+        buf (str): The part of the file read and not consumed yet.
+        pos (int): The position of the next character in buf.
+        eof (bool): Whether the whole file has been read.
+    """
+
+    def __init__(self, f, chunk_size):
+        """
+        Initializes the window at the start of f.
+        """
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        """
+        Reads one more chunk, dropping the consumed part of the buffer.
+        Returns False at end of file.
+        """
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """
+        Skips whitespace and returns the next character, or "" at the end.
+        """
+        while True:
+            while self.pos < len(self.buf) and \
+                    self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf) or not self.fill():
+                return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        """
+        Consumes char, raising ValueError if something else comes next.
+        """
+        if self.peek() != char:
+            raise ValueError("Expecting '{}' at offset {}".format(
+                char, self.pos))
+        self.pos += 1
+
+    def value(self):
+        """
+        Decodes the next JSON value, reading more of the file until the
+        value is complete.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number may continue past the end of the buffer
+            if end < len(self.buf) or self.eof or not self.fill():
+                self.pos = end
+                return value
+
+
+def iter_items(f, chunk_size=65536):
+    """
+    Yields the (key, value) pairs of the JSON object stored in a text
+    file, one at a time. An empty file yields nothing.
+
+    Args:
+        f (file): A text file opened for reading.
+        chunk_size (int): The number of characters read at a time.
+
+    Raises:
+        ValueError: If the file does not hold a JSON object.
+    """
+    reader = _Reader(f, chunk_size)
+    if reader.peek() == "":
+        return
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        yield key, reader.value()
+        if reader.peek() == "}":
+            return
+        reader.expect(",")
+
+
+def write_items(f, items, encoded=False):
+    """
+    Writes (key, value) pairs to a text file as one JSON object, one
+    member at a time.
+
+    Args:
+        f (file): A text file opened for writing.
+        items (iterable): The (key, value) pairs to write.
+        encoded (bool): Whether the values are JSON texts already, which
+        are then written as they are.
+    """
+    f.write("{")
+    separator = ""
+    for key, value in items:
+        f.write(separator)
+        f.write(json.dumps(key))
+        f.write(": ")
+        f.write(value if encoded else json.dumps(value))
+        separator = ", "
+    f.write("}")
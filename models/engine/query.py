@@ -0,0 +1,486 @@
+#!/usr/bin/python3
+"""
+ALX HolbertonBnB - Query Language
+
+This module parses the filter expressions of the console's
+<class>.where() method, such as
+
+    price_by_night < 100 and city_id == 'x'
+
+into a tree of Comparison, And, Or and Not nodes, and plans how to
+evaluate them against the secondary indexes of a class (see indexes):
+an equality on an attribute with a hash index, or a comparison on an
+attribute with a sorted index, can be answered from the index instead
+of a full scan. The planner keeps the cheapest access path, by the
+number of rows the index says it will return, and the whole expression
+is then checked on each candidate.
+
+Comparisons with a number compare numerically, so that the numeric
+strings set from the console match; other values compare as they are.
+
+Functions:
+    parse(text): Parses an expression into a tree.
+    plan(node, indexes, total, order_by=None, limit=None): Chooses how
+    to find the keys matching a tree.
+    parse_order(order_by): Splits "attr desc" into ("attr", True).
+    sort(items, value, reverse=False): Sorts items by an attribute value,
+    numbers first.
+
+Usage:
+    node = parse("price_by_night < 100 and city_id == 'x'")
+    chosen = plan(node, [city_index, price_index], 1000)
+    print(chosen.describe())
+    for key in chosen.keys(all_keys, value):
+        ...
+
+Authors: Ukpono Umoren & Alexander Udeogaranya
+"""
+import operator
+import re
+
+from models.engine.indexes import number
+
+_TOKEN = re.compile(r"""\s*(?:
+    (?P<number>-?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][-+]?\d+)?)
+    |(?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+    |(?P<op>==|!=|<=|>=|<|>|\(|\))
+    |(?P<name>[A-Za-z_]\w*)
+    )""", re.VERBOSE)
+
+_OPERATORS = {"==": operator.eq, "!=": operator.ne, "<": operator.lt,
+              "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+
+class Comparison:
+    """
+    A node comparing an attribute with a literal value.
+
+    Attributes:
+        attr (str): The name of the attribute.
+        op (str): One of ==, !=, <, <=, > and >=.
+        value: The literal, a number or a string.
+    """
+
+    def __init__(self, attr, op, value):
+        """
+        Initializes the comparison attr op value.
+        """
+        self.attr = attr
+        self.op = op
+        self.value = value
+
+    def __str__(self):
+        """
+        Returns the comparison as it would be written.
+        """
+        return "{} {} {!r}".format(self.attr, self.op, self.value)
+
+    def attrs(self):
+        """
+        Returns the set of attributes the node reads.
+        """
+        return {self.attr}
+
+    def matches(self, get):
+        """
+        Returns whether the comparison holds, get(attr) giving the value
+        of an attribute.
+        """
+        value = get(self.attr)
+        if isinstance(self.value, (int, float)):
+            value = number(value)
+            if value is None:
+                return self.op == "!="
+        elif self.op not in ("==", "!=") and not isinstance(value, str):
+            return False
+        return _OPERATORS[self.op](value, self.value)
+
+    def bounds(self):
+        """
+        Returns the (low, high) range a sorted index must return for a
+        numeric comparison, or None if it cannot narrow the search.
+        """
+        if not isinstance(self.value, (int, float)) or self.op == "!=":
+            return None
+        if self.op == "==":
+            return self.value, self.value
+        if self.op in ("<", "<="):
+            return None, self.value
+        return self.value, None
+
+
+class And:
+    """
+    A node holding when all of its terms hold.
+
+    Attributes:
+        terms (list): The nodes combined.
+    """
+
+    word = "and"
+
+    def __init__(self, terms):
+        """
+        Initializes the conjunction of terms.
+        """
+        self.terms = terms
+
+    def __str__(self):
+        """
+        Returns the expression as it would be written.
+        """
+        return "(" + " {} ".format(self.word).join(
+            str(term) for term in self.terms) + ")"
+
+    def attrs(self):
+        """
+        Returns the set of attributes the node reads.
+        """
+        return set().union(*(term.attrs() for term in self.terms))
+
+    def matches(self, get):
+        """
+        Returns whether every term holds.
+        """
+        return all(term.matches(get) for term in self.terms)
+
+
+class Or(And):
+    """
+    A node holding when any of its terms holds.
+    """
+
+    word = "or"
+
+    def matches(self, get):
+        """
+        Returns whether any term holds.
+        """
+        return any(term.matches(get) for term in self.terms)
+
+
+class Not:
+    """
+    A node holding when its term does not.
+
+    Attributes:
+        term: The node negated.
+    """
+
+    def __init__(self, term):
+        """
+        Initializes the negation of term.
+        """
+        self.term = term
+
+    def __str__(self):
+        """
+        Returns the expression as it would be written.
+        """
+        return "not {}".format(self.term)
+
+    def attrs(self):
+        """
+        Returns the set of attributes the node reads.
+        """
+        return self.term.attrs()
+
+    def matches(self, get):
+        """
+        Returns whether the term does not hold.
+        """
+        return not self.term.matches(get)
+
+
+class _Parser:
+    """
+    A recursive descent parser over the tokens of an expression.
+
+    Attributes:
+        tokens (list): The (kind, text) pairs of the expression.
+        pos (int): The index of the next token.
+    """
+
+    def __init__(self, text):
+        """
+        Splits text into tokens.
+
+        Raises:
+            ValueError: If text holds a character no token starts with.
+        """
+        self.tokens = []
+        pos = 0
+        text = text.rstrip()
+        while pos < len(text):
+            match = _TOKEN.match(text, pos)
+            if match is None or match.end() == pos:
+                raise ValueError("Unexpected character at {}: {!r}".format(
+                    pos, text[pos:pos + 10]))
+            self.tokens.append((match.lastgroup, match.group(
+                match.lastgroup)))
+            pos = match.end()
+        self.pos = 0
+
+    def peek(self):
+        """
+        Returns the next token, or (None, None) at the end.
+        """
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return None, None
+
+    def next(self, kind, text=None):
+        """
+        Consumes the next token, which must be of the given kind.
+
+        Raises:
+            ValueError: If the next token is something else.
+        """
+        token = self.peek()
+        if token[0] != kind or text is not None and token[1] != text:
+            raise ValueError("Expected {} at token {}, found {!r}".format(
+                text or kind, self.pos, token[1]))
+        self.pos += 1
+        return token[1]
+
+    def keyword(self, word):
+        """
+        Consumes the next token if it is the keyword word.
+        """
+        kind, text = self.peek()
+        if kind == "name" and text.lower() == word:
+            self.pos += 1
+            return True
+        return False
+
+    def expression(self):
+        """
+        Parses terms joined by "or".
+        """
+        terms = [self.conjunction()]
+        while self.keyword("or"):
+            terms.append(self.conjunction())
+        return terms[0] if len(terms) == 1 else Or(terms)
+
+    def conjunction(self):
+        """
+        Parses terms joined by "and".
+        """
+        terms = [self.negation()]
+        while self.keyword("and"):
+            terms.append(self.negation())
+        return terms[0] if len(terms) == 1 else And(terms)
+
+    def negation(self):
+        """
+        Parses a comparison or parenthesized expression, possibly
+        preceded by "not".
+        """
+        if self.keyword("not"):
+            return Not(self.negation())
+        if self.peek() == ("op", "("):
+            self.pos += 1
+            node = self.expression()
+            self.next("op", ")")
+            return node
+        attr = self.next("name")
+        op = self.next("op")
+        if op not in _OPERATORS:
+            raise ValueError("Expected a comparison after {}".format(attr))
+        kind, text = self.peek()
+        if kind == "number":
+            value = float(text)
+            if value.is_integer() and re.match(r"-?\d+$", text):
+                value = int(text)
+        elif kind == "string":
+            value = re.sub(r"\\(.)", r"\1", text[1:-1])
+        else:
+            raise ValueError("Expected a value after {} {}".format(attr, op))
+        self.pos += 1
+        return Comparison(attr, op, value)
+
+
+def parse(text):
+    """
+    Parses a filter expression into a tree of nodes.
+
+    Args:
+        text (str): Comparisons such as price_by_night < 100 or
+        city_id == 'x', joined by and, or, not and parentheses.
+
+    Returns:
+        The root node.
+
+    Raises:
+        ValueError: If text is not a valid expression.
+    """
+    parser = _Parser(text)
+    node = parser.expression()
+    if parser.peek()[0] is not None:
+        raise ValueError("Unexpected {!r} at token {}".format(
+            parser.peek()[1], parser.pos))
+    return node
+
+
+def parse_order(order_by):
+    """
+    Splits an order_by argument such as "price_by_night desc" into the
+    attribute and whether the order is descending.
+
+    Raises:
+        ValueError: If the direction is neither asc nor desc.
+    """
+    words = order_by.split()
+    if not words or len(words) > 2 or \
+            len(words) == 2 and words[1].lower() not in ("asc", "desc"):
+        raise ValueError("Invalid order_by: {!r}".format(order_by))
+    return words[0], len(words) == 2 and words[1].lower() == "desc"
+
+
+def _sort_key(value):
+    """
+    Returns (group, number, text): group 0 holds the numbers, numeric
+    strings included, and group 1 everything else, ordered by its text.
+    """
+    numeric = number(value)
+    if numeric is not None:
+        return 0, numeric, ""
+    return 1, 0, "" if value is None else str(value)
+
+
+def sort(items, value, reverse=False):
+    """
+    Returns items sorted by an attribute value: numbers first, in
+    ascending or descending order, then the other values by their text
+    in the same direction. value(item) gives the value of an item.
+    """
+    items = sorted(items, key=lambda item: _sort_key(value(item))[1:],
+                   reverse=reverse)
+    return sorted(items, key=lambda item: _sort_key(value(item))[0])
+
+
+class Plan:
+    """
+    The way chosen to find the keys matching an expression.
+
+    Attributes:
+        access (str): How the candidates are found.
+        estimate (int): The number of candidates expected.
+        total (int): The number of keys of the class.
+        ordered (bool): Whether the candidates come in the requested
+        order, so that sorting can be skipped.
+        source (callable): Returns the candidate keys, given all keys and
+        the function giving the value of an attribute of a key.
+    """
+
+    def __init__(self, access, estimate, total, source, ordered=False):
+        """
+        Initializes a plan.
+        """
+        self.access = access
+        self.estimate = estimate
+        self.total = total
+        self.source = source
+        self.ordered = ordered
+
+    def keys(self, all_keys, value):
+        """
+        Returns the candidate keys, all_keys being every key of the class
+        and value(key, attr) the value of an attribute of a key.
+        """
+        return self.source(all_keys, value)
+
+    def describe(self):
+        """
+        Returns the access path and estimated row count as one line.
+        """
+        return "{} (estimated {} of {} rows)".format(
+            self.access, self.estimate, self.total)
+
+
+def _index_plan(node, indexes, total):
+    """
+    Returns the cheapest index plan answering node, or None if node
+    cannot be answered from the indexes alone.
+    """
+    if isinstance(node, Comparison):
+        candidates = []
+        for index in indexes:
+            if index.attrs != (node.attr,):
+                continue
+            if index.kind == "hash" and node.op == "==" and \
+                    not isinstance(node.value, (int, float)):
+                keys = index.get(node.value)
+                candidates.append(Plan(
+                    "hash index on {} ({})".format(node.attr, node),
+                    len(keys), total, lambda all_keys, value, keys=keys:
+                    list(keys)))
+            elif index.kind == "sorted" and node.bounds() is not None:
+                low, high = node.bounds()
+                candidates.append(Plan(
+                    "range index on {} ({})".format(node.attr, node),
+                    index.count(low, high), total,
+                    lambda all_keys, value, index=index, low=low,
+                    high=high: index.range(low, high)))
+        return min(candidates, key=lambda p: p.estimate, default=None)
+    if isinstance(node, Or):
+        plans = [_index_plan(term, indexes, total) for term in node.terms]
+        if any(p is None for p in plans):
+            return None
+
+        def union(all_keys, value):
+            keys = set()
+            for p in plans:
+                keys.update(p.keys(all_keys, value))
+            return keys
+        return Plan("union of [{}]".format("; ".join(
+            p.access for p in plans)), min(total, sum(
+                p.estimate for p in plans)), total, union)
+    if isinstance(node, And):
+        plans = [_index_plan(term, indexes, total) for term in node.terms]
+        return min((p for p in plans if p is not None),
+                   key=lambda p: p.estimate, default=None)
+    return None
+
+
+def plan(node, indexes, total, order_by=None, limit=None):
+    """
+    Chooses how to find the keys matching an expression.
+
+    The most selective index lookup wins. Without one, a query ordered
+    by an attribute with a sorted index walks that index, so that it can
+    stop after limit matches; otherwise every key is scanned.
+
+    Args:
+        node: The root of the expression, or None to match every key.
+        indexes (list): The secondary indexes of the class.
+        total (int): The number of keys of the class.
+        order_by (str, optional): The order requested, such as
+        "price_by_night desc".
+        limit (int, optional): The number of results requested.
+
+    Returns:
+        Plan: The chosen plan.
+    """
+    chosen = None if node is None else _index_plan(node, indexes, total)
+    if chosen is not None and chosen.estimate < total:
+        return chosen
+    if order_by is not None:
+        attr, reverse = parse_order(order_by)
+        for index in indexes:
+            if index.kind == "sorted" and index.attrs == (attr,):
+                def walk(all_keys, value, index=index, attr=attr,
+                         reverse=reverse):
+                    seen = set()
+                    for key in list(index.ordered(reverse)):
+                        seen.add(key)
+                        yield key
+                    rest = [key for key in all_keys if key not in seen]
+                    yield from sort(rest, lambda key: value(key, attr),
+                                    reverse)
+                estimate = total if limit is None else min(total, limit)
+                return Plan("ordered scan of the range index on {}{}".format(
+                    attr, " (descending)" if reverse else ""),
+                    estimate, total, walk, ordered=True)
+    return chosen or Plan("full scan", total, total,
+                          lambda all_keys, value: list(all_keys))
@@ -0,0 +1,240 @@
+#!/usr/bin/python3
+"""
+ALX HolbertonBnB - Model Registry
+
+This module keeps the single list of model classes. BaseModel registers
+itself, and every subclass registers from BaseModel.__init_subclass__
+as it is defined, so that a new model needs no edits elsewhere: storage
+engines, the console and validation all look the classes up here.
+
+The schema of a class is compiled once, on registration, from the class
+level defaults that the models declare (name = "", number_rooms = 0,
+latitude = 0.0, amenity_ids = []), inherited ones included: each public
+attribute whose default is a str, int, float, list or dict is part of
+the schema, with the type of its default. BaseModel declares its schema
+(id, created_at and updated_at) explicitly. A coercer is compiled for
+each attribute of the full schema, casting the values written to it.
+The dictionaries returned are the compiled ones, shared by every caller,
+and must not be modified.
+
+Functions:
+    register(cls, schema=None): Registers a model class.
+    unregister(cls): Removes a model class.
+    classes(): The registered classes, by name.
+    attributes(name): The schema of a class, without that of BaseModel.
+    fields(name): The full schema of a class.
+    coercers(name): The coercer of each attribute of the full schema.
+    coerce(name, attr, value): Casts a value to the type of an attribute.
+
+Usage:
+    classes()["Place"]                    # <class 'models.place.Place'>
+    attributes("Place")["price_by_night"]  # <class 'int'>
+    coerce("Place", "price_by_night", "100")    # 100
+    coerce("Place", "price_by_night", "cheap")  # ValueError
+
+Authors: Ukpono Umoren & Alexander Udeogaranya
+"""
+import datetime
+import json
+import types
+
+_classes = {}
+_attributes = {}
+_fields = {}
+_coercers = {}
+_root = None
+
+_TYPES = (str, int, float, list, dict)
+
+
+def _invalid(value, kind):
+    """
+    Returns the error raised for a value that cannot be cast to kind.
+    """
+    return ValueError("{!r} is not a valid {}".format(value, kind.__name__))
+
+
+def _to_str(value):
+    """
+    Casts a string or a number to a string.
+    """
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise _invalid(value, str)
+
+
+def _to_int(value):
+    """
+    Casts an integer, a whole float or its string form to an integer.
+    """
+    if isinstance(value, bool):
+        raise _invalid(value, int)
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value.strip())
+        except ValueError:
+            raise _invalid(value, int) from None
+    raise _invalid(value, int)
+
+
+def _to_float(value):
+    """
+    Casts a number or its string form to a float.
+    """
+    if isinstance(value, bool):
+        raise _invalid(value, float)
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip())
+        except ValueError:
+            raise _invalid(value, float) from None
+    raise _invalid(value, float)
+
+
+def _from_json(kind):
+    """
+    Returns the coercer of a container type, which accepts an instance or
+    its JSON form.
+    """
+    def to_kind(value):
+        """
+        Casts a container, or its JSON form, to the container type.
+        """
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                raise _invalid(value, kind) from None
+        if kind is list and isinstance(value, tuple):
+            value = list(value)
+        if not isinstance(value, kind):
+            raise _invalid(value, kind)
+        return value
+    return to_kind
+
+
+def _to_datetime(value):
+    """
+    Casts a datetime or its ISO 8601 form to a datetime.
+    """
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.datetime.fromisoformat(value)
+        except ValueError:
+            raise _invalid(value, datetime.datetime) from None
+    raise _invalid(value, datetime.datetime)
+
+
+_COERCERS = {
+    str: _to_str,
+    int: _to_int,
+    float: _to_float,
+    list: _from_json(list),
+    dict: _from_json(dict),
+    datetime.datetime: _to_datetime,
+}
+
+
+def _declared(cls):
+    """
+    Returns the schema declared by the class level defaults of cls and
+    of the classes it inherits from, below BaseModel.
+    """
+    schema = {}
+    for klass in reversed(cls.__mro__):
+        if _root is not None and issubclass(_root, klass):
+            continue
+        for name, value in vars(klass).items():
+            if not name.startswith("_") and type(value) in _TYPES:
+                schema[name] = type(value)
+    return schema
+
+
+def register(cls, schema=None):
+    """
+    Registers a model class under its name, replacing any class of the
+    same name, and compiles its schema and coercers. The first class
+    registered is BaseModel, whose schema is part of every other.
+
+    Args:
+        cls (class): The model class.
+        schema (dict, optional): The attributes and their types. Derived
+        from the class level defaults if None.
+    """
+    global _root
+    name = cls.__name__
+    if _root is None:
+        _root = cls
+    attributes = _declared(cls) if schema is None else dict(schema)
+    fields = {} if cls is _root else dict(_fields[_root.__name__])
+    fields.update(attributes)
+    _classes[name] = cls
+    _attributes[name] = attributes
+    _fields[name] = fields
+    _coercers[name] = {attr: _COERCERS.get(kind, kind)
+                       for attr, kind in fields.items()}
+
+
+def unregister(cls):
+    """
+    Removes a model class registered under its name.
+    """
+    name = cls.__name__
+    if _classes.get(name) is cls:
+        for table in (_classes, _attributes, _fields, _coercers):
+            del table[name]
+
+
+def classes():
+    """
+    Returns a read-only view of the registered classes, by name.
+    """
+    return _view
+
+
+def attributes(name):
+    """
+    Returns the attributes of a class and their types, without those of
+    BaseModel, which attributes("BaseModel") returns on their own.
+    """
+    return _attributes[name]
+
+
+def fields(name):
+    """
+    Returns every attribute of a class and its type, those of BaseModel
+    first.
+    """
+    return _fields[name]
+
+
+def coercers(name):
+    """
+    Returns the coercer of each attribute of a class.
+    """
+    return _coercers[name]
+
+
+def coerce(name, attr, value):
+    """
+    Casts a value to the type of an attribute of a class. Attributes
+    outside the schema take any value.
+
+    Raises:
+        ValueError: If the value cannot be cast.
+    """
+    coercer = _coercers[name].get(attr)
+    return value if coercer is None else coercer(value)
+
+
+_view = types.MappingProxyType(_classes)
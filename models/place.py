@@ -17,6 +17,7 @@ Attributes:
     latitude (float): The latitude coordinate of the place's location.
     max_guest (int): The maximum number of guests the place can accommodate.
     amenity_ids (list): A list of amenity IDs associated with the place.
+    reviews (list): The reviews of the place.
 
 Methods:
     __init__(self, *args, **kwargs): Initializes a new instance of Place.
@@ -51,7 +52,9 @@ Usage:
 Authors: Ukpono Umoren & Alexander Udeogaranya
 """
 
+from models import storage
 from models.base_model import BaseModel
+from models.review import Review
 
 
 class Place(BaseModel):
@@ -71,6 +74,7 @@ class Place(BaseModel):
         max_guest (int): The maximum number of guests
         the place can accommodate.
         amenity_ids (list): A list of amenity IDs associated with the place.
+        reviews (list): The reviews of the place.
     """
 
     name = ""
@@ -84,3 +88,10 @@ class Place(BaseModel):
     latitude = 0.0
     max_guest = 0
     amenity_ids = []
+
+    @property
+    def reviews(self):
+        """
+        Returns the reviews whose place_id is the ID of this place.
+        """
+        return storage.related(Review, "place_id", self.id)
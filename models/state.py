@@ -7,6 +7,7 @@ the HolbertonBnB application.
 
 Attributes:
     name (str): The name of the state.
+    cities (list): The cities of the state.
 
 Methods:
     __init__(self, *args, **kwargs): Initializes a new instance of State.
@@ -30,7 +31,9 @@ Usage:
 Authors: Ukpono Umoren & Alexander Udeogaranya
 """
 
+from models import storage
 from models.base_model import BaseModel
+from models.city import City
 
 
 class State(BaseModel):
@@ -39,6 +42,14 @@ class State(BaseModel):
 
     Attributes:
         name (str): The name of the state.
+        cities (list): The cities of the state.
     """
 
     name = ""
+
+    @property
+    def cities(self):
+        """
+        Returns the cities whose state_id is the ID of this state.
+        """
+        return storage.related(City, "state_id", self.id)
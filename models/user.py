@@ -10,6 +10,8 @@ Attributes:
     password (str): The password of the user.
     first_name (str): The first name of the user.
     last_name (str): The last name of the user.
+    places (list): The places owned by the user.
+    reviews (list): The reviews written by the user.
 
 Methods:
     __init__(self, *args, **kwargs): Initializes a new instance of User.
@@ -37,7 +39,10 @@ Usage:
 Authors: Ukpono Umoren & Alexander Udeogaranya
 """
 
+from models import storage
 from models.base_model import BaseModel
+from models.place import Place
+from models.review import Review
 
 
 class User(BaseModel):
@@ -49,9 +54,25 @@ class User(BaseModel):
         password (str): The password of the user.
         first_name (str): The first name of the user.
         last_name (str): The last name of the user.
+        places (list): The places owned by the user.
+        reviews (list): The reviews written by the user.
     """
 
     email = ""
     password = ""
     first_name = ""
     last_name = ""
+
+    @property
+    def places(self):
+        """
+        Returns the places whose user_id is the ID of this user.
+        """
+        return storage.related(Place, "user_id", self.id)
+
+    @property
+    def reviews(self):
+        """
+        Returns the reviews whose user_id is the ID of this user.
+        """
+        return storage.related(Review, "user_id", self.id)
@@ -0,0 +1,84 @@
+#!/usr/bin/python3
+"""
+ALX HolbertonBnB - Hydration Benchmark
+
+This script compares two ways of turning records into model instances.
+The keyword arguments of __init__, Place(**record), parse both dates
+with datetime.strptime(); storage engines do not use this path.
+from_record(), the only path reload() and get() take, defers parsing
+the dates until they are read. It reports the objects built per second
+for each, with and without reading the dates afterwards.
+
+Usage:
+    $ python3 scripts/benchmark_hydration.py [number of records]
+
+Authors: Ukpono Umoren & Alexander Udeogaranya
+"""
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_records(count):
+    """
+    Returns count decoded Place records, as reload() reads them.
+    """
+    now = datetime.datetime.now()
+    records = []
+    for i in range(count):
+        stamp = (now - datetime.timedelta(seconds=i)).isoformat()
+        records.append({"id": str(uuid.uuid4()), "created_at": stamp,
+                        "updated_at": stamp, "__class__": "Place",
+                        "name": "Place {}".format(i),
+                        "city_id": str(uuid.uuid4()),
+                        "price_by_night": 40 + i % 200,
+                        "latitude": 48.8, "longitude": 2.3,
+                        "amenity_ids": ["wifi", "kitchen"]})
+    return json.loads(json.dumps(records))
+
+
+def rate(build, records, read_dates):
+    """
+    Returns the objects per second built by build from records, reading
+    their dates afterwards if read_dates is True.
+    """
+    start = time.perf_counter()
+    for record in records:
+        obj = build(record)
+        if read_dates:
+            getattr(obj, "created_at")
+            getattr(obj, "updated_at")
+    return len(records) / (time.perf_counter() - start)
+
+
+def main():
+    """
+    Runs the benchmark and prints the objects per second of each path.
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.chdir(tmpdir)
+        sys.path.insert(0, ROOT)
+        from models.place import Place
+
+        records = make_records(count)
+        paths = (("Place(**record)", lambda record: Place(**record)),
+                 ("Place.from_record(record)", Place.from_record))
+        baseline = None
+        for label, build in paths:
+            for read_dates in (False, True):
+                speed = rate(build, records, read_dates)
+                baseline = baseline or speed
+                print("{:<26} {:<13} {:>10,.0f} objects/s {:>6.1f}x".format(
+                    label, "dates read" if read_dates else "dates unread",
+                    speed, speed / baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+"""
+ALX HolbertonBnB - Memory Benchmark
+
+This script measures the memory held per loaded object by FileStorage,
+with regular model instances and with the compact (slotted) instances
+of configure(compact=True). It writes a store of places, users and
+reviews to a temporary directory, builds an instance from every stored
+record in each mode with from_record(), as reload() and get() do, and
+reports the bytes traced by tracemalloc per instance, attribute values
+included.
+
+Usage:
+    $ python3 scripts/benchmark_memory.py [number of places]
+
+Authors: Ukpono Umoren & Alexander Udeogaranya
+"""
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def populate(storage, places):
+    """
+    Creates places, with one host and one review each, and compacts them
+    into the snapshot.
+    """
+    from models.place import Place
+    from models.review import Review
+    from models.user import User
+
+    for i in range(places):
+        user = User()
+        user.email = "host{}@example.com".format(i)
+        user.first_name = "Host"
+        place = Place()
+        place.user_id = user.id
+        place.city_id = "city-{}".format(i % 100)
+        place.name = "Place {}".format(i)
+        place.description = "A quiet room near the river"
+        place.price_by_night = 40 + i % 200
+        place.number_rooms = 1 + i % 4
+        place.latitude = 48.8 + i % 1000 / 10000
+        place.longitude = 2.3 + i % 1000 / 10000
+        place.amenity_ids = ["wifi", "kitchen"]
+        review = Review()
+        review.place_id = place.id
+        review.user_id = user.id
+        review.text = "Lovely stay"
+    storage.save()
+    storage.compact()
+
+
+def model(name, compact):
+    """
+    Returns the class FileStorage builds the records of a class with.
+    """
+    from models.engine import registry
+    from models.engine.compact import compact_class
+
+    cls = registry.classes()[name]
+    if not compact:
+        return cls
+    return compact_class(cls, registry.fields(name))
+
+
+def measure(storage, compact):
+    """
+    Builds an instance from every stored record in the given mode and
+    returns the number of instances and the bytes they hold.
+    """
+    records = [record for key, record in storage.iter_records()]
+    classes = {name: model(name, compact)
+               for name in storage.classes()}
+    gc.collect()
+    tracemalloc.start()
+    instances = [classes[record["__class__"]].from_record(record)
+                 for record in records]
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return len(instances), used
+
+
+def main():
+    """
+    Runs the benchmark and prints the bytes per object of each mode.
+    """
+    places = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.chdir(tmpdir)
+        sys.path.insert(0, ROOT)
+        from models import storage
+
+        populate(storage, places)
+        results = {}
+        for compact in (False, True):
+            count, used = measure(storage, compact)
+            results[compact] = used / count
+            print("{:<8} {:>9} objects {:>10.1f} bytes/object".format(
+                "compact" if compact else "regular", count, used / count))
+        print("saved    {:>28.1%}".format(1 - results[True] / results[False]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/python3
+"""
+ALX HolbertonBnB - Storage Layout Migration
+
+This script moves a FileStorage store to another layout: from file.json
+to shard files, from shard files to file.json, or to another number of
+partitions per class. It loads the store in whatever layout it was
+saved in, then configures the new number of shards and compacts the
+store into it, which removes the files of the old layout. Run it from
+the directory holding file.json, with the console stopped, before
+changing HBNB_FILE_SHARDS.
+
+Usage:
+    $ python3 scripts/migrate_layout.py <number of shards, or 0>
+
+Authors: Ukpono Umoren & Alexander Udeogaranya
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    """
+    Migrates the store and prints the number of objects moved.
+    """
+    if len(sys.argv) != 2 or not sys.argv[1].isdigit():
+        print("Usage: {} <number of shards, or 0>".format(sys.argv[0]))
+        sys.exit(1)
+    shards = int(sys.argv[1])
+    sys.path.insert(0, ROOT)
+    from models import storage
+
+    storage.configure(shards=shards)
+    storage.compact()
+    print("{} objects stored in {}".format(
+        storage.count(),
+        "{} shard(s) per class".format(shards) if shards else "one file"))
+
+
+if __name__ == "__main__":
+    main()
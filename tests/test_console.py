@@ -7,10 +7,17 @@ This module contains unit tests for the HBNBCommand class.
 Authors: Ukpono Umoren & Alexander Udeogaranya
 """
 
+import os
+import tempfile
 import unittest
 from unittest.mock import patch
 from io import StringIO
 from console import HBNBCommand
+from models.amenity import Amenity
+from models.place import Place
+from models.user import User
+from models import storage
+from models.engine.file_storage import FileStorage
 
 
 class TestHBNBCommand(unittest.TestCase):
@@ -20,15 +27,23 @@ class TestHBNBCommand(unittest.TestCase):
 
     def setUp(self):
         """
-        Set up test fixtures.
+        Point the storage at a temporary file and set up the console.
         """
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.old_path = FileStorage._FileStorage__file_path
+        FileStorage._FileStorage__file_path = os.path.join(
+            self.tmpdir.name, "file.json")
+        storage.reload()
         self.console = HBNBCommand()
 
     def tearDown(self):
         """
-        Clean up after each test case.
+        Restore the original file path and reload it.
         """
         self.console = None
+        FileStorage._FileStorage__file_path = self.old_path
+        storage.reload()
+        self.tmpdir.cleanup()
 
     @patch('sys.stdout', new_callable=StringIO)
     def test_help(self, mock_stdout):
@@ -379,6 +394,176 @@ class TestHBNBCommand(unittest.TestCase):
             update_output = mock_stdout.getvalue()
             self.assertEqual("** no instance found **\n", update_output)
 
+    def test_batch(self):
+        """
+        Test the begin, commit and rollback commands.
+        """
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.assertFalse(self.console.onecmd("commit"))
+            self.assertEqual("** no batch in progress **\n",
+                             mock_stdout.getvalue())
+
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.console.onecmd("begin")
+            self.console.onecmd("create State")
+            state_id = mock_stdout.getvalue().strip()
+            self.console.onecmd("rollback")
+            self.console.onecmd("show State {}".format(state_id))
+            self.assertTrue(mock_stdout.getvalue().endswith(
+                "** no instance found **\n"))
+
+    def test_place_near(self):
+        """
+        Test the Place.near command.
+        """
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.console.onecmd("create Place")
+            place_id = mock_stdout.getvalue().strip()
+            self.console.onecmd(
+                'Place.update("{}","latitude","48.8566")'.format(place_id))
+            self.console.onecmd(
+                'Place.update("{}","longitude","2.3522")'.format(place_id))
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.console.onecmd("Place.near(48.86, 2.35, 5)")
+            self.console.onecmd("Place.near(0, 0, 5)")
+            self.console.onecmd("Place.near(48.86, 2.35)")
+            lines = mock_stdout.getvalue().splitlines()
+        self.assertIn(place_id, lines[0])
+        self.assertNotIn(place_id, lines[1])
+        self.assertEqual(lines[2], "** missing arguments **")
+
+    def test_update_types(self):
+        """
+        Test that updates cast values to the attribute types and reject
+        values that cannot be cast.
+        """
+        place = Place()
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.console.onecmd(
+                "update Place {} price_by_night 100".format(place.id))
+            self.console.onecmd(
+                'Place.update("{}","latitude","48.8566")'.format(place.id))
+            self.console.onecmd(
+                'Place.update("{}", "longitude", "2.3522")'.format(place.id))
+            self.console.onecmd(
+                'Place.update("{}", {{"max_guest": "4", "number_rooms": 2,'
+                ' "nickname": 7}})'.format(place.id))
+            self.console.onecmd(
+                'Place.update("{}", {{"name": "Loft", "max_guest": "many"}})'
+                .format(place.id))
+            lines = mock_stdout.getvalue().splitlines()
+        self.assertEqual(place.price_by_night, 100)
+        self.assertEqual(place.latitude, 48.8566)
+        self.assertEqual(place.longitude, 2.3522)
+        self.assertNotIn(' "longitude', place.__dict__)
+        self.assertEqual((place.max_guest, place.number_rooms), (4, 2))
+        self.assertEqual(place.nickname, 7)
+        self.assertEqual(place.name, "")
+        self.assertEqual(lines, [
+            "** invalid value for max_guest: 'many' is not a valid int **"])
+
+    def test_update_unique(self):
+        """
+        Test that an update rejected by a unique index prints an error and
+        leaves every attribute unchanged.
+        """
+        storage.create_index(User, "email", unique=True)
+        self.addCleanup(storage.create_index, User, "email")
+        betty, other = User(), User()
+        betty.email = "betty@example.com"
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.console.onecmd(
+                'User.update("{}", {{"first_name": "Bob", "email": '
+                '"betty@example.com"}})'.format(other.id))
+            output = mock_stdout.getvalue()
+        self.assertTrue(output.startswith("** User.email must be unique"))
+        self.assertEqual((other.first_name, other.email), ("", ""))
+        self.assertEqual(storage.find(User, email="betty@example.com"),
+                         [betty])
+
+    def test_place_with_amenities(self):
+        """
+        Test the Place.with_amenities command.
+        """
+        place = Place()
+        place.amenity_ids = ["wifi", "pool"]
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.console.onecmd('Place.with_amenities("wifi", "pool")')
+            self.console.onecmd('Place.with_amenities("wifi", "sauna")')
+            self.console.onecmd('Place.with_amenities()')
+            lines = mock_stdout.getvalue().splitlines()
+        self.assertIn(place.id, lines[0])
+        self.assertEqual(lines[1], "[]")
+        self.assertEqual(lines[2], "** missing arguments **")
+
+    def test_where_explain(self):
+        """
+        Test the <class>.where method and the explain command.
+        """
+        place = Place()
+        place.price_by_night = 42
+        place.city_id = "where-city"
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.console.onecmd('Place.where("city_id == \'where-city\' '
+                                'and price_by_night < 50", '
+                                'order_by="price_by_night", limit=1)')
+            self.console.onecmd('Place.where("price_by_night <")')
+            self.console.onecmd('Place.where("city_id == 1", limit="x")')
+            self.console.onecmd('Place.where("city_id == 1", limit=True)')
+            self.console.onecmd('Place.where("city_id == 1", limit=-1)')
+            self.console.onecmd('explain Place.where("city_id == '
+                                '\'where-city\'")')
+            self.console.onecmd('explain Place.all()')
+            lines = mock_stdout.getvalue().splitlines()
+        self.assertIn(place.id, lines[0])
+        self.assertEqual(lines[1], "** invalid syntax **")
+        self.assertEqual(lines[2], "** invalid syntax **")
+        self.assertEqual(lines[3], "** invalid syntax **")
+        self.assertEqual(lines[4], "** invalid syntax **")
+        self.assertTrue(lines[5].startswith("Place: hash index on city_id"))
+        self.assertEqual(lines[-1], "** invalid syntax **")
+
+    def test_all_paging(self):
+        """
+        Test that all pages through the instances with limit, offset and
+        the printed cursor.
+        """
+        for i in range(3):
+            Amenity()
+        expected = [str(obj) for obj in storage.iter_all(Amenity)]
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.console.onecmd("all Amenity limit=2")
+            lines = mock_stdout.getvalue().splitlines()
+        self.assertEqual(lines[0], str(expected[:2]))
+        self.assertTrue(lines[1].startswith("** next page: after=Amenity."))
+        cursor = lines[1][len("** next page: after="):-len(" **")]
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.console.onecmd('Amenity.all(after="{}")'.format(cursor))
+            self.console.onecmd("all Amenity offset={}".format(
+                len(expected) - 1))
+            self.console.onecmd("all Amenity limit=0")
+            self.console.onecmd("Amenity.all(5)")
+            lines = mock_stdout.getvalue().splitlines()
+        self.assertEqual(lines[0], str(expected[2:]))
+        self.assertEqual(lines[1], str(expected[-1:]))
+        self.assertEqual(lines[2:], ["** invalid syntax **"] * 2)
+
+    def test_group_by(self):
+        """
+        Test the <class>.group_by method.
+        """
+        place = Place()
+        place.city_id = "group-by-city"
+        place.price_by_night = 70
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.console.onecmd('Place.group_by("city_id", price_by_night)')
+            self.console.onecmd("Place.group_by()")
+            self.console.onecmd("Place.group_by(city id)")
+            lines = mock_stdout.getvalue().splitlines()
+        self.assertIn("'group-by-city': {'count': 1, 'sum': 70.0", lines[0])
+        self.assertEqual(lines[1:], ["** missing arguments **",
+                                     "** invalid syntax **"])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -9,7 +9,11 @@ Authors: Ukpono Umoren & Alexander Udeogaranya
 
 import unittest
 import datetime
+import os
+import tempfile
 from models.base_model import BaseModel
+from models import storage
+from models.engine.file_storage import FileStorage
 
 
 class TestBaseModel(unittest.TestCase):
@@ -19,8 +23,12 @@ class TestBaseModel(unittest.TestCase):
 
     def setUp(self):
         """
-        Set up test fixtures.
+        Point the storage at a temporary file and set up test fixtures.
         """
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.old_path = FileStorage._FileStorage__file_path
+        FileStorage._FileStorage__file_path = os.path.join(
+            self.tmpdir.name, "file.json")
         self.base_model = BaseModel()
 
     def tearDown(self):
@@ -28,6 +36,9 @@ class TestBaseModel(unittest.TestCase):
         Clean up after each test case.
         """
         self.base_model = None
+        FileStorage._FileStorage__file_path = self.old_path
+        storage.reload()
+        self.tmpdir.cleanup()
 
     def test_instance(self):
         """
@@ -98,6 +109,28 @@ class TestBaseModel(unittest.TestCase):
         self.assertEqual(obj.updated_at, datetime.datetime(2022, 1, 1, 0, 0))
         self.assertEqual(obj.name, 'John Doe')
 
+    def test_from_record(self):
+        """
+        Test that from_record() rebuilds an instance without storing it,
+        and parses its dates only when they are read.
+        """
+        obj_dict = {
+            'id': '456',
+            'created_at': '2022-01-01T00:00:00',
+            'updated_at': '2022-01-02T10:30:00.500000',
+            'name': 'John Doe',
+            '__class__': 'BaseModel'
+        }
+        obj = BaseModel.from_record(obj_dict)
+        self.assertNotIn('BaseModel.456', storage.all())
+        self.assertEqual(obj.to_dict(), obj_dict)
+        self.assertIsInstance(obj.__dict__['created_at'], str)
+        self.assertEqual(obj.created_at, datetime.datetime(2022, 1, 1, 0, 0))
+        self.assertIsInstance(obj.__dict__['created_at'], datetime.datetime)
+        self.assertIn("datetime.datetime(2022, 1, 2, 10, 30, 0, 500000)",
+                      str(obj))
+        self.assertEqual(obj.to_dict(), obj_dict)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,361 @@
+#!/usr/bin/python3
+"""
+This module contains unit tests for the DBStorage class.
+
+Authors: Ukpono Umoren & Alexander Udeogaranya
+"""
+
+import unittest
+import os
+import tempfile
+from datetime import datetime
+from models.user import User
+from models.state import State
+from models.city import City
+from models.place import Place
+from models.engine.db_storage import DBStorage
+from models.engine.file_storage import FileStorage
+
+
+class TestDBStorage(unittest.TestCase):
+    """
+    Test suite for the DBStorage class.
+    """
+
+    def setUp(self):
+        """
+        Open a storage on a temporary database.
+        """
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.old_path = DBStorage._DBStorage__db_path
+        DBStorage._DBStorage__db_path = os.path.join(self.tmpdir.name,
+                                                     "hbnb.db")
+        self.storage = DBStorage()
+        self.storage.reload()
+
+    def tearDown(self):
+        """
+        Close the database and restore the original path.
+        """
+        self.storage.close()
+        DBStorage._DBStorage__db_path = self.old_path
+        self.tmpdir.cleanup()
+
+    def test_tables(self):
+        """
+        Test that reload() creates one table per model with typed columns.
+        """
+        connection = self.storage._DBStorage__connection
+        tables = {row[0] for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self.assertEqual(tables, set(self.storage.classes()))
+        columns = {row[1]: row[2] for row in connection.execute(
+            'PRAGMA table_info("Place")')}
+        self.assertEqual(columns["price_by_night"], "INTEGER")
+        self.assertEqual(columns["latitude"], "REAL")
+
+    def test_save_reload_get(self):
+        """
+        Test that saved objects are read back lazily after reload().
+        """
+        user = User()
+        user.email = "betty@example.com"
+        place = Place()
+        place.amenity_ids = ["a", "b"]
+        place.nickname = "Loft"
+        self.storage.new(user)
+        self.storage.new(place)
+        self.storage.save()
+
+        self.storage.reload()
+        self.assertEqual(self.storage._DBStorage__objects, {})
+        self.assertEqual(self.storage.count(), 2)
+        self.assertEqual(self.storage.count(User), 1)
+
+        loaded = self.storage.get(Place, place.id)
+        self.assertEqual(loaded.amenity_ids, ["a", "b"])
+        self.assertEqual(loaded.nickname, "Loft")
+        self.assertIs(self.storage.get(Place, place.id), loaded)
+        self.assertEqual(list(self.storage.all(User)), ["User." + user.id])
+        self.assertIsNone(self.storage.get(User, "missing"))
+
+    def test_delete_count(self):
+        """
+        Test that count() reflects unsaved creations and deletions.
+        """
+        state = State()
+        self.storage.new(state)
+        self.assertEqual(self.storage.count(State), 1)
+        self.storage.save()
+        self.storage.delete(state)
+        self.assertEqual(self.storage.count(State), 0)
+        self.assertIsNone(self.storage.get(State, state.id))
+        self.storage.save()
+        self.storage.reload()
+        self.assertEqual(self.storage.count(State), 0)
+
+    def test_related(self):
+        """
+        Test that related() combines indexed rows with unsaved changes.
+        """
+        state = State()
+        saved, moved = City(), City()
+        saved.state_id = moved.state_id = state.id
+        self.storage.new(saved)
+        self.storage.new(moved)
+        self.storage.save()
+        self.storage.reload()
+        moved = self.storage.get(City, moved.id)
+        self.storage.touch(moved, "state_id", "elsewhere")
+        moved.state_id = "elsewhere"
+        fresh = City()
+        fresh.state_id = state.id
+        self.storage.new(fresh)
+        self.assertEqual({c.id for c in self.storage.related(
+            City, "state_id", state.id)}, {saved.id, fresh.id})
+        indexes = {row[0] for row in self.storage._DBStorage__connection
+                   .execute("SELECT name FROM sqlite_master "
+                            "WHERE type = 'index'")}
+        self.assertIn("City_state_id", indexes)
+
+    def test_find_unique(self):
+        """
+        Test that find() matches columns and extra attributes, and that a
+        unique attribute rejects duplicates.
+        """
+        users = [User(), User()]
+        users[0].email = "betty@example.com"
+        users[0].nickname = "B"
+        for user in users:
+            self.storage.new(user)
+        self.storage.save()
+        self.storage.create_index(User, "email", unique=True)
+        self.assertEqual(self.storage.find(User, email="betty@example.com",
+                                           nickname="B"), [users[0]])
+        with self.assertRaises(ValueError):
+            self.storage.touch(users[1], "email", "betty@example.com")
+        self.storage.touch(users[1], "email", "holberton@example.com")
+
+    def test_range(self):
+        """
+        Test that range() and max() merge indexed rows with unsaved ones.
+        """
+        places = [Place(), Place(), Place()]
+        for place, price in zip(places, (150, 80, 120)):
+            place.price_by_night = price
+        self.storage.new(places[0])
+        self.storage.new(places[1])
+        self.storage.save()
+        self.storage.new(places[2])
+        self.assertEqual(self.storage.range(Place, "price_by_night",
+                                            high=130),
+                         [self.storage.get(Place, places[1].id), places[2]])
+        self.assertEqual(self.storage.max(Place, "price_by_night").id,
+                         places[0].id)
+
+    def test_places_unset_coordinates(self):
+        """
+        Test that saved and unsaved places without coordinates are not
+        located at (0, 0).
+        """
+        places = [Place(), Place(), Place()]
+        places[0].latitude, places[0].longitude = 0.0, 0.0
+        self.storage.new(places[0])
+        self.storage.new(places[1])
+        self.storage.save()
+        self.storage.new(places[2])
+        self.assertEqual([p.id for p in self.storage.places_within(0, 0, 100)],
+                         [places[0].id])
+
+    def test_search(self):
+        """
+        Test that search() finds saved and unsaved places by keyword.
+        """
+        places = [Place(), Place(), Place()]
+        places[0].description = "Quiet loft by the river"
+        places[1].name = "River house"
+        places[2].name = "Garden flat"
+        self.storage.new(places[0])
+        self.storage.new(places[1])
+        self.storage.save()
+        self.storage.new(places[2])
+        self.assertEqual({p.id for p in self.storage.search("river")},
+                         {places[0].id, places[1].id})
+        self.assertEqual(self.storage.search("garden"), [places[2]])
+
+    def test_places_with_amenities(self):
+        """
+        Test that places_with_amenities() matches the JSON lists.
+        """
+        places = [Place(), Place()]
+        places[0].amenity_ids = ["wifi", "pool"]
+        places[1].amenity_ids = ["wifi"]
+        for place in places:
+            self.storage.new(place)
+        self.storage.save()
+        self.assertEqual([p.id for p in self.storage.places_with_amenities(
+            ["wifi", "pool"])], [places[0].id])
+        self.assertEqual(len(self.storage.places_with_amenities(
+            ["pool", "wifi"], match="any")), 2)
+
+    def test_where(self):
+        """
+        Test that where() runs the indexed part of an expression in SQL
+        and checks the rest, including unsaved objects and defaults.
+        """
+        places = [Place(), Place(), Place()]
+        places[0].price_by_night = 80
+        places[0].city_id = "paris"
+        places[1].price_by_night = 150
+        places[1].city_id = "paris"
+        for place in places[:2]:
+            self.storage.new(place)
+        self.storage.save()
+        self.storage.new(places[2])
+        found = self.storage.where(Place, "price_by_night < 100",
+                                   order_by="price_by_night desc")
+        self.assertEqual([p.id for p in found],
+                         [places[0].id, places[2].id])
+        self.assertEqual([p.id for p in self.storage.where(
+            Place, "city_id == 'paris' and not price_by_night < 100")],
+            [places[1].id])
+        self.assertIn("Place_city_id", self.storage.explain(
+            Place, "city_id == 'paris'"))
+
+    def test_iter_all_page(self):
+        """
+        Test that iter_all() and page() merge saved rows with unsaved
+        objects in key order and skip deleted rows.
+        """
+        states = [State() for i in range(4)]
+        for state in states[:3]:
+            self.storage.new(state)
+        self.storage.save()
+        self.storage.new(states[3])
+        self.storage.delete(states[0])
+        expected = sorted("State." + s.id for s in states[1:])
+        self.assertEqual(["State." + s.id
+                          for s in self.storage.iter_all(State)], expected)
+        page, cursor = self.storage.page(limit=2)
+        self.assertEqual(cursor, expected[1])
+        page, cursor = self.storage.page(after=cursor, limit=2)
+        self.assertEqual(["State." + s.id for s in page], expected[2:])
+        self.assertIsNone(cursor)
+        with self.assertRaises(ValueError):
+            self.storage.page(limit=0)
+
+    def test_group_by(self):
+        """
+        Test that group_by() combines the SQL groups with unsaved changes.
+        """
+        places = [Place(), Place(), Place()]
+        for place, price in zip(places, (80, 120, 40)):
+            place.city_id = "paris"
+            place.price_by_night = price
+            self.storage.new(place)
+        self.storage.save()
+        self.storage.touch(places[0], "city_id", "lyon")
+        places[0].city_id = "lyon"
+        self.storage.delete(places[2])
+        self.assertEqual(self.storage.group_by(Place, "city_id",
+                                               "price_by_night"),
+                         {"paris": {"count": 1, "sum": 120.0, "min": 120.0,
+                                    "max": 120.0, "avg": 120.0},
+                          "lyon": {"count": 1, "sum": 80.0, "min": 80.0,
+                                   "max": 80.0, "avg": 80.0}})
+
+    def test_changed_since(self):
+        """
+        Test that changed_since() merges the rows updated after a time
+        with unsaved changes, in updated_at order.
+        """
+        states = [State(), State(), State()]
+        for state in states:
+            self.storage.new(state)
+        self.storage.save()
+        checkpoint = states[1].updated_at
+        self.storage.reload()
+        later = self.storage.get(State, states[2].id)
+        first = self.storage.get(State, states[0].id)
+        now = datetime.now()
+        self.storage.touch(first, "updated_at", now)
+        first.updated_at = now
+        city = City()
+        self.storage.new(city)
+        self.assertEqual(self.storage.changed_since(checkpoint),
+                         [later, first, city])
+        self.assertEqual(self.storage.changed_since(checkpoint, State,
+                                                    limit=1), [later])
+        indexes = {row[0] for row in self.storage._DBStorage__connection
+                   .execute("SELECT name FROM sqlite_master "
+                            "WHERE type = 'index'")}
+        self.assertIn("State_updated_at", indexes)
+
+    def test_changed_since_cursor(self):
+        """
+        Test that paging changed_since() with a (time, key) cursor returns
+        every saved and unsaved object, even those sharing an updated_at.
+        """
+        now = datetime.now()
+        users = [User() for i in range(4)]
+        for user in users:
+            user.updated_at = now
+            self.storage.new(user)
+        self.storage.save()
+        self.storage.reload()
+        unsaved = User()
+        unsaved.updated_at = now
+        self.storage.new(unsaved)
+        received, cursor = [], None
+        while True:
+            changed = self.storage.changed_since(cursor, User, limit=2)
+            if not changed:
+                break
+            received.extend(changed)
+            last = changed[-1]
+            cursor = (last.updated_at, "User." + last.id)
+        self.assertEqual(sorted(u.id for u in received),
+                         sorted(u.id for u in users + [unsaved]))
+
+    def test_group_by_matches_file_storage(self):
+        """
+        Test that group_by() groups unset attributes under the class
+        defaults, as FileStorage does for the same objects.
+        """
+        file_storage = FileStorage()
+        self.addCleanup(file_storage.reload)
+        self.addCleanup(setattr, FileStorage, "_FileStorage__file_path",
+                        FileStorage._FileStorage__file_path)
+        FileStorage._FileStorage__file_path = os.path.join(
+            self.tmpdir.name, "file.json")
+        file_storage.reload()
+        places = [Place(), Place(), Place()]
+        places[0].city_id = "paris"
+        places[0].price_by_night = 80
+        places[1].city_id = "paris"
+        for place in places:
+            self.storage.new(place)
+        self.storage.save()
+        file_storage.save()
+        for attrs in (("city_id",), ("city_id", "price_by_night"),
+                      ("price_by_night",)):
+            self.assertEqual(self.storage.group_by(Place, *attrs),
+                             file_storage.group_by(Place, *attrs))
+        self.assertEqual(self.storage.group_by(Place, "city_id")[""],
+                         {"count": 1})
+
+    def test_rollback(self):
+        """
+        Test that a rolled back batch writes nothing.
+        """
+        with self.storage.batch():
+            self.storage.new(State())
+        self.storage.begin()
+        self.storage.new(State())
+        self.storage.rollback()
+        self.storage.save()
+        self.assertEqual(self.storage.count(State), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,6 +7,11 @@ Authors: Ukpono Umoren & Alexander Udeogaranya
 
 import unittest
 import os
+import json
+import copy
+import pickle
+import tempfile
+from datetime import datetime
 from models.base_model import BaseModel
 from models.user import User
 from models.state import State
@@ -14,6 +19,8 @@ from models.city import City
 from models.amenity import Amenity
 from models.place import Place
 from models.review import Review
+from models.engine import ids
+from models.engine import registry
 from models.engine.file_storage import FileStorage
 
 
@@ -24,8 +31,12 @@ class TestFileStorage(unittest.TestCase):
 
     def setUp(self):
         """
-        Set up test fixtures.
+        Point the storage at a temporary file and set up test fixtures.
         """
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.old_path = FileStorage._FileStorage__file_path
+        FileStorage._FileStorage__file_path = os.path.join(
+            self.tmpdir.name, "file.json")
         self.storage = FileStorage()
         self.base_model = BaseModel()
         self.user = User()
@@ -34,6 +45,9 @@ class TestFileStorage(unittest.TestCase):
         self.amenity = Amenity()
         self.place = Place()
         self.review = Review()
+        # Start from the empty temporary store: the tests add the
+        # fixtures themselves with new()
+        self.storage.reload()
 
     def tearDown(self):
         """
@@ -47,6 +61,9 @@ class TestFileStorage(unittest.TestCase):
         self.amenity = None
         self.place = None
         self.review = None
+        FileStorage._FileStorage__file_path = self.old_path
+        FileStorage().reload()
+        self.tmpdir.cleanup()
 
     def test_all(self):
         """
@@ -211,7 +228,8 @@ class TestFileStorage(unittest.TestCase):
         Test the reload() method of FileStorage when the file does not exist.
         """
         # Delete the file before calling reload()
-        os.remove(self.storage._FileStorage__file_path)
+        if os.path.isfile(self.storage._FileStorage__file_path):
+            os.remove(self.storage._FileStorage__file_path)
         self.storage.reload()  # No exception should be raised
 
     def test_reload_empty_file(self):
@@ -224,5 +242,1113 @@ class TestFileStorage(unittest.TestCase):
         self.storage.reload()  # No exception should be raised
 
 
+class TestFileStorageJournal(unittest.TestCase):
+    """
+    Test suite for the journal written by FileStorage.save().
+    """
+
+    def setUp(self):
+        """
+        Point the storage at a temporary file and start empty.
+        """
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.old_path = FileStorage._FileStorage__file_path
+        self.path = os.path.join(self.tmpdir.name, "file.json")
+        FileStorage._FileStorage__file_path = self.path
+        self.storage = FileStorage()
+        self.storage.reload()
+
+    def tearDown(self):
+        """
+        Restore the original file path and reload it.
+        """
+        FileStorage._FileStorage__file_path = self.old_path
+        self.storage.reload()
+        self.tmpdir.cleanup()
+
+    def read_journal(self):
+        """
+        Returns the records currently in the journal.
+        """
+        with open(self.path + ".log", "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_save_appends_changes_only(self):
+        """
+        Test that save() journals only what changed since the last save.
+        """
+        user = User()
+        state = State()
+        self.storage.save()
+        self.assertEqual(len(self.read_journal()), 2)
+        self.assertFalse(os.path.isfile(self.path))
+
+        user.first_name = "Betty"
+        user.save()
+        records = self.read_journal()
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[-1]["op"], "set")
+        self.assertEqual(records[-1]["key"], "User." + user.id)
+        self.assertEqual(records[-1]["value"]["first_name"], "Betty")
+
+        self.storage.delete(state)
+        self.storage.save()
+        self.assertEqual(self.read_journal()[-1],
+                         {"op": "delete", "key": "State." + state.id})
+
+    def test_reload_replays_journal(self):
+        """
+        Test that reload() applies the journal on top of the snapshot.
+        """
+        user = User()
+        state = State()
+        self.storage.save()
+        self.storage.compact()
+        self.assertTrue(os.path.isfile(self.path))
+        self.assertFalse(os.path.isfile(self.path + ".log"))
+
+        user.first_name = "Betty"
+        user.save()
+        self.storage.delete(state)
+        self.storage.save()
+
+        self.storage.reload()
+        self.assertEqual(self.storage.get(User, user.id).first_name, "Betty")
+        self.assertIsNone(self.storage.get(State, state.id))
+
+    def test_reload_ignores_torn_record(self):
+        """
+        Test that a partially written final record is discarded.
+        """
+        user = User()
+        self.storage.save()
+        with open(self.path + ".log", "a", encoding="utf-8") as f:
+            f.write('{"op": "set", "key": "User.x", "val')
+        self.storage.reload()
+        self.assertIsNotNone(self.storage.get(User, user.id))
+        self.assertIsNone(self.storage.get(User, "x"))
+
+    def test_dirty_tracking(self):
+        """
+        Test that new(), attribute writes and delete() update the dirty set.
+        """
+        flushed = self.storage.stats()["flushed"]
+        user = User()
+        state = State()
+        stats = self.storage.stats()
+        self.assertEqual((stats["dirty"], stats["created"]), (2, 2))
+
+        self.storage.save()
+        self.assertEqual(self.storage.stats()["dirty"], 0)
+        self.assertEqual(self.storage.stats()["flushed"], flushed + 2)
+
+        user.first_name = "Betty"
+        self.storage.delete(state)
+        stats = self.storage.stats()
+        self.assertEqual(stats["dirty"], 2)
+        self.assertEqual((stats["modified"], stats["deleted"]), (1, 1))
+
+        self.storage.save()
+        records = self.read_journal()
+        self.assertEqual(len(records), 4)
+        self.assertEqual(records[2]["value"]["first_name"], "Betty")
+
+    def test_delete_unsaved_object(self):
+        """
+        Test that deleting an object created since the last save leaves
+        nothing to journal.
+        """
+        place = Place()
+        self.storage.delete(place)
+        self.assertEqual(self.storage.stats()["dirty"], 0)
+        self.storage.save()
+        self.assertFalse(os.path.isfile(self.path + ".log"))
+
+    def test_class_index(self):
+        """
+        Test that all(cls) and count(cls) follow new, delete and reload.
+        """
+        users = [User(), User()]
+        place = Place()
+        self.assertEqual(self.storage.count(User), 2)
+        self.assertEqual(set(self.storage.all(User)),
+                         {"User." + u.id for u in users})
+        self.assertEqual(self.storage.count(BaseModel), 3)
+
+        self.storage.delete(users[0])
+        self.assertEqual(self.storage.count(User), 1)
+        self.assertNotIn("User." + users[0].id, self.storage.all(User))
+
+        self.storage.save()
+        self.storage.reload()
+        self.assertEqual(list(self.storage.all(User)), ["User." + users[1].id])
+        self.assertEqual(list(self.storage.all(Place)), ["Place." + place.id])
+
+    def test_batch_defers_save(self):
+        """
+        Test that saves inside a batch are written once at commit.
+        """
+        flushes = self.storage.stats()["flushes"]
+        with self.storage.batch():
+            for i in range(5):
+                Place().save()
+            self.assertFalse(os.path.isfile(self.path + ".log"))
+        self.assertEqual(self.storage.stats()["flushes"], flushes + 1)
+        self.assertEqual(len(self.read_journal()), 5)
+
+    def test_rollback(self):
+        """
+        Test that rollback() restores objects created, modified and deleted
+        during the batch.
+        """
+        user = User()
+        user.first_name = "Betty"
+        state = State()
+        self.storage.save()
+
+        self.storage.begin()
+        user.first_name = "Holberton"
+        self.storage.delete(state)
+        place = Place()
+        self.storage.rollback()
+
+        self.assertFalse(self.storage.in_batch())
+        self.assertEqual(user.first_name, "Betty")
+        self.assertIs(self.storage.get(State, state.id), state)
+        self.assertIsNone(self.storage.get(Place, place.id))
+        self.assertEqual(self.storage.count(Place), 0)
+        self.assertEqual(self.storage.stats()["dirty"], 0)
+
+    def test_batch_rolls_back_on_error(self):
+        """
+        Test that an exception inside batch() rolls the batch back.
+        """
+        user = User()
+        self.storage.save()
+        with self.assertRaises(ValueError):
+            with self.storage.batch():
+                user.email = "betty@example.com"
+                raise ValueError
+        self.assertNotIn("email", user.__dict__)
+
+    def test_lazy_hydration(self):
+        """
+        Test that reload() defers building instances until accessed.
+        """
+        users = [User(), User()]
+        place = Place()
+        self.storage.save()
+        self.storage.reload()
+        self.assertEqual(self.storage.stats()["hydrated"], 0)
+        self.assertEqual(self.storage.count(User), 2)
+        self.assertEqual(self.storage.stats()["hydrated"], 0)
+
+        loaded = self.storage.get(Place, place.id)
+        self.assertIsInstance(loaded, Place)
+        self.assertIs(self.storage.get(Place, place.id), loaded)
+        self.assertEqual(self.storage.stats()["hydrated"], 1)
+
+        self.assertEqual(len(self.storage.all(User)), 2)
+        self.assertEqual(self.storage.stats()["hydrated"], 3)
+
+        self.storage.compact()
+        self.storage.reload()
+        self.storage.delete(self.storage.get(User, users[0].id))
+        self.assertEqual(len(self.storage.all()), 2)
+        self.assertEqual(self.storage.stats()["hydrated"], 2)
+
+    def test_iter_records(self):
+        """
+        Test that iter_records() merges the snapshot, the journal and
+        unsaved changes without hydrating anything.
+        """
+        users = [User(), User(), User()]
+        place = Place()
+        self.storage.save()
+        self.storage.compact()
+        users[0].first_name = "Betty"
+        users[0].save()
+        self.storage.delete(users[1])
+        self.storage.save()
+        users[2].first_name = "Holberton"
+        new_user = User()
+
+        self.storage.reload()
+        users[2].first_name = "Holberton"
+        self.storage.new(users[2])
+        self.storage.new(new_user)
+        records = dict(self.storage.iter_records(User))
+        self.assertEqual(set(records), {"User." + users[0].id,
+                                        "User." + users[2].id,
+                                        "User." + new_user.id})
+        self.assertEqual(records["User." + users[0].id]["first_name"],
+                         "Betty")
+        self.assertEqual(records["User." + users[2].id]["first_name"],
+                         "Holberton")
+        self.assertEqual(len(dict(self.storage.iter_records())), 4)
+        self.assertIn("Place." + place.id, dict(self.storage.iter_records()))
+        self.assertEqual(self.storage.stats()["hydrated"], 2)
+
+    def test_atomic_compact_keeps_backup(self):
+        """
+        Test that compact() replaces file.json through a rename and keeps
+        the previous version, which reload() uses if file.json is torn.
+        """
+        user = User()
+        self.storage.compact()
+        state = State()
+        self.storage.compact()
+        self.assertFalse(os.path.isfile(self.path + ".tmp"))
+        self.assertTrue(os.path.isfile(self.path + ".bak"))
+
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write('{"User.x": {"__class__": "User", "id": "x"}, "St')
+        recoveries = self.storage.stats()["recoveries"]
+        self.storage.reload()
+        self.assertEqual(self.storage.stats()["recoveries"], recoveries + 1)
+        self.assertIsNotNone(self.storage.get(User, user.id))
+        self.assertIsNone(self.storage.get(User, "x"))
+        self.assertIsNone(self.storage.get(State, state.id))
+
+    def test_compact_keeps_journal_backup(self):
+        """
+        Test that compact() keeps the journal it folded in next to the
+        previous snapshot, so that falling back on that snapshot still
+        finds the saved changes.
+        """
+        user = User()
+        self.storage.compact()
+        state = State()
+        self.storage.save()
+        self.storage.compact()
+        self.assertFalse(os.path.isfile(self.path + ".log"))
+        self.assertTrue(os.path.isfile(self.path + ".log.bak"))
+
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("")
+        self.assertIn("State." + state.id, dict(self.storage.iter_records()))
+        self.storage.reload()
+        self.assertIsNotNone(self.storage.get(User, user.id))
+        self.assertIsNotNone(self.storage.get(State, state.id))
+
+        self.storage.compact()
+        self.storage.compact()
+        self.assertFalse(os.path.isfile(self.path + ".log.bak"))
+
+    def test_reload_repairs_journal(self):
+        """
+        Test that a torn journal record is cut off, so that records
+        appended afterwards are replayed.
+        """
+        User()
+        self.storage.save()
+        with open(self.path + ".log", "a", encoding="utf-8") as f:
+            f.write('{"op": "set"')
+        self.storage.reload()
+        user = User()
+        self.storage.save()
+        self.storage.reload()
+        self.assertIsNotNone(self.storage.get(User, user.id))
+        self.assertEqual(self.storage.count(User), 2)
+
+    def test_durability_modes(self):
+        """
+        Test that fsyncs follow the configured durability policy.
+        """
+        self.assertRaises(ValueError, self.storage.configure,
+                          durability="always")
+        try:
+            fsyncs = self.storage.stats()["fsyncs"]
+            User().save()
+            self.assertEqual(self.storage.stats()["fsyncs"], fsyncs)
+
+            self.storage.configure(durability="batch")
+            User().save()
+            self.assertEqual(self.storage.stats()["fsyncs"], fsyncs)
+            with self.storage.batch():
+                User().save()
+                User().save()
+            self.assertEqual(self.storage.stats()["fsyncs"], fsyncs + 1)
+
+            self.storage.configure(durability="fsync-every-commit")
+            User().save()
+            self.assertEqual(self.storage.stats()["fsyncs"], fsyncs + 2)
+            self.assertGreater(self.storage.stats()["fsync_seconds"], 0)
+        finally:
+            self.storage.configure(durability="none")
+
+    def test_json_lines_layout(self):
+        """
+        Test that a .jsonl file path stores one record per line.
+        """
+        FileStorage._FileStorage__file_path = self.path + "l"
+        try:
+            users = [User(), User()]
+            self.storage.save()
+            self.storage.compact()
+            with open(self.path + "l", "r", encoding="utf-8") as f:
+                lines = [json.loads(line) for line in f]
+            self.assertEqual({line["id"] for line in lines},
+                             {u.id for u in users})
+            self.storage.reload()
+            self.assertEqual(self.storage.count(User), 2)
+        finally:
+            FileStorage._FileStorage__file_path = self.path
+
+    def test_foreign_key_index(self):
+        """
+        Test that relationship properties follow the foreign key indexes
+        through changes, deletions and reloads.
+        """
+        state = State()
+        cities = [City(), City()]
+        for city in cities:
+            city.state_id = state.id
+        place = Place()
+        place.city_id = cities[0].id
+        review = Review()
+        review.place_id = place.id
+        self.assertEqual({c.id for c in state.cities},
+                         {c.id for c in cities})
+        self.assertEqual([p.id for p in cities[0].places], [place.id])
+        self.assertEqual([r.id for r in place.reviews], [review.id])
+
+        cities[1].state_id = "elsewhere"
+        self.assertEqual([c.id for c in state.cities], [cities[0].id])
+        self.storage.delete(review)
+        self.assertEqual(place.reviews, [])
+
+        self.storage.save()
+        self.storage.reload()
+        self.assertEqual(self.storage.stats()["hydrated"], 0)
+        state = self.storage.get(State, state.id)
+        self.assertEqual([c.id for c in state.cities], [cities[0].id])
+        self.assertEqual(self.storage.stats()["hydrated"], 2)
+
+    def test_find(self):
+        """
+        Test that find() matches indexed and unindexed attributes, and
+        that a hash index follows assignments and reloads.
+        """
+        amenities = [Amenity(), Amenity(), Amenity()]
+        amenities[0].name = amenities[1].name = "Wifi"
+        amenities[2].name = "Pool"
+        amenities[1].floor = 2
+        index = self.storage.create_index(Amenity, "name")
+        self.assertIs(self.storage.create_index(Amenity, "name"), index)
+        self.assertEqual(len(index.get("Wifi")), 2)
+        self.assertEqual({a.id for a in self.storage.find(
+            Amenity, name="Wifi")}, {amenities[0].id, amenities[1].id})
+        self.assertEqual([a.id for a in self.storage.find(
+            Amenity, name="Wifi", floor=2)], [amenities[1].id])
+
+        amenities[0].name = "Pool"
+        self.assertEqual(len(index.get("Wifi")), 1)
+        self.storage.save()
+        self.storage.reload()
+        self.assertEqual(len(index.get("Pool")), 2)
+        self.assertEqual(len(self.storage.find(Amenity, name="Pool")), 2)
+        self.assertEqual(self.storage.stats()["hydrated"], 2)
+
+    def test_unique_index(self):
+        """
+        Test that a unique index rejects duplicates without changing the
+        object, and exempts the class default.
+        """
+        users = [User(), User(), User()]
+        users[0].email = "betty@example.com"
+        self.storage.create_index(User, "email", unique=True)
+        with self.assertRaises(ValueError):
+            users[1].email = "betty@example.com"
+        self.assertEqual(users[1].email, "")
+        users[1].email = "holberton@example.com"
+        users[0].email = "betty@example.com"
+
+        copy = User(**users[0].to_dict())
+        copy.id = "other"
+        with self.assertRaises(ValueError):
+            self.storage.new(copy)
+        self.assertIsNone(self.storage.get(User, "other"))
+        self.assertEqual(self.storage.find(User, email="holberton@example"
+                                           ".com"), [users[1]])
+
+        self.storage.create_index(User, "email")
+        users[2].email = "betty@example.com"
+        with self.assertRaises(ValueError):
+            self.storage.create_index(User, "email", unique=True)
+
+    def test_range_index(self):
+        """
+        Test range(), min(), max() and ordered() on the sorted indexes of
+        Place, across assignments, deletions and reloads.
+        """
+        prices = [150, 80, 120, 95]
+        places = [Place() for price in prices]
+        for place, price in zip(places, prices):
+            place.price_by_night = price
+        places[2].number_rooms = 3
+        places[3].number_rooms = "4"
+        self.assertEqual(self.storage.range(Place, "price_by_night",
+                                            high=120),
+                         [places[1], places[3], places[2]])
+        self.assertEqual([p.id for p in self.storage.range(
+            Place, "number_rooms", low=3)], [places[2].id, places[3].id])
+        self.assertIs(self.storage.min(Place, "price_by_night"), places[1])
+        self.assertIs(self.storage.max(Place, "price_by_night"), places[0])
+
+        places[1].price_by_night = 200
+        self.storage.delete(places[0])
+        self.assertEqual(list(self.storage.ordered(
+            Place, "price_by_night", reverse=True)),
+            [places[1], places[2], places[3]])
+
+        self.storage.save()
+        self.storage.reload()
+        self.assertEqual([p.id for p in self.storage.range(
+            Place, "price_by_night", 90, 130)], [places[3].id, places[2].id])
+        self.assertEqual(self.storage.stats()["hydrated"], 2)
+        self.assertIsNone(self.storage.min(State, "name"))
+
+    def test_range_index_bulk_load(self):
+        """
+        Test that the sorted indexes filled by a reload, sorted at once,
+        keep the order of those filled one key at a time, and that later
+        changes are put in place.
+        """
+        places = [Place() for i in range(100)]
+        for i, place in enumerate(places):
+            place.price_by_night = (i * 37) % 50
+        expected = [p.id for p in self.storage.ordered(Place,
+                                                       "price_by_night")]
+        self.storage.save()
+        self.storage.reload()
+        self.assertEqual([p.id for p in self.storage.ordered(
+            Place, "price_by_night")], expected)
+        cheapest = self.storage.get(Place, expected[-1])
+        cheapest.price_by_night = -1
+        self.assertIs(self.storage.min(Place, "price_by_night"), cheapest)
+        self.assertEqual(self.storage.count(Place), 100)
+
+    def test_geo_index(self):
+        """
+        Test places_within() and places_in_bbox(), including moves and a
+        box crossing the antimeridian.
+        """
+        coordinates = [(48.8566, 2.3522), (48.8049, 2.1204),
+                       (51.5072, -0.1276), (-17.7134, 178.065),
+                       (-13.8333, -171.75)]
+        places = [Place() for point in coordinates]
+        for place, (lat, lon) in zip(places, coordinates):
+            place.latitude, place.longitude = lat, lon
+        self.assertEqual(self.storage.places_within(48.86, 2.35, 25),
+                         [places[0], places[1]])
+        self.assertEqual(len(self.storage.places_within(48.86, 2.35, 400)),
+                         3)
+        self.assertEqual(set(self.storage.places_in_bbox(-20, 170, -10,
+                                                         -170)),
+                         {places[3], places[4]})
+
+        places[1].latitude = 51.5
+        self.assertEqual(self.storage.places_within(48.86, 2.35, 25),
+                         [places[0]])
+        self.storage.save()
+        self.storage.reload()
+        self.assertEqual([p.id for p in self.storage.places_within(
+            51.5, -0.12, 20)], [places[2].id])
+        self.assertEqual(self.storage.stats()["hydrated"], 1)
+
+    def test_geo_index_unset(self):
+        """
+        Test that places without coordinates are not located at (0, 0),
+        before and after a reload.
+        """
+        unset, origin, partial = Place(), Place(), Place()
+        origin.latitude, origin.longitude = 0.0, 0.0
+        partial.latitude = 0.5
+        self.assertEqual(self.storage.places_within(0, 0, 100), [origin])
+        self.assertEqual(self.storage.places_in_bbox(-1, -1, 1, 1), [origin])
+        self.storage.save()
+        self.storage.reload()
+        self.assertEqual([p.id for p in self.storage.places_within(
+            0, 0, 100)], [origin.id])
+        unset = self.storage.get(Place, unset.id)
+        unset.longitude = 0.2
+        unset.latitude = 0.1
+        self.assertEqual({p.id for p in self.storage.places_within(
+            0, 0, 100)}, {origin.id, unset.id})
+
+    def test_text_search(self):
+        """
+        Test that search() ranks places and reviews by BM25, follows
+        changes, and restores the saved index on reload.
+        """
+        places = [Place(), Place(), Place()]
+        places[0].name = "Quiet loft"
+        places[0].description = "A loft by the river, quiet at night"
+        places[1].description = "Family house with a garden"
+        places[2].name = "Riverside studio"
+        review = Review()
+        review.text = "Lovely river views from the loft"
+        self.assertEqual(self.storage.search("quiet loft")[0], places[0])
+        self.assertEqual(set(self.storage.search("loft")),
+                         {places[0], review})
+        self.assertEqual(self.storage.search("loft", cls=Review), [review])
+        self.assertEqual(len(self.storage.search("river loft", limit=1)), 1)
+
+        places[1].description = "Family house by the river"
+        self.storage.delete(review)
+        self.assertEqual(set(self.storage.search("river")),
+                         {places[0], places[1]})
+        self.storage.save()
+        self.storage.compact()
+        restored = self.storage.stats()["indexes_restored"]
+        self.storage.reload()
+        self.assertEqual(self.storage.stats()["indexes_restored"],
+                         restored + 2)
+        self.assertEqual(self.storage.stats()["hydrated"], 0)
+        self.assertEqual(self.storage.search("garden"), [])
+        self.assertEqual(self.storage.search("family")[0].id, places[1].id)
+
+        place = self.storage.get(Place, places[0].id)
+        place.description = "Garden flat"
+        self.storage.save()
+        self.storage.reload()
+        self.assertEqual([p.id for p in self.storage.search("garden")],
+                         [places[0].id])
+
+    def test_amenity_bitmap(self):
+        """
+        Test that places_with_amenities() ANDs and ORs amenities and
+        follows assignments, deletions and reloads.
+        """
+        wifi, pool, parking = Amenity(), Amenity(), Amenity()
+        places = [Place(), Place(), Place()]
+        places[0].amenity_ids = [wifi.id, pool.id, parking.id]
+        places[1].amenity_ids = [wifi.id, pool.id]
+        places[2].amenity_ids = [parking.id]
+        self.assertEqual(self.storage.places_with_amenities(
+            [wifi, pool, parking]), [places[0]])
+        self.assertEqual(set(self.storage.places_with_amenities(
+            [wifi.id, pool.id])), {places[0], places[1]})
+        self.assertEqual(len(self.storage.places_with_amenities(
+            [pool.id, parking.id], match="any")), 3)
+        with self.assertRaises(ValueError):
+            self.storage.places_with_amenities([wifi], match="most")
+
+        places[1].amenity_ids = [wifi.id, pool.id, parking.id]
+        self.storage.delete(places[0])
+        self.assertEqual(self.storage.places_with_amenities(
+            [wifi, pool, parking]), [places[1]])
+        self.storage.save()
+        self.storage.reload()
+        self.assertEqual([p.id for p in self.storage.places_with_amenities(
+            [parking])], [places[1].id, places[2].id])
+        self.assertEqual(self.storage.stats()["hydrated"], 2)
+
+    def test_where(self):
+        """
+        Test that where() filters, orders and limits through the planner,
+        and that explain() reports the index used.
+        """
+        places = [Place() for i in range(6)]
+        for i, place in enumerate(places):
+            place.price_by_night = 50 * i
+            place.city_id = "paris" if i % 2 else "lyon"
+        places[5].price_by_night = "75"
+        self.assertEqual(self.storage.where(
+            Place, "price_by_night < 100 and city_id == 'paris'",
+            order_by="price_by_night"), [places[1], places[5]])
+        self.assertEqual(self.storage.where(
+            Place, "city_id == 'lyon' or price_by_night >= 200",
+            order_by="price_by_night desc", limit=2), [places[4], places[2]])
+        self.assertEqual(len(self.storage.where(Place, "")), 6)
+        self.assertIn("range index on price_by_night",
+                      self.storage.explain(Place, "price_by_night < 60 and "
+                                           "city_id == 'lyon'"))
+        with self.assertRaises(ValueError):
+            self.storage.where(Place, "price_by_night <")
+
+        self.storage.save()
+        self.storage.reload()
+        self.assertEqual([p.id for p in self.storage.where(
+            Place, "city_id == 'lyon'", order_by="price_by_night desc",
+            limit=1)], [places[4].id])
+        self.assertEqual(self.storage.stats()["hydrated"], 1)
+
+    def test_iter_all_page(self):
+        """
+        Test that iter_all() and page() walk the objects in key order,
+        hydrating only what they yield, and that a cursor survives
+        changes made between pages.
+        """
+        users = [User() for i in range(5)]
+        places = [Place() for i in range(3)]
+        keys = sorted("{}.{}".format(type(o).__name__, o.id)
+                      for o in users + places)
+        self.storage.save()
+        self.storage.reload()
+        self.assertEqual(["{}.{}".format(type(o).__name__, o.id)
+                          for o in self.storage.iter_all()], keys)
+        self.storage.reload()
+        first = next(self.storage.iter_all(User, offset=1))
+        self.assertEqual("User." + first.id, keys[4])
+        self.assertEqual(self.storage.stats()["hydrated"], 1)
+
+        page, cursor = self.storage.page(User, limit=3)
+        self.assertEqual(["User." + u.id for u in page], keys[3:6])
+        self.assertEqual(cursor, keys[5])
+        self.storage.delete(self.storage.get(User, page[0].id))
+        page, cursor = self.storage.page(User, after=cursor, limit=3)
+        self.assertEqual(["User." + u.id for u in page], keys[6:])
+        self.assertIsNone(cursor)
+        self.assertEqual(len(list(self.storage.iter_all(limit=2))), 2)
+        with self.assertRaises(ValueError):
+            list(self.storage.iter_all(offset=-1))
+        with self.assertRaises(ValueError):
+            self.storage.page(User, limit=0)
+
+    def test_group_by(self):
+        """
+        Test that group_by() follows creations, changes and deletions,
+        recomputes the minimum after it leaves, and survives a reload.
+        """
+        places = [Place() for i in range(4)]
+        for place, city, price in zip(places, "aabb", (80, 120, 50, "x")):
+            place.city_id = city
+            place.price_by_night = price
+        groups = self.storage.group_by(Place, "city_id", "price_by_night")
+        self.assertEqual(groups["a"], {"count": 2, "sum": 200.0, "min": 80.0,
+                                       "max": 120.0, "avg": 100.0})
+        self.assertEqual(groups["b"]["count"], 2)
+        self.assertEqual(groups["b"]["avg"], 50.0)
+
+        places[0].price_by_night = 100
+        places[1].city_id = "b"
+        self.storage.delete(places[3])
+        groups = self.storage.group_by(Place, "city_id", "price_by_night")
+        self.assertEqual(groups["a"]["min"], 100.0)
+        self.assertEqual(groups["b"], {"count": 2, "sum": 170.0, "min": 50.0,
+                                       "max": 120.0, "avg": 85.0})
+        places[2].city_id = "a"
+        self.assertEqual(self.storage.group_by(
+            Place, "city_id", "price_by_night")["b"]["min"], 120.0)
+        self.assertEqual(self.storage.group_by(Place, "name"),
+                         {"": {"count": 3}})
+
+        self.storage.save()
+        self.storage.reload()
+        self.assertEqual(self.storage.group_by(Place, "city_id"),
+                         {"a": {"count": 2}, "b": {"count": 1}})
+        self.assertEqual(self.storage.stats()["hydrated"], 0)
+
+    def test_ad_hoc_queries(self):
+        """
+        Test that grouping or sorting by an attribute without an index
+        answers from a scan and leaves no index behind.
+        """
+        registered = self.storage._FileStorage__indexes
+        before = {name: len(pairs) for name, pairs in registered.items()}
+        users = [User() for i in range(3)]
+        for user, name, age in zip(users, "aab", (30, 20, 40)):
+            user.first_name = name
+            user.age = age
+        self.assertEqual(self.storage.group_by(User, "first_name", "age")
+                         ["a"], {"count": 2, "sum": 50.0, "min": 20.0,
+                                 "max": 30.0, "avg": 25.0})
+        self.assertEqual(self.storage.range(User, "age", low=25),
+                         [users[0], users[2]])
+        self.assertIs(self.storage.min(User, "age"), users[1])
+        self.assertIs(self.storage.max(User, "age"), users[2])
+        self.assertEqual(list(self.storage.ordered(User, "age")),
+                         [users[1], users[0], users[2]])
+        self.assertEqual({name: len(pairs) for name, pairs
+                          in registered.items()}, before)
+
+    def test_compact(self):
+        """
+        Test that compact mode loads slotted instances that print,
+        serialize, index and roll back like regular ones.
+        """
+        place = Place()
+        place.name = "Loft"
+        place.price_by_night = 90
+        place.nickname = "L"
+        self.storage.save()
+        expected = place.to_dict()
+        self.storage.configure(compact=True)
+        try:
+            self.storage.reload()
+            loaded = self.storage.get(Place, place.id)
+        finally:
+            self.storage.configure(compact=False)
+        self.assertIsInstance(loaded, Place)
+        self.assertIsNot(type(loaded), Place)
+        self.assertIn("price_by_night", type(loaded).__slots__)
+        self.assertEqual(loaded.to_dict(), expected)
+        self.assertEqual(loaded.created_at, place.created_at)
+        self.assertEqual(str(loaded),
+                         str(Place(**expected)))
+        self.assertEqual(loaded.nickname, "L")
+        self.assertEqual(loaded.description, "")
+        self.assertEqual(loaded._extra, {"nickname": "L"})
+
+        with self.storage.batch():
+            loaded.price_by_night = 70
+            loaded.rating = 5
+        self.assertEqual(self.storage.range(Place, "price_by_night",
+                                            high=80), [loaded])
+        self.storage.begin()
+        loaded.price_by_night = 200
+        del loaded.rating
+        self.storage.rollback()
+        self.assertEqual((loaded.price_by_night, loaded.rating), (70, 5))
+        self.assertEqual(self.storage.max(Place, "price_by_night"), loaded)
+
+    def test_compact_copy(self):
+        """
+        Test that copies and pickles of compact instances keep only the
+        attributes set, in a compact class of the same model.
+        """
+        place = Place()
+        place.name = "Loft"
+        place.nickname = "L"
+        self.storage.save()
+        self.storage.configure(compact=True)
+        try:
+            self.storage.reload()
+            loaded = self.storage.get(Place, place.id)
+        finally:
+            self.storage.configure(compact=False)
+        for clone in (copy.copy(loaded), copy.deepcopy(loaded),
+                      pickle.loads(pickle.dumps(loaded))):
+            self.assertIs(type(clone), type(loaded))
+            self.assertEqual(clone.to_dict(), loaded.to_dict())
+            self.assertEqual(dict(clone.__dict__), dict(loaded.__dict__))
+            self.assertNotIn("description", clone.__dict__)
+            self.assertEqual(clone.description, "")
+            self.assertEqual(clone._extra, {"nickname": "L"})
+            self.assertIsNot(clone._extra, loaded._extra)
+
+    def test_encode_cache(self):
+        """
+        Test that unchanged objects are written from their cached JSON
+        text, and that attribute writes and in-place list changes are
+        seen.
+        """
+        users = [User() for i in range(3)]
+        place = Place()
+        place.amenity_ids = ["wifi"]
+        self.storage.save()
+        before = self.storage.stats()
+        self.storage.compact()
+        users[0].first_name = "Betty"
+        place.amenity_ids.append("pool")
+        self.storage.compact()
+        stats = self.storage.stats()
+        self.assertEqual(stats["encode_hits"] - before["encode_hits"], 6)
+        self.assertEqual(stats["encode_misses"] - before["encode_misses"],
+                         2)
+        self.assertGreater(stats["encode_hit_rate"], 0)
+
+        self.storage.reload()
+        self.assertEqual(self.storage.get(User, users[0].id).first_name,
+                         "Betty")
+        self.assertEqual(self.storage.get(Place, place.id).amenity_ids,
+                         ["wifi", "pool"])
+
+    def test_encode_cache_records(self):
+        """
+        Test that the records never hydrated are cached and counted like
+        objects, and that their text follows changes once hydrated.
+        """
+        places = [Place() for i in range(3)]
+        places[0].amenity_ids = ["wifi"]
+        self.storage.save()
+        self.storage.reload()
+        before = self.storage.stats()
+        self.storage.compact()
+        middle = self.storage.stats()
+        self.assertEqual(middle["encode_misses"] - before["encode_misses"], 3)
+        loaded = self.storage.get(Place, places[0].id)
+        loaded.amenity_ids.append("pool")
+        self.storage.compact()
+        stats = self.storage.stats()
+        self.assertEqual(stats["encode_hits"] - middle["encode_hits"], 2)
+        self.assertEqual(stats["encode_misses"] - middle["encode_misses"], 1)
+        self.assertEqual(stats["hydrated"], 1)
+
+        self.storage.reload()
+        self.assertEqual(self.storage.get(Place, places[0].id).amenity_ids,
+                         ["wifi", "pool"])
+
+    def test_registry(self):
+        """
+        Test that a new model registers itself with its compiled schema
+        and is loaded back by reload(), and that its indexes are dropped
+        once it is unregistered.
+        """
+        class Villa(Place):
+            """A model defined after the others."""
+            pool = False
+            floors = 1
+
+        self.addCleanup(registry.unregister, Villa)
+        self.assertIs(self.storage.classes()["Villa"], Villa)
+        self.assertEqual(self.storage.attributes("Villa")["floors"], int)
+        self.assertEqual(self.storage.attributes("Villa")["latitude"], float)
+        self.assertNotIn("pool", self.storage.attributes("Villa"))
+        self.assertEqual(registry.coerce("Villa", "floors", "2"), 2)
+        self.assertEqual(registry.coerce("Villa", "amenity_ids", '["a"]'),
+                         ["a"])
+        with self.assertRaises(ValueError):
+            registry.coerce("Villa", "floors", "two")
+
+        villa = Villa()
+        villa.floors = 3
+        self.storage.save()
+        self.storage.reload()
+        loaded = self.storage.get(Villa, villa.id)
+        self.assertIs(type(loaded), Villa)
+        self.assertEqual(loaded.floors, 3)
+        self.assertIn(loaded, self.storage.all(Place).values())
+
+        registry.unregister(Villa)
+        self.storage.reload()
+        self.assertNotIn("Villa", self.storage._FileStorage__indexes)
+
+    def test_changed_since(self):
+        """
+        Test that changed_since() returns the objects updated after a
+        time, in updated_at order, and that uuid7 ids sort by creation.
+        """
+        ids.configure("uuid7")
+        self.addCleanup(ids.configure, "uuid4")
+        states = [State() for i in range(3)]
+        self.assertEqual(sorted(s.id for s in states), [s.id for s in states])
+        self.assertEqual(ids.created(states[0].id).replace(microsecond=0),
+                         states[0].created_at.replace(microsecond=0))
+        self.storage.save()
+        checkpoint = states[2].updated_at
+        states[0].save()
+        city = City()
+        city.save()
+        self.assertEqual(self.storage.changed_since(checkpoint),
+                         [states[0], city])
+        self.assertEqual(self.storage.changed_since(checkpoint, State),
+                         [states[0]])
+
+        self.storage.reload()
+        changed = self.storage.changed_since(checkpoint.isoformat(), limit=1)
+        self.assertEqual([obj.id for obj in changed], [states[0].id])
+        self.assertEqual(len(self.storage.changed_since(None)), 4)
+        with self.assertRaises(ValueError):
+            self.storage.changed_since(42)
+
+    def test_changed_since_cursor(self):
+        """
+        Test that paging changed_since() with a (time, key) cursor returns
+        every object, even those sharing an updated_at.
+        """
+        now = datetime.now()
+        users = [User() for i in range(3)]
+        for user in users:
+            user.updated_at = now
+        received, cursor = [], None
+        while True:
+            changed = self.storage.changed_since(cursor, User, limit=2)
+            if not changed:
+                break
+            received.extend(changed)
+            last = changed[-1]
+            cursor = (last.updated_at, "User." + last.id)
+        self.assertEqual(sorted(u.id for u in received),
+                         sorted(u.id for u in users))
+        self.assertEqual(self.storage.changed_since(now, User), [])
+
+    def test_change_feed(self):
+        """
+        Test that saves publish numbered events to subscribers and to the
+        feed file, from which a subscriber resumes, and that rolled back
+        changes publish nothing.
+        """
+        received = []
+        self.storage.configure(feed=True)
+        self.addCleanup(self.storage.configure, feed=False)
+        self.storage.subscribe(received.append)
+        self.addCleanup(self.storage.unsubscribe, received.append)
+        start = self.storage.seq()
+
+        user = User()
+        self.storage.save()
+        with self.storage.batch():
+            user.first_name = "Betty"
+        self.storage.begin()
+        State()
+        self.storage.rollback()
+        self.storage.delete(user)
+        self.storage.save()
+        key = "User." + user.id
+        self.assertEqual([(e["seq"] - start, e["op"], e["key"])
+                          for e in received],
+                         [(1, "create", key), (2, "update", key),
+                          (3, "delete", key)])
+        self.assertEqual(received[1]["value"]["first_name"], "Betty")
+        self.assertNotIn("value", received[2])
+
+        replayed = []
+        self.storage.subscribe(replayed.append, after=start + 1)
+        self.addCleanup(self.storage.unsubscribe, replayed.append)
+        self.assertEqual(replayed, received[1:])
+
+        with open(self.path + ".feed", "a", encoding="utf-8") as f:
+            f.write('{"seq": 99, "op": "cre')
+        FileStorage._FileStorage__seq = 0
+        stats = self.storage.stats()
+        self.storage.reload()
+        self.assertEqual(self.storage.seq(), start + 3)
+        self.assertEqual(self.storage.stats()["feed_recoveries"],
+                         stats["feed_recoveries"] + 1)
+        self.assertEqual(self.storage.stats()["recoveries"],
+                         stats["recoveries"])
+        self.assertEqual(list(self.storage.events(start + 2)), received[2:])
+
+        def failing(event):
+            raise RuntimeError("subscriber down")
+
+        self.storage.subscribe(failing)
+        self.addCleanup(self.storage.unsubscribe, failing)
+        errors = self.storage.stats()["subscriber_errors"]
+        State().save()
+        self.assertEqual(received[-1]["seq"], start + 4)
+        self.assertEqual(self.storage.stats()["subscriber_errors"],
+                         errors + 1)
+
+    def test_change_feed_rotation(self):
+        """
+        Test that compact() rotates the change feed, keeping the events
+        since the one but last compaction, that resuming before them
+        raises, and that the sequence numbers carry on after a reload.
+        """
+        self.storage.configure(feed=True)
+        self.addCleanup(self.storage.configure, feed=False)
+        start = self.storage.seq()
+        User().save()
+        self.storage.compact()
+        self.assertFalse(os.path.isfile(self.path + ".feed"))
+        State().save()
+        self.storage.compact()
+        City().save()
+        self.assertEqual([e["seq"] - start
+                          for e in self.storage.events(start + 1)], [2, 3])
+
+        self.storage.compact()
+        FileStorage._FileStorage__seq = 0
+        self.storage.reload()
+        self.assertEqual(self.storage.seq(), start + 3)
+        with self.assertRaises(ValueError):
+            list(self.storage.events(start + 1))
+        received = []
+        with self.assertRaises(ValueError):
+            self.storage.subscribe(received.append, after=start)
+        self.assertEqual(received, [])
+        self.assertEqual(len(list(self.storage.events(start + 2))), 1)
+
+
+class TestFileStorageShards(unittest.TestCase):
+    """
+    Test suite for the sharded layout of FileStorage.
+    """
+
+    def setUp(self):
+        """
+        Point the storage at a temporary directory, with two partitions
+        per class.
+        """
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.old_path = FileStorage._FileStorage__file_path
+        self.path = os.path.join(self.tmpdir.name, "file.json")
+        FileStorage._FileStorage__file_path = self.path
+        self.storage = FileStorage()
+        self.storage.configure(shards=2)
+        self.storage.reload()
+
+    def tearDown(self):
+        """
+        Restore the single-file layout and the original file path.
+        """
+        self.storage.configure(shards=0)
+        FileStorage._FileStorage__parallel_threshold = 1 << 20
+        FileStorage._FileStorage__file_path = self.old_path
+        self.storage.reload()
+        self.tmpdir.cleanup()
+
+    def test_save_rewrites_dirty_shards(self):
+        """
+        Test that one file is written per class and partition, and that a
+        save only rewrites the partitions holding dirty keys.
+        """
+        users = [User() for i in range(20)]
+        Place()
+        self.storage.save()
+        files = sorted(name for name in os.listdir(self.tmpdir.name)
+                       if name.endswith(".json"))
+        self.assertEqual(files[-2:], ["file.User.0.json", "file.User.1.json"])
+        self.assertIn(files[0], ["file.Place.0.json", "file.Place.1.json"])
+        self.assertEqual(len(files), 3)
+        self.assertFalse(os.path.isfile(self.path + ".log"))
+
+        written = self.storage.stats()["shards_written"]
+        users[0].first_name = "Betty"
+        users[0].save()
+        self.assertEqual(self.storage.stats()["shards_written"], written + 1)
+
+    def test_layout_change(self):
+        """
+        Test that reload() loads a store saved in another layout and
+        moves it to the configured one, both ways.
+        """
+        self.storage.configure(shards=0)
+        users = [User(), User()]
+        self.storage.compact()
+        users.append(User())
+        self.storage.save()
+        self.storage.configure(shards=2)
+        self.storage.reload()
+        self.assertEqual(self.storage.count(User), 3)
+        self.assertFalse(os.path.isfile(self.path))
+        user = self.storage.get(User, users[0].id)
+        user.first_name = "Betty"
+        user.save()
+
+        self.storage.configure(shards=0)
+        self.storage.reload()
+        self.assertEqual(self.storage.count(User), 3)
+        self.assertEqual(self.storage.get(User, users[0].id).first_name,
+                         "Betty")
+        self.assertEqual(sorted(name for name in os.listdir(
+            self.tmpdir.name) if name.endswith(".json")), ["file.json"])
+
+    def test_parallel_reload(self):
+        """
+        Test that reload() decodes every shard and reports its timing.
+        """
+        users = [User() for i in range(20)]
+        states = [State() for i in range(5)]
+        self.storage.save()
+        self.storage.delete(states[0])
+        self.storage.save()
+
+        FileStorage._FileStorage__parallel_threshold = 0
+        self.storage.reload()
+        self.assertEqual(self.storage.count(User), 20)
+        self.assertEqual(self.storage.count(State), 4)
+        self.assertEqual(self.storage.get(User, users[3].id).id, users[3].id)
+        timings = self.storage.stats()["load_timings"]
+        self.assertEqual(set(timings), {
+            os.path.join(self.tmpdir.name, name)
+            for name in os.listdir(self.tmpdir.name)
+            if name.endswith(".json")})
+
+
 if __name__ == "__main__":
     unittest.main()
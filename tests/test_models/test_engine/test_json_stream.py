@@ -0,0 +1,66 @@
+#!/usr/bin/python3
+"""
+This module contains unit tests for the json_stream module.
+
+Authors: Ukpono Umoren & Alexander Udeogaranya
+"""
+
+import unittest
+import io
+import json
+from models.engine.json_stream import iter_items, write_items
+
+
+class TestJsonStream(unittest.TestCase):
+    """
+    Test suite for the json_stream module.
+    """
+
+    def setUp(self):
+        """
+        Set up a JSON object with nested, escaped and numeric members.
+        """
+        self.data = {
+            "User.{}".format(i): {"id": str(i), "text": "} ,\\\" " * i,
+                                  "nested": [{"a": 1.5}, None, True]}
+            for i in range(50)
+        }
+        self.data["total"] = 1234567890
+
+    def test_iter_items(self):
+        """
+        Test that members are decoded whatever the chunk size.
+        """
+        text = json.dumps(self.data)
+        for chunk_size in (1, 7, 64, 65536):
+            items = list(iter_items(io.StringIO(text), chunk_size))
+            self.assertEqual(dict(items), self.data)
+            self.assertEqual([k for k, v in items], list(self.data))
+
+    def test_empty(self):
+        """
+        Test that an empty file or object yields nothing.
+        """
+        self.assertEqual(list(iter_items(io.StringIO(""))), [])
+        self.assertEqual(list(iter_items(io.StringIO(" {} \n"))), [])
+
+    def test_invalid(self):
+        """
+        Test that truncated or non-object content raises ValueError.
+        """
+        with self.assertRaises(ValueError):
+            list(iter_items(io.StringIO('{"a": {"b": 1}, "c": ')))
+        with self.assertRaises(ValueError):
+            list(iter_items(io.StringIO("[1, 2]")))
+
+    def test_write_items(self):
+        """
+        Test that write_items() produces the same JSON object.
+        """
+        f = io.StringIO()
+        write_items(f, self.data.items())
+        self.assertEqual(json.loads(f.getvalue()), self.data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+#!/usr/bin/python3
+"""
+This module contains unit tests for the query module.
+
+Authors: Ukpono Umoren & Alexander Udeogaranya
+"""
+
+import unittest
+from models.engine.indexes import HashIndex, SortedIndex
+from models.engine.query import parse, plan, sort, And, Or, Not
+
+
+class TestQuery(unittest.TestCase):
+    """
+    Test suite for the query module.
+    """
+
+    def setUp(self):
+        """
+        Set up indexes over 100 places spread over 10 cities.
+        """
+        self.records = {
+            "Place.{}".format(i): {"city_id": "c{}".format(i % 10),
+                                   "price_by_night": i * 3,
+                                   "name": "Place {}".format(i)}
+            for i in range(100)
+        }
+        self.cities = HashIndex("city_id")
+        self.prices = SortedIndex("price_by_night")
+        for key, record in self.records.items():
+            self.cities.add(key, (record["city_id"],))
+            self.prices.add(key, (record["price_by_night"],))
+        self.indexes = [self.cities, self.prices]
+
+    def value(self, key, attr):
+        """
+        Returns the value of an attribute of a record.
+        """
+        return self.records[key].get(attr)
+
+    def run_plan(self, text, order_by=None, limit=None):
+        """
+        Returns the plan of an expression and the keys it matches.
+        """
+        node = parse(text)
+        chosen = plan(node, self.indexes, len(self.records), order_by,
+                      limit)
+        keys = [key for key in chosen.keys(self.records, self.value)
+                if node.matches(lambda attr, key=key: self.value(key, attr))]
+        return chosen, keys
+
+    def test_parse(self):
+        """
+        Test the precedence of not, and and or, and literal parsing.
+        """
+        node = parse("a == 1 or not b < 2.5 and (c != 'x y' or d >= -3)")
+        self.assertIsInstance(node, Or)
+        self.assertIsInstance(node.terms[1], And)
+        self.assertIsInstance(node.terms[1].terms[0], Not)
+        self.assertEqual(node.terms[0].value, 1)
+        self.assertEqual(node.terms[1].terms[0].term.value, 2.5)
+        self.assertEqual(node.terms[1].terms[1].terms[0].value, "x y")
+        self.assertEqual(str(parse('name == "it\\"s"')), "name == 'it\"s'")
+        for text in ("", "a ==", "a = 1", "a == 1 and", "(a == 1", "a < b",
+                     "a == 1 b == 2", "a == 1 $"):
+            with self.assertRaises(ValueError):
+                parse(text)
+
+    def test_matches(self):
+        """
+        Test that numeric literals compare numerically.
+        """
+        self.assertTrue(parse("price < 100").matches(lambda a: "99"))
+        self.assertFalse(parse("price < 100").matches(lambda a: "abc"))
+        self.assertTrue(parse("price != 100").matches(lambda a: None))
+        self.assertTrue(parse("name < 'b'").matches(lambda a: "a"))
+        self.assertFalse(parse("name < 'b'").matches(lambda a: 1))
+
+    def test_plan_picks_most_selective_index(self):
+        """
+        Test that the smallest index lookup is chosen.
+        """
+        chosen, keys = self.run_plan("price_by_night < 20 and "
+                                     "city_id == 'c1'")
+        self.assertIn("range index on price_by_night", chosen.access)
+        self.assertEqual(chosen.estimate, 7)
+        self.assertEqual(keys, ["Place.1"])
+
+        chosen, keys = self.run_plan("price_by_night < 150 and "
+                                     "city_id == 'c1'")
+        self.assertIn("hash index on city_id", chosen.access)
+        self.assertEqual(chosen.estimate, 10)
+        self.assertEqual(len(keys), 5)
+
+    def test_plan_union_and_scan(self):
+        """
+        Test that an or of indexed terms is a union, and that anything
+        else scans.
+        """
+        chosen, keys = self.run_plan("city_id == 'c1' or city_id == 'c2'")
+        self.assertTrue(chosen.access.startswith("union"))
+        self.assertEqual(chosen.estimate, 20)
+        self.assertEqual(len(keys), 20)
+
+        chosen, keys = self.run_plan("city_id == 'c1' or name == 'x'")
+        self.assertEqual(chosen.access, "full scan")
+        self.assertEqual(len(keys), 10)
+        chosen, keys = self.run_plan("not city_id == 'c1'")
+        self.assertEqual(chosen.access, "full scan")
+        self.assertEqual(len(keys), 90)
+
+    def test_plan_ordered_scan(self):
+        """
+        Test that an unselective query ordered by an indexed attribute
+        walks the index.
+        """
+        chosen, keys = self.run_plan("name != 'x'",
+                                     order_by="price_by_night desc",
+                                     limit=3)
+        self.assertTrue(chosen.ordered)
+        self.assertEqual(chosen.estimate, 3)
+        self.assertEqual(keys[:3], ["Place.99", "Place.98", "Place.97"])
+        with self.assertRaises(ValueError):
+            plan(None, self.indexes, 100, order_by="price_by_night up")
+
+    def test_sort(self):
+        """
+        Test that numbers come first, then other values, both ways.
+        """
+        values = [3, "10", None, "b", 1.5, "a"]
+        self.assertEqual(sort(values, lambda v: v),
+                         [1.5, 3, "10", None, "a", "b"])
+        self.assertEqual(sort(values, lambda v: v, reverse=True),
+                         ["10", 3, 1.5, "b", "a", None])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,6 +7,7 @@ Authors: Ukpono Umoren & Alexander Udeogaranya
 
 import unittest
 import os
+import tempfile
 from models.base_model import BaseModel
 from models.user import User
 from models.state import State
@@ -24,8 +25,12 @@ class TestFileStorage(unittest.TestCase):
 
     def setUp(self):
         """
-        Set up test fixtures.
+        Point the storage at a temporary file and set up test fixtures.
         """
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.old_path = FileStorage._FileStorage__file_path
+        FileStorage._FileStorage__file_path = os.path.join(
+            self.tmpdir.name, "file.json")
         self.storage = FileStorage()
         self.base_model = BaseModel()
         self.user = User()
@@ -34,6 +39,9 @@ class TestFileStorage(unittest.TestCase):
         self.amenity = Amenity()
         self.place = Place()
         self.review = Review()
+        # Start from the empty temporary store: the tests add the
+        # fixtures themselves with new()
+        self.storage.reload()
 
     def tearDown(self):
         """
@@ -47,6 +55,9 @@ class TestFileStorage(unittest.TestCase):
         self.amenity = None
         self.place = None
         self.review = None
+        FileStorage._FileStorage__file_path = self.old_path
+        FileStorage().reload()
+        self.tmpdir.cleanup()
 
     def test_all(self):
         """
@@ -211,7 +222,8 @@ class TestFileStorage(unittest.TestCase):
         Test the reload() method of FileStorage when the file does not exist.
         """
         # Delete the file before calling reload()
-        os.remove(self.storage._FileStorage__file_path)
+        if os.path.isfile(self.storage._FileStorage__file_path):
+            os.remove(self.storage._FileStorage__file_path)
         self.storage.reload()  # No exception should be raised
 
     def test_reload_empty_file(self):
@@ -9,7 +9,11 @@ Authors: Ukpono Umoren & Alexander Udeogaranya
 
 import unittest
 import datetime
+import os
+import tempfile
 from models.state import State
+from models import storage
+from models.engine.file_storage import FileStorage
 
 
 class TestState(unittest.TestCase):
@@ -19,8 +23,12 @@ class TestState(unittest.TestCase):
 
     def setUp(self):
         """
-        Set up test fixtures.
+        Point the storage at a temporary file and set up test fixtures.
         """
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.old_path = FileStorage._FileStorage__file_path
+        FileStorage._FileStorage__file_path = os.path.join(
+            self.tmpdir.name, "file.json")
         self.state = State()
 
     def tearDown(self):
@@ -28,6 +36,9 @@ class TestState(unittest.TestCase):
         Clean up after each test case.
         """
         self.state = None
+        FileStorage._FileStorage__file_path = self.old_path
+        storage.reload()
+        self.tmpdir.cleanup()
 
     def test_instance(self):
         """